@@ -8,6 +8,7 @@ from datetime import datetime
 import json
 import configparser
 import shutil
+import multiprocessing
 
 # Ajouter le répertoire racine du projet au sys.path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -18,6 +19,8 @@ from scripts_bibliotheque.archiviste_taches import TaskManager
 from scripts_bibliotheque.bibliotheque import LibraryManager
 # Recherche Globale
 from global_search import GlobalSearch
+from search_index import register_functions
+from query_cache import query_cache
 # Compteurs
 from scripts_compteurs.db_designer_compteur import DBDesigner as CompteursDBDesigner
 from scripts_compteurs.meter_readings_compteur import MeterReadings as CompteursMeterReadings
@@ -174,6 +177,9 @@ class ArchivisteApp:
         self.conn_compteurs = sqlite3.connect(self.db_path_compteurs, check_same_thread=False)
         self.conn_tasks = sqlite3.connect(self.db_path_tasks, check_same_thread=False)
         self.conn_library = sqlite3.connect(self.db_path_library, check_same_thread=False)
+        # Fonction SQL normalize_text des recherches sans index
+        register_functions(self.conn_tasks)
+        register_functions(self.conn_library)
 
         # Création des tables si elles n'existent pas
         self.create_tables_compteurs(self.conn_compteurs.cursor())
@@ -213,7 +219,11 @@ class ArchivisteApp:
         self.library_manager = LibraryManager(self.tab_library, self.conn_library)
         
         # Recherche Globale
-        self.global_search_manager = GlobalSearch(self.tab_global_search, self.conn_tasks, self.conn_library, self.library_manager)
+        # La section RELEVÉS (base audit.db) reste inactive tant qu'audit.db est désactivée :
+        # la réactiver en passant conn_audit=self.conn_audit. Les relevés de meters.db sont
+        # couverts par la section COMPTEURS.
+        self.global_search_manager = GlobalSearch(self.tab_global_search, self.conn_tasks, self.conn_library, self.library_manager,
+                                                  conn_compteurs=self.conn_compteurs)
         
         # Tâches
         self.task_manager = TaskManager(self.tab_tasks, self.conn_tasks, self.conn_library, self.library_manager)
@@ -233,9 +243,8 @@ class ArchivisteApp:
             self.conn_library, self.db_path_library,
             self.update_connection_after_import
         )
-
-        # Mettre à jour les connexions si nécessaire
-        self.update_connection_after_import(None, self.conn_compteurs, self.conn_tasks, self.conn_library)
+        # Chaque module s'est initialisé sur les connexions ouvertes ci-dessus : update_connection_after_import
+        # n'est appelée qu'après l'import d'une base, pour ne pas tout réinitialiser une seconde fois au démarrage
 
     def create_tables_compteurs(self, cursor):
         cursor.execute('''CREATE TABLE IF NOT EXISTS categories (
@@ -329,6 +338,7 @@ class ArchivisteApp:
         columns = [info[1] for info in cursor.fetchall()]
         if 'archives' not in columns:
             cursor.execute("ALTER TABLE library ADD COLUMN archives TEXT")
+        # Les colonnes ajoutées ensuite (content_hash...) relèvent des migrations versionnées de LibraryManager.migrate_db
 
     def update_connection_after_import(self, conn_audit, conn_compteurs, conn_tasks, conn_library):
         # Cette méthode est appelée par DBManager, on peut l'utiliser pour s'assurer
@@ -337,6 +347,9 @@ class ArchivisteApp:
         self.conn_compteurs = conn_compteurs
         self.conn_tasks = conn_tasks
         self.conn_library = conn_library
+        register_functions(self.conn_tasks)
+        register_functions(self.conn_library)
+        query_cache.invalidate()
 
         # Mise à jour des modules Compteurs
         self.db_designer_compteurs.conn = self.conn_compteurs
@@ -358,22 +371,28 @@ class ArchivisteApp:
         self.task_manager.conn_library = self.conn_library
         self.task_manager.cursor = self.conn_tasks.cursor()
         self.task_manager.cursor_library = self.conn_library.cursor()
+        self.task_manager.init_db()
         self.task_manager.refresh_task_list()
         
         # Mise à jour des modules Bibliothèque
         self.library_manager.conn = self.conn_library
         self.library_manager.cursor = self.conn_library.cursor()
+        self.library_manager.init_db()
+        self.library_manager.fs_sync.reset()
         self.library_manager.refresh_folder_list()
         
         # Mise à jour du module de Recherche
         self.global_search_manager.conn_tasks = self.conn_tasks
         self.global_search_manager.conn_library = self.conn_library
-        self.global_search_manager.cursor_tasks = self.conn_tasks.cursor()
-        self.global_search_manager.cursor_library = self.conn_library.cursor()
+        self.global_search_manager.conn_compteurs = self.conn_compteurs
+        self.global_search_manager.init_search_index()
 
 
     def on_closing(self):
         if messagebox.askyesno("Quitter", "Voulez-vous vraiment quitter ?"):
+            # Threads et pools de processus de la bibliothèque arrêtés avant la fermeture des connexions
+            if hasattr(self, 'library_manager'):
+                self.library_manager.shutdown()
             # if hasattr(self, 'conn_audit'):
             #     self.conn_audit.close()
             #     print("Connexion SQLite (Audit) fermée.")
@@ -389,6 +408,8 @@ class ArchivisteApp:
             self.root.destroy()
 
 if __name__ == "__main__":
+    # Nécessaire pour les pools de processus (indexation) dans l'exécutable PyInstaller
+    multiprocessing.freeze_support()
     root = tk.Tk()
     show_dependencies_ok_window()
     app = ArchivisteApp(root)
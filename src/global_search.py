@@ -3,13 +3,318 @@ from tkinter import ttk, messagebox
 import os
 import subprocess
 import platform
+import queue
+import sqlite3
+import threading
+from pathlib import Path
+
+from query_cache import query_cache
+from search_index import (ensure_tasks_index, ensure_library_index, ensure_tasks_terms_index, ensure_library_terms_index,
+                          refresh_tasks_terms_index, refresh_library_terms_index, build_match_query, fuzzy_match_sql, normalize_text, register_functions, database_path)
+
+# Sections de résultats : (numéro d'ordre, base attachée, libellé de l'en-tête).
+# La section "audit" n'est interrogée que si une connexion à audit.db est fournie (désactivée dans archiviste.pyw).
+SECTIONS = (
+    (0, "main", "TÂCHES"),
+    (1, "lib", "BIBLIOTHÈQUE"),
+    (2, "audit", "RELEVÉS"),
+    (3, "compteurs", "COMPTEURS"),
+)
+RESULT_COLUMNS = "section, kind, id, title, detail, score, c1, c2, c3, c4, c5, c6"
+RESULT_ORDER = "section, score, COALESCE(detail, '') DESC, kind, id"
+RESULT_ORDER_REVERSED = "section DESC, score DESC, COALESCE(detail, ''), kind DESC, id DESC"
+# Conditions de pagination par clé (section, score, détail, type, id), dans l'ordre RESULT_ORDER
+AFTER_KEY = """(section, score) > (?, ?)
+                OR ((section, score) = (?, ?)
+                    AND (COALESCE(detail, '') < ? OR (COALESCE(detail, '') = ? AND (kind, id) > (?, ?))))"""
+BEFORE_KEY = """(section, score) < (?, ?)
+                 OR ((section, score) = (?, ?)
+                     AND (COALESCE(detail, '') > ? OR (COALESCE(detail, '') = ? AND (kind, id) < (?, ?))))"""
+
+
+def like_conditions(columns, search_terms):
+    """
+    Construit une condition LIKE (insensible à la casse et aux accents) où chaque mot doit
+    apparaître dans au moins une des colonnes. Retourne (sql, paramètres).
+    """
+    clause = "(" + " OR ".join(f"normalize_text({col}) LIKE ?" for col in columns) + ")"
+    params = []
+    for term in search_terms:
+        params.extend([f"%{normalize_text(term)}%"] * len(columns))
+    return " AND ".join([clause] * len(search_terms)), params
+
+
+class SearchWorker(threading.Thread):
+    """
+    Thread de recherche disposant de sa propre connexion en lecture seule.
+    La base des tâches est ouverte comme base principale et les autres bases (bibliothèque,
+    relevés, compteurs) y sont attachées, si bien qu'une seule requête UNION renvoie tous les
+    résultats typés et classés. Seule la demande la plus récente est exécutée ; une requête
+    en cours est interrompue dès qu'une génération plus récente est soumise.
+    Une recherche publie le nombre de résultats par section (un COUNT par section, sans lire les
+    lignes) et la première page ; les pages suivantes ou précédentes sont lues au fil du défilement
+    par clé (la dernière ou la première ligne chargée) avec LIMIT, en ne triant que la page.
+    Les comptages et les pages passent par le cache de requêtes : revenir à une recherche
+    précédente, ou rebasculer une option, ne réexécute rien tant que les données sont inchangées.
+    """
+    PAGE_SIZE = 100  # Nombre de lignes lues par page
+    def __init__(self, db_paths, results_queue):
+        """
+        Args:
+            db_paths (dict): Chemins des bases par alias : "main" (tasks.db), "lib" (library.db),
+                "audit" (relevés) et "compteurs" (meters.db). Les alias absents sont ignorés.
+            results_queue (queue.Queue): File dans laquelle sont publiés les résultats
+                (génération, nombres par section ou None, lignes (rang, ligne) de la page, erreur).
+        """
+        super().__init__(daemon=True)
+        self.db_paths = dict(db_paths)
+        self.results_queue = results_queue
+        self.requests = queue.Queue()
+        self.latest_generation = 0
+        self._current_generation = 0
+        self.conn = None
+        self.tables = set()
+        self._reconnect = False
+        self._query = None
+
+    def submit(self, generation, search_terms, fts_enabled, content_enabled=False, fuzzy=False, archived=False):
+        """Soumet une recherche ; toute recherche plus ancienne devient obsolète."""
+        self.latest_generation = generation
+        self.requests.put(("search", generation, (search_terms, fts_enabled, content_enabled, fuzzy, archived)))
+
+    def request_page(self, generation, anchor_rank, anchor_row, direction):
+        """
+        Demande la page de résultats qui suit (direction "end") ou qui précède (direction "start")
+        la ligne anchor_row, de rang anchor_rank.
+        """
+        self.requests.put(("page", generation, (anchor_rank, anchor_row, direction)))
+
+    def cancel(self, generation):
+        """Rend obsolètes les recherches antérieures sans en lancer de nouvelle."""
+        self.latest_generation = generation
+
+    def set_paths(self, db_paths):
+        """Change les bases interrogées (par exemple après un import) ; la connexion est rouverte."""
+        self.db_paths = dict(db_paths)
+        self._reconnect = True
+
+    def _open_connection(self):
+        if self.conn is not None:
+            self.conn.close()
+        self.conn = sqlite3.connect(Path(self.db_paths["main"]).as_uri() + "?mode=ro", uri=True)
+        register_functions(self.conn)
+        # Le gestionnaire de progression interrompt la requête dès qu'elle est obsolète
+        self.conn.set_progress_handler(lambda: self._current_generation != self.latest_generation, 1000)
+        self.tables = {("main", name) for (name,) in self.conn.execute("SELECT name FROM main.sqlite_master WHERE type='table'")}
+        for alias in ("lib", "audit", "compteurs"):
+            path = self.db_paths.get(alias)
+            if not path or not os.path.exists(path):
+                continue
+            self.conn.execute(f"ATTACH DATABASE ? AS {alias}", (Path(path).as_uri() + "?mode=ro",))
+            self.tables |= {(alias, name) for (name,) in self.conn.execute(f"SELECT name FROM {alias}.sqlite_master WHERE type='table'")}
+        self._reconnect = False
+
+    def available_sections(self):
+        """Retourne les sections interrogeables avec la connexion courante."""
+        required = {"main": "tasks", "lib": "library", "audit": "readings", "compteurs": "meters"}
+        return [section for section in SECTIONS if (section[1], required[section[1]]) in self.tables]
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            # On ne garde que la demande la plus récente
+            while True:
+                try:
+                    request = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+            request_type, generation, args = request
+            if generation != self.latest_generation:
+                continue
+            self._current_generation = generation
+
+            counts, rows, error = None, [], None
+            try:
+                if self.conn is None or self._reconnect:
+                    self._open_connection()
+                if request_type == "search":
+                    self._query = self.build_query(*args)
+                    counts = self.count_results()
+                    rows = self.fetch_page(0, None, "end")
+                elif self._query is not None:
+                    rows = self.fetch_page(*args)
+            except sqlite3.Error as e:
+                error = str(e)
+
+            if generation == self.latest_generation:
+                self.results_queue.put((generation, counts, rows, error))
+
+    def build_query(self, search_terms, fts_enabled, content_enabled=False, fuzzy=False, archived=False):
+        """
+        Construit la requête de recherche sur toutes les bases, sous forme d'une table commune "results".
+        Chaque ligne a la forme (section, type, id, titre, détail, score, c1, c2, c3, c4, c5, c6),
+        les colonnes c1..c6 portant les champs propres au type pour le panneau de détails.
+        Les tâches archivées ne sont interrogées que si archived est vrai.
+        Retourne (sql, paramètres).
+        """
+        branches = [self.build_branch(kind, search_terms, fts_enabled, content_enabled, fuzzy) for kind in self.branch_kinds(archived)]
+        branches = [branch for branch in branches if branch is not None]
+        if not branches:
+            branches = [("SELECT " + ", ".join(["NULL"] * 12) + " WHERE 0", [])]
+        union = " UNION ALL ".join(f"SELECT * FROM ({sql})" for sql, _ in branches)
+        params = [param for _, branch_params in branches for param in branch_params]
+        return f"WITH results({RESULT_COLUMNS}) AS ({union})", params
+
+    def count_results(self):
+        """Retourne le nombre de résultats par section, sans lire les lignes."""
+        sql, params = self._query
+        return dict(query_cache.execute(self.conn, f"{sql} SELECT section, COUNT(*) FROM results GROUP BY section", params))
+
+    def fetch_page(self, anchor_rank, anchor_row, direction):
+        """
+        Lit la page de résultats qui suit (direction "end") ou qui précède (direction "start") la
+        ligne anchor_row, de rang anchor_rank ; sans ligne de référence, la première page.
+        Chaque ligne est retournée avec son rang : (rang, ligne).
+        """
+        sql, params = self._query
+        where, key_params = "", []
+        if anchor_row is not None:
+            section, score, detail, kind, item_id = self.row_key(anchor_row)
+            where = "WHERE " + (AFTER_KEY if direction == "end" else BEFORE_KEY)
+            key_params = [section, score, section, score, detail, detail, kind, item_id]
+        order = RESULT_ORDER if direction == "end" else RESULT_ORDER_REVERSED
+        rows = query_cache.execute(self.conn, f"{sql} SELECT * FROM results {where} ORDER BY {order} LIMIT ?",
+                                   params + key_params + [self.PAGE_SIZE])
+        if direction == "end":
+            return [(anchor_rank + index, row) for index, row in enumerate(rows, 1)]
+        return [(anchor_rank - len(rows) + index, row) for index, row in enumerate(reversed(rows))]
+
+    @staticmethod
+    def row_key(row):
+        """Retourne la clé de tri (section, score, détail, type, id) d'une ligne de résultat."""
+        return (row[0], row[5], row[4] or "", row[1], row[2])
+
+    def branch_kinds(self, archived=False):
+        """Retourne les types de résultats interrogeables, dans l'ordre des sections."""
+        kinds = []
+        if ("main", "tasks") in self.tables:
+            kinds.append("task")
+        if archived and ("main", "tasks_archive") in self.tables:
+            kinds.append("task_archive")
+        if ("lib", "library") in self.tables:
+            kinds.append("file")
+        if ("audit", "readings") in self.tables:
+            kinds += ["releve", "releve_meter"]
+        if ("compteurs", "meters") in self.tables:
+            kinds.append("compteur_meter")
+        if ("compteurs", "readings") in self.tables:
+            kinds.append("compteur")
+        return kinds
+
+    def build_branch(self, kind, search_terms, fts_enabled, content_enabled=False, fuzzy=False):
+        """
+        Construit la sous-requête d'un type de résultat. Retourne (sql, paramètres), ou None si
+        la recherche approchée ne trouve aucun mot proche dans le vocabulaire.
+        En recherche approchée, le score est l'opposé de la similarité (les plus proches en premier).
+        """
+        if kind == "task":
+            if fuzzy and fts_enabled and ("main", "tasks_terms") in self.tables:
+                match = fuzzy_match_sql(self.conn, "tasks_fts", "tasks_terms", search_terms, "main")
+                if match is None:
+                    return None
+                return (f"""SELECT 0, 'task', t.id, t.title, t.due_date, -fuzzy.similarity,
+                                   t.description, t.priority, t.status, t.recurrence, NULL, NULL
+                            FROM ({match[0]}) fuzzy JOIN main.tasks t ON t.id = fuzzy.rowid""", match[1])
+            if fts_enabled:
+                return ("""SELECT 0, 'task', t.id, t.title, t.due_date, bm25(tasks_fts, 10.0, 1.0),
+                                  t.description, t.priority, t.status, t.recurrence, NULL, NULL
+                           FROM main.tasks_fts JOIN main.tasks t ON t.id = tasks_fts.rowid
+                           WHERE tasks_fts MATCH ?""", [build_match_query(search_terms)])
+            where, params = like_conditions(("t.title", "t.description"), search_terms)
+            return (f"""SELECT 0, 'task', t.id, t.title, t.due_date, 0,
+                               t.description, t.priority, t.status, t.recurrence, NULL, NULL
+                        FROM main.tasks t WHERE {where}""", params)
+
+        if kind == "task_archive":
+            # Archives non indexées : recherche LIKE, après les tâches actives
+            where, params = like_conditions(("t.title", "t.description"), search_terms)
+            return (f"""SELECT 0, 'task_archive', t.id, t.title, t.due_date, 1e9,
+                               t.description, t.priority, t.status, t.recurrence, t.archived_at, NULL
+                        FROM main.tasks_archive t WHERE {where}""", params)
+
+        if kind == "file":
+            if fuzzy and fts_enabled and ("lib", "library_terms") in self.tables:
+                match = fuzzy_match_sql(self.conn, "library_fts", "library_terms", search_terms, "lib")
+                if match is None:
+                    return None
+                return (f"""SELECT 1, 'file', l.id, l.title, l.project, -fuzzy.similarity,
+                                   l.category, l.year, l.archives, l.file_path, l.notes, NULL
+                            FROM ({match[0]}) fuzzy JOIN lib.library l ON l.id = fuzzy.rowid
+                            WHERE l.file_path != ''""", match[1])
+            if fts_enabled:
+                # À score égal, une correspondance dans les métadonnées passe avant le contenu
+                match_query = build_match_query(search_terms)
+                hits = "SELECT rowid AS id, bm25(library_fts, 10.0, 5.0, 1.0) AS score FROM lib.library_fts WHERE library_fts MATCH ?"
+                params = [match_query]
+                if content_enabled and ("lib", "library_content_fts") in self.tables:
+                    hits += " UNION ALL SELECT rowid, bm25(library_content_fts) * 0.5 FROM lib.library_content_fts WHERE library_content_fts MATCH ?"
+                    params.append(match_query)
+                # LIMIT -1 empêche l'aplatissement de la sous-requête dans le GROUP BY, où bm25 est refusée
+                return (f"""SELECT 1, 'file', l.id, l.title, l.project, MIN(hits.score),
+                                   l.category, l.year, l.archives, l.file_path, l.notes, NULL
+                            FROM ({hits} LIMIT -1) hits JOIN lib.library l ON l.id = hits.id
+                            WHERE l.file_path != ''
+                            GROUP BY l.id""", params)
+            where, params = like_conditions(("l.title", "l.project", "l.notes"), search_terms)
+            return (f"""SELECT 1, 'file', l.id, l.title, l.project, 0,
+                               l.category, l.year, l.archives, l.file_path, l.notes, NULL
+                        FROM lib.library l WHERE l.file_path != '' AND {where}""", params)
+
+        if kind == "releve":
+            where, params = like_conditions(("r.note",), search_terms)
+            if ("audit", "parameters") in self.tables:
+                param_name, param_unit = "p.name", "p.unit"
+                parameter_join = "LEFT JOIN audit.parameters p ON p.id = r.parameter_id"
+            else:
+                param_name, param_unit, parameter_join = "NULL", "NULL", ""
+            return (f"""SELECT 2, 'releve', r.id, m.name, r.date, 0,
+                               r.note, {param_name}, r.value, {param_unit}, NULL, NULL
+                        FROM audit.readings r JOIN audit.meters m ON m.id = r.meter_id
+                        {parameter_join}
+                        WHERE {where}""", params)
+
+        if kind == "releve_meter":
+            where, params = like_conditions(("m.name",), search_terms)
+            return (f"""SELECT 2, 'releve_meter', m.id, m.name, '', 0,
+                               m.note, NULL, NULL, NULL, NULL, NULL
+                        FROM audit.meters m WHERE {where}""", params)
+
+        if kind == "compteur_meter":
+            where, params = like_conditions(("m.name", "m.note"), search_terms)
+            return (f"""SELECT 3, 'compteur_meter', m.id, m.name, '', 0,
+                               m.note, NULL, NULL, NULL, NULL, NULL
+                        FROM compteurs.meters m WHERE {where}""", params)
+
+        if kind == "compteur":
+            where, params = like_conditions(("r.note",), search_terms)
+            return (f"""SELECT 3, 'compteur', r.id, m.name, r.date, 0,
+                               r.note, r.meter_index, r.consumption, NULL, NULL, NULL
+                        FROM compteurs.readings r JOIN compteurs.meters m ON m.id = r.meter_id
+                        WHERE {where}""", params)
+
+        raise ValueError(f"Type de résultat inconnu : {kind}")
+
 
 class GlobalSearch:
     """
-    Crée un onglet de recherche global qui interroge la base de données des tâches
-    et la base de données de la bibliothèque.
+    Crée un onglet de recherche global qui interroge la base de données des tâches,
+    la base de données de la bibliothèque et, si elles sont fournies, les bases des relevés et des compteurs.
     """
-    def __init__(self, parent, conn_tasks, conn_library, library_manager):
+    SEARCH_DELAY_MS = 250  # Délai d'anti-rebond de la saisie
+    POLL_INTERVAL_MS = 30  # Intervalle de lecture des résultats du thread de recherche
+    LOAD_MARGIN = 0.2  # Part de la liste restant à afficher au-dessus ou au-dessous de la vue avant de charger une page
+    MAX_LOADED_ROWS = 500  # Lignes gardées dans l'arborescence ; les pages éloignées de la vue en sont retirées
+    def __init__(self, parent, conn_tasks, conn_library, library_manager, conn_compteurs=None, conn_audit=None):
         """
         Initialise l'onglet de recherche globale.
 
@@ -18,13 +323,27 @@ class GlobalSearch:
             conn_tasks (sqlite3.Connection): La connexion à la base de données des tâches (tasks.db).
             conn_library (sqlite3.Connection): La connexion à la base de données de la bibliothèque (library.db).
             library_manager (LibraryManager): Une instance du LibraryManager pour ouvrir les fichiers.
+            conn_compteurs (sqlite3.Connection, optional): La connexion à la base des compteurs (meters.db).
+            conn_audit (sqlite3.Connection, optional): La connexion à la base des relevés (audit.db).
         """
         self.parent = parent
         self.conn_tasks = conn_tasks
         self.conn_library = conn_library
-        self.cursor_tasks = self.conn_tasks.cursor()
-        self.cursor_library = self.conn_library.cursor()
+        self.conn_compteurs = conn_compteurs
+        self.conn_audit = conn_audit
         self.library_manager = library_manager
+        self.fts_enabled = False
+        self.content_enabled = False
+        self.fuzzy_enabled = False
+        self.init_search_index()
+
+        # --- Recherche en arrière-plan ---
+        self.search_generation = 0
+        self._search_after_id = None
+        self._poll_after_id = None
+        self.results_queue = queue.Queue()
+        self.search_worker = SearchWorker(self.database_paths(), self.results_queue)
+        self.search_worker.start()
 
         # --- Interface Utilisateur ---
         
@@ -43,8 +362,14 @@ class GlobalSearch:
         ttk.Label(search_frame, text="Rechercher (plusieurs mots possibles) :").pack(side="left", padx=(0, 5))
         self.search_var = tk.StringVar()
         self.search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
+        self.fuzzy_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(search_frame, text="Recherche approchée", variable=self.fuzzy_var,
+                        command=self.perform_search).pack(side="right", padx=(5, 0))
+        self.archived_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(search_frame, text="Tâches archivées", variable=self.archived_var,
+                        command=self.perform_search).pack(side="right", padx=(5, 0))
         self.search_entry.pack(fill="x", expand=True)
-        self.search_entry.bind("<KeyRelease>", self.perform_search) # Lance la recherche à chaque frappe
+        self.search_entry.bind("<KeyRelease>", self.schedule_search) # Lance la recherche quand la saisie se stabilise
 
         # Arborescence pour afficher les résultats
         self.results_tree = ttk.Treeview(results_frame, columns=("Type", "Nom", "Détail"), show="headings")
@@ -56,6 +381,9 @@ class GlobalSearch:
         self.results_tree.column("Nom", width=250, anchor="w")
         self.results_tree.column("Détail", width=200, anchor="w")
         
+        tree_scrollbar = ttk.Scrollbar(results_frame, orient="vertical", command=self.results_tree.yview)
+        self.results_tree.configure(yscrollcommand=lambda first, last: self.on_tree_scroll(tree_scrollbar, first, last))
+        tree_scrollbar.pack(side="right", fill="y", pady=5)
         self.results_tree.pack(fill="both", expand=True, pady=5)
         self.results_tree.bind("<<TreeviewSelect>>", self.show_details)
 
@@ -76,122 +404,314 @@ class GlobalSearch:
         self.open_location_button.pack(side="left", padx=5)
 
         self.current_selected_item = None
+        self.current_selected_row = None
+        self.result_rows = {}  # Ligne de résultat complète par élément de l'arborescence
+        # Liste virtuelle : seule une fenêtre de rangs consécutifs autour de la vue est insérée dans l'arborescence
+        self.section_parents = {}
+        self.rank_items = {}  # Élément de l'arborescence par rang de résultat
+        self.total_count = 0
+        self.first_rank = 0
+        self.last_rank = 0
+        self.page_pending = False
+        self.page_direction = None  # "end" ou "start" : côté de la fenêtre où la page demandée sera insérée
+
+    def init_search_index(self):
+        """
+        Crée les index plein texte (FTS5) des tâches et de la bibliothèque.
+        Sur une base existante, l'index est construit au premier lancement ; ensuite il est
+        maintenu par des triggers. Si FTS5 n'est pas disponible, la recherche utilise LIKE.
+        """
+        tasks_ok = ensure_tasks_index(self.conn_tasks)
+        library_ok = ensure_library_index(self.conn_library)
+        self.fts_enabled = tasks_ok and library_ok
+        # Vocabulaire indexé par trigrammes pour la recherche approchée
+        tasks_terms_ok = ensure_tasks_terms_index(self.conn_tasks)
+        library_terms_ok = ensure_library_terms_index(self.conn_library)
+        self.fuzzy_enabled = self.fts_enabled and tasks_terms_ok and library_terms_ok
+        # L'index du contenu des documents est créé et alimenté par le LibraryManager
+        self.content_enabled = self.conn_library.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='library_content_fts'").fetchone() is not None
+        if hasattr(self, "search_worker"):
+            self.search_worker.set_paths(self.database_paths())
+
+    def database_paths(self):
+        """Retourne les chemins des bases interrogées, par alias d'attachement."""
+        paths = {"main": database_path(self.conn_tasks), "lib": database_path(self.conn_library)}
+        if self.conn_audit is not None:
+            paths["audit"] = database_path(self.conn_audit)
+        if self.conn_compteurs is not None:
+            paths["compteurs"] = database_path(self.conn_compteurs)
+        return paths
 
     def perform_search(self, event=None):
         """
-        Exécute la recherche dans les deux bases de données et met à jour l'arborescence.
-        Prend en charge plusieurs mots-clés.
+        Lance une nouvelle génération de recherche sur le thread de recherche.
+        Prend en charge plusieurs mots-clés. Les résultats d'une génération plus ancienne
+        sont ignorés à leur arrivée.
         """
+        self._search_after_id = None
         search_terms = self.search_var.get().strip().lower().split()
+        self.search_generation += 1
 
         for i in self.results_tree.get_children():
             self.results_tree.delete(i)
+        self.result_rows = {}
+        self.section_parents = {}
+        self.rank_items = {}
+        self.total_count = 0
+        self.first_rank = 0
+        self.last_rank = 0
+        self.page_pending = False
+        self.page_direction = None
 
         if not search_terms:
+            self.search_worker.cancel(self.search_generation)
             return
 
-        tasks_parent = self.results_tree.insert("", "end", text="Tâches", values=("--- TÂCHES ---", "", ""), open=True)
-        library_parent = self.results_tree.insert("", "end", text="Bibliothèque", values=("--- BIBLIOTHÈQUE ---", "", ""), open=True)
+        self.page_pending = True
+        self.page_direction = "end"
+        fuzzy = self.fuzzy_var.get() and self.fuzzy_enabled
+        if fuzzy:
+            # Le thread de recherche lit en lecture seule : le vocabulaire est complété ici
+            refresh_tasks_terms_index(self.conn_tasks)
+            refresh_library_terms_index(self.conn_library)
+        self.search_worker.submit(self.search_generation, search_terms, self.fts_enabled, self.content_enabled, fuzzy,
+                                  self.archived_var.get())
+        self._start_polling()
+
+    def _start_polling(self):
+        if self._poll_after_id is None:
+            self._poll_after_id = self.parent.after(self.POLL_INTERVAL_MS, self._poll_results)
+
+    def load_page(self, direction):
+        """
+        Demande au thread de recherche la page qui suit (direction "end") ou qui précède
+        (direction "start") les lignes insérées, s'il en reste.
+        """
+        if self.page_pending:
+            return
+        if direction == "end":
+            if self.last_rank >= self.total_count:
+                return
+            anchor_rank = self.last_rank
+        else:
+            if self.first_rank <= 1:
+                return
+            anchor_rank = self.first_rank
+        self.page_pending = True
+        self.page_direction = direction
+        self.search_worker.request_page(self.search_generation, anchor_rank,
+                                        self.result_rows[self.rank_items[anchor_rank]], direction)
+        self._start_polling()
+
+    def on_tree_scroll(self, scrollbar, first, last):
+        """
+        Met à jour la barre de défilement et charge une page lorsque la vue approche
+        de la fin ou du début des lignes insérées.
+        """
+        scrollbar.set(first, last)
+        if float(last) >= 1.0 - self.LOAD_MARGIN:
+            self.load_page("end")
+        elif float(first) <= self.LOAD_MARGIN:
+            self.load_page("start")
 
-        # --- Recherche dans les tâches ---
-        try:
-            task_conditions = " AND ".join(["(LOWER(title) LIKE ? OR LOWER(description) LIKE ?)" for _ in search_terms])
-            query_tasks = f"SELECT id, title, due_date, description FROM tasks WHERE {task_conditions}"
-            
-            task_params = []
-            for term in search_terms:
-                task_params.extend([f'%{term}%', f'%{term}%'])
-            
-            self.cursor_tasks.execute(query_tasks, tuple(task_params))
-            tasks = self.cursor_tasks.fetchall()
-
-            for task in tasks:
-                task_id, title, due_date, description = task
-                self.results_tree.insert(tasks_parent, "end", values=("Tâche", title, f"Échéance: {due_date}"), tags=("task", task_id))
+    def schedule_search(self, event=None):
+        """
+        Reporte la recherche jusqu'à ce que l'utilisateur arrête de taper (anti-rebond).
+        """
+        if self._search_after_id is not None:
+            self.parent.after_cancel(self._search_after_id)
+        self._search_after_id = self.parent.after(self.SEARCH_DELAY_MS, self.perform_search)
 
-        except Exception as e:
-            self.results_tree.insert(tasks_parent, "end", values=("Erreur", str(e), ""))
+    def _poll_results(self):
+        """
+        Récupère les résultats publiés par le thread de recherche.
+        Seuls ceux de la génération courante sont affichés.
+        """
+        self._poll_after_id = None
+        latest = None
+        while True:
+            try:
+                result = self.results_queue.get_nowait()
+            except queue.Empty:
+                break
+            if result[0] == self.search_generation:
+                latest = result
+
+        if latest is not None:
+            self._display_results(*latest)
+        elif self.search_worker.latest_generation == self.search_generation:
+            self._poll_after_id = self.parent.after(self.POLL_INTERVAL_MS, self._poll_results)
+
+    def _display_results(self, generation, counts, rows, error):
+        """
+        Affiche une page de résultats. La première page d'une recherche crée aussi les en-têtes
+        de section avec le nombre total de résultats de chacune.
+        """
+        self.page_pending = False
+        if error is not None:
+            self.results_tree.insert("", 0, values=("Erreur", error, ""))
+            return
 
-        # --- Recherche dans la bibliothèque ---
-        try:
-            lib_conditions = " AND ".join(["(LOWER(title) LIKE ? OR LOWER(project) LIKE ? OR LOWER(notes) LIKE ?)" for _ in search_terms])
-            query_library = f"SELECT id, title, project, category, year FROM library WHERE file_path != '' AND ({lib_conditions})"
-            
-            lib_params = []
-            for term in search_terms:
-                lib_params.extend([f'%{term}%', f'%{term}%', f'%{term}%'])
-                
-            self.cursor_library.execute(query_library, tuple(lib_params))
-            files = self.cursor_library.fetchall()
-
-            for file in files:
-                file_id, title, project, category, year = file
-                detail_text = f"Projet: {project} ({category} - {year})"
-                self.results_tree.insert(library_parent, "end", values=("Fichier", title, detail_text), tags=("file", file_id))
+        if counts is not None:
+            for section, _, label in self.search_worker.available_sections():
+                count = counts.get(section, 0)
+                self.section_parents[section] = self.results_tree.insert(
+                    "", "end", values=(f"--- {label} ({count}) ---", "", ""), open=True)
+            self.total_count = sum(counts.values())
+
+        direction, self.page_direction = self.page_direction, None
+        if direction == "start":
+            inserted = 0
+            for rank, row in reversed(rows):
+                if rank >= self.first_rank:
+                    continue
+                item = self.results_tree.insert(self.section_parents[row[0]], 0, values=self.format_row(row))
+                self.result_rows[item] = row
+                self.rank_items[rank] = item
+                inserted += 1
+            if inserted:
+                self.first_rank -= inserted
+                # Les lignes insérées au-dessus de la vue la décaleraient : la vue reste sur les mêmes lignes
+                self.results_tree.yview_scroll(inserted, "units")
+            # Données modifiées depuis le comptage : début atteint avant le rang 1, ou lignes au-delà ;
+            # les rangs sont décalés pour que le chargement vers le début reste cohérent
+            if len(rows) < SearchWorker.PAGE_SIZE and self.first_rank != 1:
+                self.renumber_ranks(1 - self.first_rank)
+            elif self.first_rank < 1:
+                self.renumber_ranks(2 - self.first_rank)
+            self.trim_rows("end")
+        else:
+            for rank, row in rows:
+                item = self.results_tree.insert(self.section_parents[row[0]], "end", values=self.format_row(row))
+                self.result_rows[item] = row
+                self.rank_items[rank] = item
+            if rows:
+                if not self.first_rank:
+                    self.first_rank = rows[0][0]
+                self.last_rank = rows[-1][0]
+            else:
+                # Les données ont changé depuis le comptage : plus rien à charger
+                self.total_count = self.last_rank
+            self.trim_rows("start")
 
-        except Exception as e:
-            self.results_tree.insert(library_parent, "end", values=("Erreur", str(e), ""))
+        # Si la vue n'est pas encore remplie, la page suivante est chargée sans attendre un défilement
+        self.parent.after_idle(self._fill_view, generation)
+
+    def trim_rows(self, side):
+        """
+        Retire de l'arborescence les lignes qui dépassent MAX_LOADED_ROWS, du côté side
+        ("start" ou "end") opposé au défilement. Elles seront relues si la vue y revient.
+        """
+        excess = self.last_rank - self.first_rank + 1 - self.MAX_LOADED_ROWS
+        if excess <= 0:
+            return
+        if side == "start":
+            ranks = range(self.first_rank, self.first_rank + excess)
+            self.first_rank += excess
+        else:
+            ranks = range(self.last_rank - excess + 1, self.last_rank + 1)
+            self.last_rank -= excess
+        for rank in ranks:
+            item = self.rank_items.pop(rank)
+            del self.result_rows[item]
+            self.results_tree.delete(item)
+        if side == "start":
+            self.results_tree.yview_scroll(-excess, "units")
+
+    def renumber_ranks(self, offset):
+        """Décale de offset les rangs des lignes insérées."""
+        self.rank_items = {rank + offset: item for rank, item in self.rank_items.items()}
+        self.first_rank += offset
+        self.last_rank += offset
+        self.total_count += offset
+
+    def _fill_view(self, generation):
+        if generation != self.search_generation:
+            return
+        if float(self.results_tree.yview()[1]) >= 1.0 - self.LOAD_MARGIN:
+            self.load_page("end")
+
+    def format_row(self, row):
+        """Retourne les valeurs (Type, Nom, Détail) affichées pour une ligne de résultat."""
+        _, kind, _, title, detail, _, c1, c2, c3, c4, c5, c6 = row
+        if kind == "task":
+            return ("Tâche", title, f"Échéance: {detail}")
+        if kind == "task_archive":
+            return ("Tâche archivée", title, f"Échéance: {detail}")
+        if kind == "file":
+            return ("Fichier", title, f"Projet: {detail} ({c1} - {c2})")
+        if kind == "releve":
+            return ("Relevé", title, f"Date: {detail}")
+        if kind == "releve_meter":
+            return ("Point de relevé", title, "")
+        if kind == "compteur_meter":
+            return ("Compteur", title, "")
+        return ("Relevé compteur", title, f"Date: {detail}")
 
     def show_details(self, event=None):
         """
         Affiche les détails de l'élément sélectionné dans le panneau de droite.
+        Les détails proviennent de la ligne déjà récupérée par la recherche, sans nouvelle requête.
         """
         self.details_text.config(state="normal")
         self.details_text.delete("1.0", tk.END)
         self.open_file_button.config(state="disabled")
         self.open_location_button.config(state="disabled")
         self.current_selected_item = None
+        self.current_selected_row = None
 
         selected_items = self.results_tree.selection()
-        if not selected_items:
+        row = self.result_rows.get(selected_items[0]) if selected_items else None
+        if row is None:
             self.details_text.config(state="disabled")
             return
 
-        selected_item = selected_items[0]
-        tags = self.results_tree.item(selected_item, "tags")
-
-        if not tags or len(tags) < 2:
-            self.details_text.config(state="disabled")
-            return
-
-        item_type = tags[0]
-        item_id = int(tags[1])
-        self.current_selected_item = (item_type, item_id)
+        _, kind, item_id, title, detail, _, c1, c2, c3, c4, c5, c6 = row
+        self.current_selected_item = (kind, item_id)
+        self.current_selected_row = row
 
         details = ""
-        if item_type == "task":
-            try:
-                self.cursor_tasks.execute("SELECT * FROM tasks WHERE id=?", (item_id,))
-                task = self.cursor_tasks.fetchone()
-                if task:
-                    task_id, title, desc, due_date, priority, status, recurrence = task
-                    details += f"Titre: {title}\n"
-                    details += f"Échéance: {due_date}\n"
-                    details += f"Priorité: {priority}\n"
-                    details += f"Statut: {status}\n"
-                    details += f"Récurrence: {recurrence}\n\n"
-                    details += f"Description:\n{'-'*20}\n{desc}"
-            except Exception as e:
-                details = f"Erreur lors de la récupération des détails de la tâche : {e}"
-
-        elif item_type == "file":
-            try:
-                self.cursor_library.execute("SELECT * FROM library WHERE id=?", (item_id,))
-                file_data = self.cursor_library.fetchone()
-                if file_data:
-                    (file_id, title, year, category, archives, project, site, 
-                     nomenclature, emetteur, objet, version, file_path, notes) = file_data
-                    details += f"Titre: {title}\n"
-                    details += f"Projet: {project}\n"
-                    details += f"Catégorie: {category} ({year})\n"
-                    if archives:
-                        details += f"Archive: {archives}\n"
-                    details += f"Chemin: {file_path}\n\n"
-                    details += f"Notes:\n{'-'*20}\n{notes}"
-                    self.open_file_button.config(state="normal")
-                    self.open_location_button.config(state="normal")
-            except Exception as e:
-                details = f"Erreur lors de la récupération des détails du fichier : {e}"
+        if kind in ("task", "task_archive"):
+            details += f"Titre: {title}\n"
+            details += f"Échéance: {detail}\n"
+            details += f"Priorité: {c2}\n"
+            details += f"Statut: {c3}\n"
+            details += f"Récurrence: {c4}\n"
+            if kind == "task_archive":
+                details += f"Archivée le: {c5}\n"
+            details += "\n"
+            details += f"Description:\n{'-'*20}\n{c1}"
+
+        elif kind == "file":
+            details += f"Titre: {title}\n"
+            details += f"Projet: {detail}\n"
+            details += f"Catégorie: {c1} ({c2})\n"
+            if c3:
+                details += f"Archive: {c3}\n"
+            details += f"Chemin: {c4}\n\n"
+            details += f"Notes:\n{'-'*20}\n{c5}"
+            self.open_file_button.config(state="normal")
+            self.open_location_button.config(state="normal")
+
+        elif kind == "releve":
+            details += f"Point de relevé: {title}\n"
+            details += f"Date: {detail}\n"
+            if c2:
+                details += f"Paramètre: {c2}\n"
+            details += f"Valeur: {c3}{' ' + c4 if c4 else ''}\n\n"
+            details += f"Note:\n{'-'*20}\n{c1}"
+
+        elif kind in ("releve_meter", "compteur_meter"):
+            details += f"{'Point de relevé' if kind == 'releve_meter' else 'Compteur'}: {title}\n\n"
+            details += f"Note:\n{'-'*20}\n{c1 or ''}"
+
+        elif kind == "compteur":
+            details += f"Compteur: {title}\n"
+            details += f"Date: {detail}\n"
+            details += f"Index: {c2}\n"
+            details += f"Consommation: {c3}\n\n"
+            details += f"Note:\n{'-'*20}\n{c1}"
 
         self.details_text.insert("1.0", details)
         self.details_text.config(state="disabled")
@@ -228,16 +748,12 @@ class GlobalSearch:
             messagebox.showwarning("Aucune sélection", "Veuillez sélectionner un fichier.")
             return
 
-        file_id = self.current_selected_item[1]
-
         try:
-            self.cursor_library.execute("SELECT file_path FROM library WHERE id=?", (file_id,))
-            result = self.cursor_library.fetchone()
-            if not result or not result[0]:
+            relative_path = self.current_selected_row[9]
+            if not relative_path:
                 messagebox.showerror("Erreur", "Chemin du fichier non trouvé dans la bibliothèque.")
                 return
 
-            relative_path = result[0]
             file_path = os.path.normpath(os.path.join(self.library_manager.files_dir, relative_path))
 
             if not os.path.exists(file_path):
@@ -0,0 +1,106 @@
+import itertools
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+# Cache partagé des résultats de requêtes (recherche globale, liste des tâches, relevés).
+# Un résultat reste valable tant qu'aucune base interrogée par la connexion n'a changé :
+# PRAGMA data_version détecte les modifications validées par d'autres connexions et
+# total_changes celles faites par la connexion elle-même.
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+SIZE_SAMPLE = 50  # Nombre de lignes mesurées pour estimer la taille d'un résultat
+
+SPACES_RE = re.compile(r"\s+")
+
+
+def estimate_size(rows):
+    """Estime l'occupation mémoire (en octets) d'une liste de lignes à partir d'un échantillon."""
+    if not rows:
+        return sys.getsizeof(rows)
+    sample = rows[:SIZE_SAMPLE]
+    sample_size = sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in sample)
+    return sys.getsizeof(rows) + sample_size * len(rows) // len(sample)
+
+
+def data_version(conn):
+    """
+    Retourne l'état des données vues par une connexion : le nombre de modifications faites
+    par la connexion et la valeur de PRAGMA data_version de chaque base (principale et attachées).
+    """
+    schemas = [name for _, name, _ in conn.execute("PRAGMA database_list").fetchall() if name != "temp"]
+    versions = tuple(conn.execute(f"PRAGMA {schema}.data_version").fetchone()[0] for schema in schemas)
+    return conn.total_changes, versions
+
+
+class QueryCache:
+    """
+    Cache LRU de résultats de requêtes, limité en mémoire.
+    La clé est (jeton de la connexion, requête normalisée, paramètres) ; chaque entrée mémorise
+    l'état des données lors de sa lecture et est écartée dès que cet état change.
+    Le jeton est attribué à la première requête d'une connexion, qui reste référencée par le cache :
+    une connexion rouverte reçoit un nouveau jeton, même si elle obtient le même id() que l'ancienne
+    (ses compteurs data_version et total_changes repartent de zéro et pourraient égaler ceux d'une entrée).
+    Utilisable depuis plusieurs threads.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.entries = OrderedDict()
+        self.tokens = {}  # id(connexion) -> (connexion, jeton)
+        self._next_token = itertools.count()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def execute(self, conn, sql, params=()):
+        """
+        Exécute une requête de lecture et retourne toutes ses lignes, depuis le cache si les données
+        n'ont pas changé. La liste retournée est partagée : elle ne doit pas être modifiée.
+        """
+        version = data_version(conn)
+        with self.lock:
+            key = (self._token(conn), SPACES_RE.sub(" ", sql).strip(), tuple(params))
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] == version:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._remove(key)
+            self.misses += 1
+
+        rows = conn.execute(sql, params).fetchall()
+        size = estimate_size(rows)
+        # Un résultat trop volumineux évincerait tout le reste du cache
+        if size <= self.max_bytes // 4:
+            with self.lock:
+                if key in self.entries:
+                    self._remove(key)
+                self.entries[key] = (version, rows, size)
+                self.current_bytes += size
+                while self.current_bytes > self.max_bytes:
+                    self._remove(next(iter(self.entries)))
+        return rows
+
+    def _token(self, conn):
+        # La connexion est gardée avec son jeton : son id() ne peut pas être réattribué tant qu'elle est connue
+        known = self.tokens.get(id(conn))
+        if known is None or known[0] is not conn:
+            known = (conn, next(self._next_token))
+            self.tokens[id(conn)] = known
+        return known[1]
+
+    def _remove(self, key):
+        _, _, size = self.entries.pop(key)
+        self.current_bytes -= size
+
+    def invalidate(self):
+        """Vide le cache (par exemple après le remplacement des connexions lors d'un import)."""
+        with self.lock:
+            self.entries.clear()
+            self.tokens.clear()
+            self.current_bytes = 0
+
+
+query_cache = QueryCache()
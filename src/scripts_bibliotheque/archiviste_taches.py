@@ -2,12 +2,22 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from tkcalendar import DateEntry, Calendar
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import os
-import csv
 import json
+import bisect
 import subprocess
 import platform
+from query_cache import query_cache
+from search_index import database_path, ensure_tasks_index, ensure_tasks_terms_index, fuzzy_match_sql, normalize_text, refresh_tasks_terms_index
+from scripts_bibliotheque.recurrence import RECURRENCE_STEPS, RecurrenceRule, is_recurring
+from scripts_bibliotheque.task_export import export_tasks_csv
+from scripts_bibliotheque.task_archive import (DEFAULT_ARCHIVE_AFTER_DAYS, archive_cutoff, archivable_task_ids, archive_tasks,
+                                               ensure_task_archive, restore_tasks)
+
+CALENDAR_MARGIN_DAYS = 7  # Jours des mois voisins surlignés autour du mois affiché
+REFRESH_DELAY_MS = 16  # Les actualisations demandées pendant une image sont regroupées
+MAX_PARTIAL_REFRESH = 200  # Au-delà, la liste des tâches est rechargée entièrement
 
 class TaskManager:
     def __init__(self, parent, conn, conn_library, library_manager):
@@ -22,6 +32,8 @@ class TaskManager:
         # Charger la configuration
         self.config_file = os.path.join(os.path.dirname(__file__), "config_tasks.json")
         self.load_config()
+        # Les tâches terminées depuis longtemps passent dans les archives : les vues ne lisent que les tâches actives
+        self.archive_old_tasks()
 
         # Configurer les styles pour les boutons
         style = ttk.Style()
@@ -59,6 +71,8 @@ class TaskManager:
         self.search_entry = ttk.Entry(filter_frame, textvariable=self.search_var)
         self.search_entry.pack(side="left", fill="x", expand=True, padx=5)
         self.search_entry.bind("<KeyRelease>", self.filter_tasks)
+        self.fuzzy_search_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(filter_frame, text="Approchée", variable=self.fuzzy_search_var, command=self.filter_tasks).pack(side="left")
 
         ttk.Label(filter_frame, text="Statut :").pack(side="left", padx=5)
         self.status_filter_var = tk.StringVar(value=self.status_filter)
@@ -98,7 +112,20 @@ class TaskManager:
         button_frame.pack(fill="x", pady=5)
         ttk.Button(button_frame, text="Exporter en CSV", command=self.export_to_csv).pack(side="left", padx=5)
         ttk.Button(button_frame, text="Supprimer les tâches sélectionnées", style="MassDelete.TButton", command=self.delete_selected_tasks).pack(side="left", padx=5)
+        # Actions groupées sur la sélection
+        bulk_button = ttk.Menubutton(button_frame, text="Actions groupées")
+        bulk_menu = tk.Menu(bulk_button, tearoff=0)
+        bulk_menu.add_command(label="Marquer terminées", command=self.bulk_complete_selected)
+        bulk_menu.add_command(label="Marquer en cours", command=lambda: self.bulk_update_selected("Marquer en cours", status="En cours"))
+        priority_menu = tk.Menu(bulk_menu, tearoff=0)
+        for priority in ["Haute", "Moyenne", "Basse"]:
+            priority_menu.add_command(label=priority, command=lambda p=priority: self.bulk_update_selected(f"Passer en priorité {p.lower()}", priority=p))
+        bulk_menu.add_cascade(label="Priorité", menu=priority_menu)
+        bulk_menu.add_command(label="Reporter...", command=self.bulk_reschedule_selected)
+        bulk_button["menu"] = bulk_menu
+        bulk_button.pack(side="left", padx=5)
         ttk.Button(button_frame, text="Vue Planning", style="Calendar.TButton", command=self.show_task_calendar).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Archives", command=self.show_task_archive).pack(side="left", padx=5)
 
         # Volet droit : Formulaire pour gérer les tâches
         self.form_frame = ttk.LabelFrame(self.main_frame, text="Gestion des Tâches")
@@ -206,6 +233,17 @@ class TaskManager:
         self.tasks_tree = None  # Pour le Treeview des tâches dans la vue planning
         self.subtasks_tree = None  # Pour le Treeview des sous-tâches dans la vue planning
         self.calendar = None  # Pour le calendrier dans la vue planning
+        self.calendar_events = {}  # Jour surligné (YYYY-MM-DD) -> identifiant du calevent
+        self.calendar_dirty_days = set()  # Jours modifiés depuis le dernier surlignage
+        # Actualisations en attente, regroupées par schedule_refresh
+        self.task_items = {}
+        self.task_item_keys = {}
+        self.task_sort = None  # Tri par en-tête de colonne actif : (colonne, ordre décroissant)
+        self.pending_task_ids = set()
+        self.pending_subtasks = False
+        self.pending_calendar = False
+        self.pending_select_id = None
+        self.refresh_after_id = None
         self.refresh_task_list()
 
     def init_db(self):
@@ -231,8 +269,28 @@ class TaskManager:
             self.cursor.execute("ALTER TABLE tasks ADD COLUMN priority TEXT DEFAULT 'Moyenne'")
         if 'recurrence' not in columns:
             self.cursor.execute("ALTER TABLE tasks ADD COLUMN recurrence TEXT DEFAULT 'Aucune'")
+        if 'recurrence_start' not in columns:
+            # Date de départ de la règle de récurrence ; due_date porte l'occurrence en cours
+            self.cursor.execute("ALTER TABLE tasks ADD COLUMN recurrence_start TEXT")
+        # Exceptions des tâches récurrentes : occurrences terminées (ou terminées par avance)
+        self.cursor.execute("""CREATE TABLE IF NOT EXISTS task_occurrences (
+            task_id INTEGER,
+            occurrence_date TEXT,
+            status TEXT DEFAULT 'Terminé',
+            PRIMARY KEY (task_id, occurrence_date),
+            FOREIGN KEY (task_id) REFERENCES tasks(id)
+        ) WITHOUT ROWID""")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_task_occurrences_date ON task_occurrences (occurrence_date)")
+        self.cursor.execute("""CREATE TRIGGER IF NOT EXISTS task_occurrences_ad AFTER DELETE ON tasks BEGIN
+            DELETE FROM task_occurrences WHERE task_id = old.id;
+        END""")
         self.cursor.execute("UPDATE tasks SET status='En cours' WHERE status='Reportée'")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_subtasks_task_status ON subtasks (task_id, status)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_due_status ON tasks (due_date, status)")
         self.conn.commit()
+        ensure_task_archive(self.conn, self.conn_library)
+        # Index de recherche : mots (FTS5) et vocabulaire par trigrammes pour la recherche approchée
+        self.fuzzy_enabled = ensure_tasks_index(self.conn) and ensure_tasks_terms_index(self.conn)
 
     def load_config(self):
         try:
@@ -244,21 +302,25 @@ class TaskManager:
                 self.status_filter = config.get("tasks_status_filter", "Tous")
                 if self.status_filter not in ["Tous", "En cours", "Terminé"]:
                     self.status_filter = "Tous"
+                self.archive_after_days = int(config.get("tasks_archive_after_days", DEFAULT_ARCHIVE_AFTER_DAYS))
             else:
                 self.exclude_saturday = False
                 self.exclude_sunday = False
                 self.status_filter = "Tous"
+                self.archive_after_days = DEFAULT_ARCHIVE_AFTER_DAYS
         except Exception:
             self.exclude_saturday = False
             self.exclude_sunday = False
             self.status_filter = "Tous"
+            self.archive_after_days = DEFAULT_ARCHIVE_AFTER_DAYS
 
     def save_config(self):
         try:
             config = {
                 "tasks_exclude_saturday": self.exclude_saturday_var.get(),
                 "tasks_exclude_sunday": self.exclude_sunday_var.get(),
-                "tasks_status_filter": self.status_filter_var.get()
+                "tasks_status_filter": self.status_filter_var.get(),
+                "tasks_archive_after_days": self.archive_after_days
             }
             with open(self.config_file, "w") as f:
                 json.dump(config, f, indent=4)
@@ -337,16 +399,11 @@ class TaskManager:
                                            (new_task_id, file_id))
             self.conn_library.commit()
 
-        self.refresh_task_list()
-        self.parent.after(100, self.refresh_calendar)
-
-        for item in self.task_tree.get_children():
-            if int(self.task_tree.item(item)["values"][0]) == new_task_id:
-                self.task_tree.selection_set(item)
-                self.task_tree.focus(item)
-                self.task_tree.see(item)
-                self.load_task_to_form(None)
-                break
+        if is_recurring(recurrence):
+            self.calendar_dirty_days = None
+        else:
+            self.mark_calendar_days(due_date)
+        self.schedule_refresh([new_task_id], select_task_id=new_task_id)
 
     def modify_task(self):
         if not self.current_task_id:
@@ -373,30 +430,145 @@ class TaskManager:
             messagebox.showwarning("Erreur", "La date d'échéance doit être au format YYYY-MM-DD !")
             return
 
-        self.cursor.execute("UPDATE tasks SET title=?, description=?, due_date=?, priority=?, status=?, recurrence=? WHERE id=?",
-                           (title, description, due_date, priority, status, recurrence, self.current_task_id))
+        self.mark_task_days([self.current_task_id])
+        # Si l'échéance ou la fréquence change, la règle de récurrence repart de la nouvelle échéance
+        self.cursor.execute("""UPDATE tasks SET title=?, description=?, due_date=?, priority=?, status=?, recurrence=?,
+                                   recurrence_start = CASE WHEN due_date = ? AND recurrence = ? THEN recurrence_start END
+                               WHERE id=?""",
+                           (title, description, due_date, priority, status, recurrence, due_date, recurrence, self.current_task_id))
         self.conn.commit()
-        self.refresh_task_list()
-        self.parent.after(100, self.refresh_calendar)
+        if is_recurring(recurrence):
+            self.calendar_dirty_days = None
+        else:
+            self.mark_calendar_days(due_date)
+        self.schedule_refresh([self.current_task_id])
+
+    def selected_task_ids(self):
+        return [self.task_tree.item(item)["values"][0] for item in self.task_tree.selection()]
 
     def delete_selected_tasks(self):
-        selected = self.task_tree.selection()
-        if not selected:
+        task_ids = self.selected_task_ids()
+        if not task_ids:
             messagebox.showwarning("Erreur", "Veuillez sélectionner au moins une tâche à supprimer.")
             return
-        if not messagebox.askyesno("Confirmation", f"Supprimer les {len(selected)} tâches sélectionnées ?"):
+        if not messagebox.askyesno("Confirmation", f"Supprimer les {len(task_ids)} tâches sélectionnées ?"):
+            return
+        if self.bulk_delete_tasks(task_ids):
+            self.clear_task_form()
+            self.after_bulk_operation(task_ids)
+            messagebox.showinfo("Succès", f"{len(task_ids)} tâches supprimées.")
+
+    def bulk_complete_selected(self):
+        task_ids = self.selected_task_ids()
+        if not task_ids:
+            messagebox.showwarning("Erreur", "Veuillez sélectionner au moins une tâche.")
+            return
+        if not messagebox.askyesno("Confirmation", f"Marquer les {len(task_ids)} tâches sélectionnées comme terminées ?\n"
+                                                   "Leurs sous-tâches seront également terminées."):
+            return
+        if self.bulk_complete_tasks(task_ids):
+            self.after_bulk_operation(task_ids)
+
+    def bulk_update_selected(self, label, **changes):
+        task_ids = self.selected_task_ids()
+        if not task_ids:
+            messagebox.showwarning("Erreur", "Veuillez sélectionner au moins une tâche.")
+            return
+        if not messagebox.askyesno("Confirmation", f"{label} pour les {len(task_ids)} tâches sélectionnées ?"):
+            return
+        if self.bulk_update_tasks(task_ids, **changes):
+            self.after_bulk_operation(task_ids)
+
+    def bulk_reschedule_selected(self):
+        if not self.task_tree.selection():
+            messagebox.showwarning("Erreur", "Veuillez sélectionner au moins une tâche.")
             return
-        for item in selected:
-            task_id = self.task_tree.item(item)["values"][0]
-            self.cursor.execute("DELETE FROM subtasks WHERE task_id=?", (task_id,))
-            self.cursor_library.execute("DELETE FROM task_file_link WHERE task_id=?", (task_id,))
+        reschedule_window = tk.Toplevel(self.parent)
+        reschedule_window.title("Reporter les tâches")
+        reschedule_window.geometry("300x120")
+        reschedule_window.transient(self.parent)
+        reschedule_window.grab_set()
+
+        ttk.Label(reschedule_window, text="Nouvelle échéance :").pack(pady=5)
+        due_date_var = tk.StringVar()
+        DateEntry(reschedule_window, textvariable=due_date_var, date_pattern="yyyy-mm-dd", width=12).pack(pady=5)
+
+        def confirm():
+            due_date = due_date_var.get()
+            reschedule_window.destroy()
+            self.bulk_update_selected(f"Reporter au {due_date}", due_date=due_date)
+
+        ttk.Button(reschedule_window, text="Confirmer", command=confirm).pack(pady=5)
+
+    def after_bulk_operation(self, task_ids):
+        # Une seule actualisation de la liste et du calendrier, quel que soit le nombre de tâches
+        self.schedule_refresh(task_ids, subtasks=True)
+
+    def bulk_delete_tasks(self, task_ids):
+        # Une requête par table, une transaction par base
+        ids = json.dumps([int(task_id) for task_id in task_ids])
+        try:
+            self.mark_task_days(task_ids)
+            self.cursor.execute("DELETE FROM subtasks WHERE task_id IN (SELECT value FROM json_each(?))", (ids,))
+            self.cursor.execute("DELETE FROM tasks WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+            self.cursor_library.execute("DELETE FROM task_file_link WHERE task_id IN (SELECT value FROM json_each(?))", (ids,))
+            self.conn.commit()
             self.conn_library.commit()
-            self.cursor.execute("DELETE FROM tasks WHERE id=?", (task_id,))
-        self.conn.commit()
-        self.clear_task_form()
-        self.refresh_task_list()
-        self.parent.after(100, self.refresh_calendar)
-        messagebox.showinfo("Succès", f"{len(selected)} tâches supprimées.")
+            return True
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            self.conn_library.rollback()
+            messagebox.showerror("Erreur", f"Impossible de supprimer les tâches : {e}")
+            return False
+
+    def bulk_complete_tasks(self, task_ids):
+        # Tâches simples terminées avec leurs sous-tâches ; tâches récurrentes passées à l'occurrence suivante
+        ids = json.dumps([int(task_id) for task_id in task_ids])
+        try:
+            self.mark_task_days(task_ids)
+            self.cursor.execute(f"""SELECT id FROM tasks WHERE id IN (SELECT value FROM json_each(?)) AND status != 'Terminé'
+                                    AND recurrence IN ({", ".join("?" * len(RECURRENCE_STEPS))})""", (ids,) + tuple(RECURRENCE_STEPS))
+            recurring_ids = [row[0] for row in self.cursor.fetchall()]
+            simple_ids = json.dumps(sorted(set(json.loads(ids)) - set(recurring_ids)))
+            self.cursor.execute("UPDATE subtasks SET status='Terminé' WHERE task_id IN (SELECT value FROM json_each(?))", (simple_ids,))
+            self.cursor.execute("UPDATE tasks SET status='Terminé' WHERE id IN (SELECT value FROM json_each(?))", (simple_ids,))
+            if recurring_ids:
+                self.complete_occurrences(recurring_ids)
+            self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            messagebox.showerror("Erreur", f"Impossible de terminer les tâches : {e}")
+            return False
+
+    def bulk_update_tasks(self, task_ids, status=None, priority=None, due_date=None):
+        # Changement de statut, de priorité ou d'échéance en une requête
+        ids = json.dumps([int(task_id) for task_id in task_ids])
+        assignments = []
+        params = []
+        if status is not None:
+            assignments.append("status=?")
+            params.append(status)
+        if priority is not None:
+            assignments.append("priority=?")
+            params.append(priority)
+        if due_date is not None:
+            # La règle de récurrence des tâches reportées repart de leur nouvelle échéance
+            assignments.extend(["recurrence_start = CASE WHEN due_date = ? THEN recurrence_start END", "due_date=?"])
+            params.extend([due_date, due_date])
+        if not assignments:
+            return False
+        try:
+            self.mark_task_days(task_ids)
+            self.cursor.execute(f"UPDATE tasks SET {', '.join(assignments)} WHERE id IN (SELECT value FROM json_each(?))",
+                                params + [ids])
+            self.conn.commit()
+            self.mark_calendar_days(due_date)
+            return True
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            messagebox.showerror("Erreur", f"Impossible de modifier les tâches : {e}")
+            return False
 
     def mark_completed(self):
         if not self.current_task_id:
@@ -423,57 +595,90 @@ class TaskManager:
             self.conn.commit()
 
         title, description, due_date, priority, recurrence = task
-        self.cursor.execute("UPDATE tasks SET status='Terminé' WHERE id=?", (self.current_task_id,))
-        self.conn.commit()
-
-        if recurrence != "Aucune":
-            new_due_date = self.calculate_next_due_date(due_date, recurrence)
-            self.cursor.execute("INSERT INTO tasks (title, description, due_date, priority, status, recurrence) VALUES (?, ?, ?, ?, 'En cours', ?)",
-                               (title, description, new_due_date, priority, recurrence))
+        if is_recurring(recurrence):
+            self.complete_occurrence(self.current_task_id)
+        else:
+            self.cursor.execute("UPDATE tasks SET status='Terminé' WHERE id=?", (self.current_task_id,))
             self.conn.commit()
+            self.mark_calendar_days(due_date)
 
-            self.cursor.execute("SELECT last_insert_rowid()")
-            new_task_id = self.cursor.fetchone()[0]
-
-            self.cursor.execute("SELECT title FROM subtasks WHERE task_id=?", (self.current_task_id,))
-            subtasks = self.cursor.fetchall()
-            for subtask in subtasks:
-                subtask_title = subtask[0]
-                self.cursor.execute("INSERT INTO subtasks (task_id, title, status) VALUES (?, ?, 'En cours')",
-                                   (new_task_id, subtask_title))
+        task_id = self.current_task_id
+        self.clear_task_form()
+        self.schedule_refresh([task_id], subtasks=True)
 
-            self.cursor_library.execute("SELECT file_id FROM task_file_link WHERE task_id=?", (self.current_task_id,))
-            file_links = self.cursor_library.fetchall()
-            for link in file_links:
-                file_id = link[0]
-                self.cursor_library.execute("INSERT INTO task_file_link (task_id, file_id) VALUES (?, ?)",
-                                           (new_task_id, file_id))
-            self.conn_library.commit()
+    def recurrence_rule(self, start, recurrence):
+        return RecurrenceRule(start, recurrence, self.exclude_saturday_var.get(), self.exclude_sunday_var.get())
 
-        self.clear_task_form()
-        self.refresh_subtasks()
-        self.refresh_task_list()
-        self.parent.after(100, self.refresh_calendar)
-
-    def calculate_next_due_date(self, due_date, recurrence):
-        due = datetime.strptime(due_date, "%Y-%m-%d").date()
-        if recurrence == "Quotidienne":
-            due += timedelta(days=1)
-        elif recurrence == "Hebdomadaire":
-            due += timedelta(weeks=1)
-        elif recurrence == "Mensuel":
-            due += timedelta(days=30)
-        elif recurrence == "Trimestrielle":
-            due += timedelta(days=90)
-        elif recurrence == "Semestrielle":
-            due += timedelta(days=180)
-        elif recurrence == "Annuelle":
-            due += timedelta(days=365)
-
-        while (self.exclude_saturday_var.get() and due.weekday() == 5) or (self.exclude_sunday_var.get() and due.weekday() == 6):
-            due += timedelta(days=1)
-
-        return due.strftime("%Y-%m-%d")
+    def complete_occurrence(self, task_id):
+        next_due_date = self.complete_occurrences([task_id])[task_id]
+        self.conn.commit()
+        return next_due_date
+
+    def complete_occurrences(self, task_ids):
+        # L'occurrence en cours de chaque tâche récurrente est enregistrée comme terminée, puis la tâche passe à
+        # l'occurrence suivante : sous-tâches et pièces associées restent celles de la tâche, rien n'est recopié.
+        # Une requête par table, sans validation : la transaction est celle de l'appelant.
+        ids = json.dumps([int(task_id) for task_id in task_ids])
+        self.cursor.execute("""SELECT id, due_date, recurrence, COALESCE(recurrence_start, due_date) FROM tasks
+                               WHERE id IN (SELECT value FROM json_each(?))""", (ids,))
+        tasks = self.cursor.fetchall()
+        self.cursor.execute("""SELECT o.task_id, o.occurrence_date FROM task_occurrences o JOIN tasks t ON t.id = o.task_id
+                               WHERE o.task_id IN (SELECT value FROM json_each(?)) AND o.occurrence_date > t.due_date""", (ids,))
+        skipped = {}
+        for task_id, day in self.cursor.fetchall():
+            skipped.setdefault(task_id, set()).add(day)
+        next_due_dates = {}
+        for task_id, due_date, recurrence, start in tasks:
+            next_due_dates[task_id] = self.recurrence_rule(start, recurrence).next_after(due_date, skipped.get(task_id, ())).isoformat()
+            self.mark_calendar_days(due_date, next_due_dates[task_id])
+        self.cursor.executemany("INSERT OR REPLACE INTO task_occurrences (task_id, occurrence_date, status) VALUES (?, ?, 'Terminé')",
+                                [(task_id, due_date) for task_id, due_date, _, _ in tasks])
+        self.cursor.executemany("UPDATE tasks SET due_date=?, recurrence_start=?, status='En cours' WHERE id=?",
+                                [(next_due_dates[task_id], start, task_id) for task_id, _, _, start in tasks])
+        self.cursor.execute("UPDATE subtasks SET status='En cours' WHERE task_id IN (SELECT value FROM json_each(?))", (ids,))
+        return next_due_dates
+
+    def toggle_occurrence(self, task_id, day):
+        # Occurrence d'une tâche récurrente autre que l'occurrence en cours : terminée par avance, ou rouverte
+        self.cursor.execute("SELECT due_date FROM tasks WHERE id=?", (task_id,))
+        due_date = self.cursor.fetchone()[0]
+        self.cursor.execute("SELECT status FROM task_occurrences WHERE task_id=? AND occurrence_date=?", (task_id, day))
+        if self.cursor.fetchone():
+            if not messagebox.askyesno("Confirmation", "Marquer cette occurrence comme en cours ?"):
+                return False
+            self.cursor.execute("DELETE FROM task_occurrences WHERE task_id=? AND occurrence_date=?", (task_id, day))
+            if day < due_date:
+                # Une occurrence passée rouverte redevient l'occurrence en cours
+                self.cursor.execute("UPDATE tasks SET due_date=?, status='En cours' WHERE id=?", (day, task_id))
+        else:
+            if not messagebox.askyesno("Confirmation", "Marquer cette occurrence comme terminée ?"):
+                return False
+            self.cursor.execute("INSERT INTO task_occurrences (task_id, occurrence_date, status) VALUES (?, ?, 'Terminé')", (task_id, day))
+        self.conn.commit()
+        self.mark_calendar_days(day, due_date)
+        return True
+
+    def recurring_occurrences(self, first_day, last_day):
+        # Occurrences des tâches récurrentes entre deux jours, hors occurrence en cours (portée par due_date) :
+        # occurrences terminées enregistrées, puis occurrences suivantes calculées par la règle
+        occurrences = {}
+        self.cursor.execute("SELECT task_id, occurrence_date, status FROM task_occurrences WHERE occurrence_date BETWEEN ? AND ?",
+                            (first_day, last_day))
+        exceptions = set()
+        for task_id, day, status in self.cursor.fetchall():
+            exceptions.add((task_id, day))
+            occurrences.setdefault(day, []).append((task_id, status))
+        self.cursor.execute(f"""SELECT id, due_date, recurrence, COALESCE(recurrence_start, due_date) FROM tasks
+                                WHERE recurrence IN ({", ".join("?" * len(RECURRENCE_STEPS))})
+                                AND status != 'Terminé' AND due_date != '' AND due_date < ?""",
+                            tuple(RECURRENCE_STEPS) + (last_day,))
+        for task_id, due_date, recurrence, start in self.cursor.fetchall():
+            first = max(first_day, (date.fromisoformat(due_date) + timedelta(days=1)).isoformat())
+            for day in self.recurrence_rule(start, recurrence).occurrences(first, last_day):
+                day = day.isoformat()
+                if (task_id, day) not in exceptions:
+                    occurrences.setdefault(day, []).append((task_id, "En cours"))
+        return occurrences
 
     def add_subtask(self):
         if not self.current_task_id:
@@ -501,9 +706,7 @@ class TaskManager:
             self.cursor.execute("INSERT INTO subtasks (task_id, title, status) VALUES (?, ?, 'En cours')",
                                (self.current_task_id, title))
             self.conn.commit()
-            self.refresh_subtasks()
-            self.refresh_task_list()
-            self.parent.after(100, self.refresh_calendar)
+            self.schedule_refresh([self.current_task_id], subtasks=True)
             subtask_window.destroy()
 
         ttk.Button(subtask_window, text="Ajouter", command=save_subtask).pack(pady=5)
@@ -522,9 +725,7 @@ class TaskManager:
             return
         self.cursor.execute("UPDATE subtasks SET status=? WHERE id=?", (new_status, subtask_id))
         self.conn.commit()
-        self.refresh_subtasks()
-        self.refresh_task_list()
-        self.parent.after(100, self.refresh_calendar)
+        self.schedule_refresh([self.current_task_id], subtasks=True)
 
     def delete_subtask(self):
         selected = self.subtask_tree.selection()
@@ -536,9 +737,7 @@ class TaskManager:
             return
         self.cursor.execute("DELETE FROM subtasks WHERE id=?", (subtask_id,))
         self.conn.commit()
-        self.refresh_subtasks()
-        self.refresh_task_list()
-        self.parent.after(100, self.refresh_calendar)
+        self.schedule_refresh([self.current_task_id], subtasks=True)
 
     def modify_subtask(self):
         selected = self.subtask_tree.selection()
@@ -568,9 +767,7 @@ class TaskManager:
                 return
             self.cursor.execute("UPDATE subtasks SET title=? WHERE id=?", (new_title, subtask_id))
             self.conn.commit()
-            self.refresh_subtasks()
-            self.refresh_task_list()
-            self.parent.after(100, self.refresh_calendar)
+            self.schedule_refresh([self.current_task_id], subtasks=True)
             subtask_window.destroy()
 
         ttk.Button(subtask_window, text="Modifier", command=save_subtask).pack(pady=5)
@@ -608,12 +805,14 @@ class TaskManager:
             if completed_subtasks == total_subtasks and task_status != "Terminé":
                 self.cursor.execute("UPDATE tasks SET status='Terminé' WHERE id=?", (self.current_task_id,))
                 self.conn.commit()
-                self.refresh_task_list()
+                self.mark_task_days([self.current_task_id])
+                self.schedule_refresh([self.current_task_id])
             elif in_progress_subtasks > 0 and task_status == "Terminé":
                 self.cursor.execute("UPDATE tasks SET status='En cours' WHERE id=?", (self.current_task_id,))
                 self.conn.commit()
+                self.mark_task_days([self.current_task_id])
                 self.status_var.set("En cours")
-                self.refresh_task_list()
+                self.schedule_refresh([self.current_task_id])
         else:
             self.progress_bar["value"] = 0
             self.progress_label.config(text="Progression: 0%")
@@ -683,7 +882,7 @@ class TaskManager:
         button_frame.pack(fill="x", pady=5)
         ttk.Button(button_frame, text="Marquer Tâche Terminé/En cours", style="ToggleSubtask.TButton", command=self.toggle_task_status_calendar).pack(side="left", padx=5)
         ttk.Button(button_frame, text="Marquer Sous-tâche Terminé/En cours", style="ToggleSubtask.TButton", command=self.toggle_subtask_status_calendar).pack(side="left", padx=5)
-        ttk.Button(button_frame, text="Actualiser", style="Refresh.TButton", command=self.refresh_calendar).pack(side="right", padx=5)
+        ttk.Button(button_frame, text="Actualiser", style="Refresh.TButton", command=lambda: self.refresh_calendar(full=True)).pack(side="right", padx=5)
 
         def update_tasks(event=None):
             selected_task = self.tasks_tree.selection()
@@ -697,21 +896,7 @@ class TaskManager:
                 self.subtasks_tree.delete(item)
             selected_date = self.calendar.get_date()
             tasks_frame.config(text=f"Tâches pour le {selected_date}")
-            self.cursor.execute("SELECT id, title, priority, status, recurrence FROM tasks WHERE due_date=?", (selected_date,))
-            tasks = self.cursor.fetchall()
-            for index, task in enumerate(tasks):
-                task_id, title, priority, status, recurrence = task
-                self.cursor.execute("SELECT COUNT(*) FROM subtasks WHERE task_id=?", (task_id,))
-                total_subtasks = self.cursor.fetchone()[0]
-                self.cursor.execute("SELECT COUNT(*) FROM subtasks WHERE task_id=? AND status='Terminé'", (task_id,))
-                completed_subtasks = self.cursor.fetchone()[0]
-                progress = f"{int((completed_subtasks / total_subtasks) * 100) if total_subtasks > 0 else 0}%"
-                if status == "Terminé" and total_subtasks == 0:
-                    progress = "100%"
-                tag = "OddRow" if index % 2 else "EvenRow"
-                item = self.tasks_tree.insert("", tk.END, values=(title, priority, status, recurrence, progress), tags=(task_id, tag))
-                if title == selected_task_title:
-                    self.tasks_tree.selection_set(item)
+            self.fill_calendar_tasks(selected_date, selected_task_title)
 
         def update_subtasks(event=None):
             selected_subtask = self.subtasks_tree.selection()
@@ -733,50 +918,128 @@ class TaskManager:
                     self.subtasks_tree.selection_set(item)
 
         self.calendar.bind("<<CalendarSelected>>", update_tasks)
+        self.calendar.bind("<<CalendarMonthChanged>>", lambda event: self.highlight_calendar_days())
         self.tasks_tree.bind("<<TreeviewSelect>>", update_subtasks)
 
-        self.highlight_calendar_days()
-        update_tasks()
-
-        ttk.Button(self.calendar_window, text="Fermer", command=self.close_calendar).pack(pady=5)
-
-    def highlight_calendar_days(self):
         self.calendar.tag_config("has_tasks", background="lightblue")
         self.calendar.tag_config("overdue", background="lightcoral")
         self.calendar.tag_config("all_completed", background="lightgreen")
+        self.calendar_events = {}
+        self.highlight_calendar_days()
+        update_tasks()
 
-        self.cursor.execute("SELECT id, due_date, status FROM tasks WHERE due_date IS NOT NULL")
-        tasks = self.cursor.fetchall()
-        today = datetime.now().date()
+        ttk.Button(self.calendar_window, text="Fermer", command=self.close_calendar).pack(pady=5)
 
-        tasks_by_day = {}
-        for task in tasks:
-            task_id, due_date, status = task
-            if not due_date:
+    def fill_calendar_tasks(self, selected_date, selected_task_title=None):
+        # Tâches du jour avec leur progression, calculée en une requête
+        self.cursor.execute('''SELECT tasks.id, tasks.title, tasks.priority, tasks.status, tasks.recurrence,
+                                      COUNT(subtasks.id), COUNT(CASE WHEN subtasks.status = 'Terminé' THEN 1 END)
+                               FROM tasks LEFT JOIN subtasks ON subtasks.task_id = tasks.id
+                               WHERE tasks.due_date=? GROUP BY tasks.id''', (selected_date,))
+        rows = []
+        for task_id, title, priority, status, recurrence, total_subtasks, completed_subtasks in self.cursor.fetchall():
+            progress = f"{int((completed_subtasks / total_subtasks) * 100) if total_subtasks > 0 else 0}%"
+            if status == "Terminé" and total_subtasks == 0:
+                progress = "100%"
+            rows.append((task_id, title, priority, status, recurrence, progress))
+
+        # Autres occurrences des tâches récurrentes tombant ce jour-là
+        occurrences = dict(self.recurring_occurrences(selected_date, selected_date).get(selected_date, []))
+        if occurrences:
+            self.cursor.execute("SELECT id, title, priority, recurrence FROM tasks WHERE id IN (SELECT value FROM json_each(?))",
+                                (json.dumps(list(occurrences)),))
+            for task_id, title, priority, recurrence in self.cursor.fetchall():
+                status = occurrences[task_id]
+                rows.append((task_id, title, priority, status, recurrence, "100%" if status == "Terminé" else "0%"))
+
+        for index, (task_id, title, priority, status, recurrence, progress) in enumerate(rows):
+            tag = "OddRow" if index % 2 else "EvenRow"
+            item = self.tasks_tree.insert("", tk.END, values=(title, priority, status, recurrence, progress), tags=(task_id, tag))
+            if title == selected_task_title:
+                self.tasks_tree.selection_set(item)
+
+    def calendar_window_range(self):
+        # Mois affiché, avec une marge couvrant les jours des mois voisins visibles dans la grille
+        month, year = self.calendar.get_displayed_month()
+        first_day = date(year, month, 1)
+        next_month = date(year + month // 12, month % 12 + 1, 1)
+        return ((first_day - timedelta(days=CALENDAR_MARGIN_DAYS)).isoformat(),
+                (next_month + timedelta(days=CALENDAR_MARGIN_DAYS - 1)).isoformat())
+
+    def calendar_day_states(self, first_day, last_day, days=None):
+        # Un état par jour (en retard, tout terminé ou tâches en cours), entre deux jours ou pour les seuls jours donnés.
+        # Les tâches sont agrégées en SQL ; les autres occurrences des tâches récurrentes viennent de leur règle.
+        today = date.today().isoformat()
+        if days is None:
+            where, params = "due_date BETWEEN ? AND ?", (first_day, last_day)
+        else:
+            where, params = "due_date IN (SELECT value FROM json_each(?))", (json.dumps(list(days)),)
+        self.cursor.execute(f'''SELECT due_date,
+                                       MAX(status != 'Terminé' AND due_date < ?),
+                                       COUNT(CASE WHEN status != 'Terminé' THEN 1 END)
+                                FROM tasks WHERE {where} GROUP BY due_date''', (today,) + params)
+        counts = {due_date: [has_overdue, open_tasks] for due_date, has_overdue, open_tasks in self.cursor.fetchall()}
+        for day, occurrences in self.recurring_occurrences(first_day, last_day).items():
+            if days is not None and day not in days:
                 continue
-            due_date = datetime.strptime(due_date, "%Y-%m-%d").date()
-            if due_date not in tasks_by_day:
-                tasks_by_day[due_date] = []
-            tasks_by_day[due_date].append((task_id, status))
-
-        for due_date, tasks in tasks_by_day.items():
-            all_completed = True
-            has_overdue = False
-            has_tasks = False
-
-            for _, status in tasks:
+            day_counts = counts.setdefault(day, [0, 0])
+            for _, status in occurrences:
                 if status != "Terminé":
-                    has_tasks = True
-                    all_completed = False
-                    if due_date < today:
-                        has_overdue = True
-
+                    day_counts[1] += 1
+                    if day < today:
+                        day_counts[0] = 1
+        states = {}
+        for due_date, (has_overdue, open_tasks) in counts.items():
             if has_overdue:
-                self.calendar.calevent_create(due_date, "overdue", "overdue")
-            elif all_completed and tasks:
-                self.calendar.calevent_create(due_date, "all_completed", "all_completed")
-            elif has_tasks:
-                self.calendar.calevent_create(due_date, "has_tasks", "has_tasks")
+                states[due_date] = "overdue"
+            elif open_tasks == 0:
+                states[due_date] = "all_completed"
+            else:
+                states[due_date] = "has_tasks"
+        return states
+
+    def set_calendar_day(self, day, state):
+        event_id = self.calendar_events.pop(day, None)
+        if event_id is not None:
+            self.calendar.calevent_remove(event_id)
+        if state:
+            self.calendar_events[day] = self.calendar.calevent_create(date.fromisoformat(day), state, state)
+
+    def highlight_calendar_days(self):
+        # Surligne uniquement la fenêtre visible ; les autres mois le seront à l'affichage
+        start, end = self.calendar_window_range()
+        states = self.calendar_day_states(start, end)
+        self.calendar.calevent_remove("all")
+        self.calendar_events = {}
+        for day, state in states.items():
+            self.set_calendar_day(day, state)
+        self.calendar_dirty_days = set()
+
+    def update_calendar_days(self, days):
+        # Met à jour les seuls jours touchés par une modification
+        start, end = self.calendar_window_range()
+        days = {day for day in days if start <= day <= end}
+        if not days:
+            return
+        states = self.calendar_day_states(min(days), max(days), days)
+        for day in days:
+            self.set_calendar_day(day, states.get(day))
+
+    def mark_calendar_days(self, *days):
+        # None : tout le calendrier est à resurligner
+        if self.calendar_dirty_days is not None:
+            self.calendar_dirty_days.update(day for day in days if day)
+
+    def mark_task_days(self, task_ids):
+        # Jours d'échéance des tâches, à relever avant leur modification ou leur suppression.
+        # Une tâche récurrente occupe tous les jours de sa règle : le calendrier entier est alors à revoir.
+        self.cursor.execute("SELECT due_date, recurrence FROM tasks WHERE id IN (SELECT value FROM json_each(?))",
+                            (json.dumps([int(task_id) for task_id in task_ids]),))
+        rows = self.cursor.fetchall()
+        if any(is_recurring(recurrence) for _, recurrence in rows):
+            self.calendar_dirty_days = None
+        else:
+            self.mark_calendar_days(*(due_date for due_date, _ in rows))
 
     def toggle_task_status_calendar(self):
         selected = self.tasks_tree.selection()
@@ -792,6 +1055,12 @@ class TaskManager:
 
         title, description, due_date, priority, current_status, recurrence = task
 
+        selected_date = self.calendar.get_date()
+        if is_recurring(recurrence) and selected_date != due_date:
+            if self.toggle_occurrence(task_id, selected_date):
+                self.schedule_refresh([task_id], subtasks=True)
+            return
+
         # Vérifier si toutes les sous-tâches sont terminées
         self.cursor.execute("SELECT COUNT(*) FROM subtasks WHERE task_id=?", (task_id,))
         total_subtasks = self.cursor.fetchone()[0]
@@ -808,35 +1077,14 @@ class TaskManager:
         new_status = "Terminé" if current_status == "En cours" else "En cours"
         if not messagebox.askyesno("Confirmation", f"Marquer la tâche comme {new_status.lower()} ?"):
             return
-        self.cursor.execute("UPDATE tasks SET status=? WHERE id=?", (new_status, task_id))
-        self.conn.commit()
-
-        if new_status == "Terminé" and recurrence and recurrence != "Aucune":
-            new_due_date = self.calculate_next_due_date(due_date, recurrence)
-            self.cursor.execute("INSERT INTO tasks (title, description, due_date, priority, status, recurrence) VALUES (?, ?, ?, ?, ?, ?)",
-                               (title, description, new_due_date, priority, "En cours", recurrence))
+        if new_status == "Terminé" and is_recurring(recurrence):
+            self.complete_occurrence(task_id)
+        else:
+            self.cursor.execute("UPDATE tasks SET status=? WHERE id=?", (new_status, task_id))
             self.conn.commit()
+            self.mark_task_days([task_id])
 
-            self.cursor.execute("SELECT last_insert_rowid()")
-            new_task_id = self.cursor.fetchone()[0]
-
-            self.cursor.execute("SELECT title FROM subtasks WHERE task_id=?", (task_id,))
-            subtasks = self.cursor.fetchall()
-            for subtask in subtasks:
-                subtask_title = subtask[0]
-                self.cursor.execute("INSERT INTO subtasks (task_id, title, status) VALUES (?, ?, 'En cours')",
-                                   (new_task_id, subtask_title))
-
-            self.cursor_library.execute("SELECT file_id FROM task_file_link WHERE task_id=?", (task_id,))
-            file_links = self.cursor_library.fetchall()
-            for link in file_links:
-                file_id = link[0]
-                self.cursor_library.execute("INSERT INTO task_file_link (task_id, file_id) VALUES (?, ?)",
-                                           (new_task_id, file_id))
-            self.conn_library.commit()
-
-        self.refresh_task_list()
-        self.parent.after(100, self.refresh_calendar)
+        self.schedule_refresh([task_id], subtasks=True)
 
     def toggle_subtask_status_calendar(self):
         selected = self.subtasks_tree.selection()
@@ -872,41 +1120,21 @@ class TaskManager:
         title, description, due_date, priority, task_status, recurrence = task
 
         if total_subtasks > 0 and completed_subtasks == total_subtasks and task_status != "Terminé":
-            self.cursor.execute("UPDATE tasks SET status='Terminé' WHERE id=?", (task_id,))
-            self.conn.commit()
-
-            if recurrence and recurrence != "Aucune":
-                new_due_date = self.calculate_next_due_date(due_date, recurrence)
-                self.cursor.execute("INSERT INTO tasks (title, description, due_date, priority, status, recurrence) VALUES (?, ?, ?, ?, ?, ?)",
-                                   (title, description, new_due_date, priority, "En cours", recurrence))
+            if is_recurring(recurrence):
+                self.complete_occurrence(task_id)
+            else:
+                self.cursor.execute("UPDATE tasks SET status='Terminé' WHERE id=?", (task_id,))
                 self.conn.commit()
-
-                self.cursor.execute("SELECT last_insert_rowid()")
-                new_task_id = self.cursor.fetchone()[0]
-
-                self.cursor.execute("SELECT title FROM subtasks WHERE task_id=?", (task_id,))
-                subtasks = self.cursor.fetchall()
-                for subtask in subtasks:
-                    subtask_title = subtask[0]
-                    self.cursor.execute("INSERT INTO subtasks (task_id, title, status) VALUES (?, ?, 'En cours')",
-                                       (new_task_id, subtask_title))
-
-                self.cursor_library.execute("SELECT file_id FROM task_file_link WHERE task_id=?", (task_id,))
-                file_links = self.cursor_library.fetchall()
-                for link in file_links:
-                    file_id = link[0]
-                    self.cursor_library.execute("INSERT INTO task_file_link (task_id, file_id) VALUES (?, ?)",
-                                               (new_task_id, file_id))
-                self.conn_library.commit()
+                self.mark_calendar_days(due_date)
 
         elif total_subtasks > 0 and completed_subtasks < total_subtasks and task_status == "Terminé":
             self.cursor.execute("UPDATE tasks SET status='En cours' WHERE id=?", (task_id,))
             self.conn.commit()
+            self.mark_task_days([task_id])
 
-        self.refresh_task_list()
-        self.parent.after(100, self.refresh_calendar)
+        self.schedule_refresh([task_id], subtasks=True)
 
-    def refresh_calendar(self):
+    def refresh_calendar(self, full=False):
         if self.calendar_window and self.calendar_window.winfo_exists():
             selected_date = self.calendar.get_date()
             selected_task = self.tasks_tree.selection()
@@ -922,21 +1150,7 @@ class TaskManager:
                 self.tasks_tree.delete(item)
             for item in self.subtasks_tree.get_children():
                 self.subtasks_tree.delete(item)
-            self.cursor.execute("SELECT id, title, priority, status, recurrence FROM tasks WHERE due_date=?", (selected_date,))
-            tasks = self.cursor.fetchall()
-            for index, task in enumerate(tasks):
-                task_id, title, priority, status, recurrence = task
-                self.cursor.execute("SELECT COUNT(*) FROM subtasks WHERE task_id=?", (task_id,))
-                total_subtasks = self.cursor.fetchone()[0]
-                self.cursor.execute("SELECT COUNT(*) FROM subtasks WHERE task_id=? AND status='Terminé'", (task_id,))
-                completed_subtasks = self.cursor.fetchone()[0]
-                progress = f"{int((completed_subtasks / total_subtasks) * 100) if total_subtasks > 0 else 0}%"
-                if status == "Terminé" and total_subtasks == 0:
-                    progress = "100%"
-                tag = "OddRow" if index % 2 else "EvenRow"
-                item = self.tasks_tree.insert("", tk.END, values=(title, priority, status, recurrence, progress), tags=(task_id, tag))
-                if title == selected_task_title:
-                    self.tasks_tree.selection_set(item)
+            self.fill_calendar_tasks(selected_date, selected_task_title)
 
             if selected_task_title:
                 selected = self.tasks_tree.selection()
@@ -949,7 +1163,11 @@ class TaskManager:
                         if row[0] == selected_subtask_title:
                             self.subtasks_tree.selection_set(item)
 
-            self.highlight_calendar_days()
+            if full or self.calendar_dirty_days is None:
+                self.highlight_calendar_days()
+            else:
+                self.update_calendar_days(self.calendar_dirty_days)
+        self.calendar_dirty_days = set()
 
     def close_calendar(self):
         self.calendar_window.destroy()
@@ -1158,29 +1376,37 @@ class TaskManager:
 
         self.sort_direction[col] = not reverse
         self.task_tree.heading(col, command=lambda: self.sort_column(col, not reverse))
+        self.task_sort = (col, reverse)
 
-    def refresh_task_list(self):
-        selected = self.task_tree.selection()
-        selected_id = None
-        if selected:
-            selected_id = self.task_tree.item(selected[0])["values"][0]
-
-        for item in self.task_tree.get_children():
-            self.task_tree.delete(item)
-
+    def task_list_query(self, task_ids=None):
         search_term = self.search_var.get()
         status_filter = self.status_filter_var.get()
         due_filter = self.due_filter_var.get()
 
-        query = "SELECT id, title, due_date, priority, status, recurrence FROM tasks WHERE 1=1"
+        # Avancement calculé en une requête : nombre de sous-tâches et de sous-tâches terminées par tâche
+        query = """SELECT tasks.id, tasks.title, tasks.due_date, tasks.priority, tasks.status, tasks.recurrence,
+                          COUNT(subtasks.id), COUNT(CASE WHEN subtasks.status = 'Terminé' THEN 1 END)
+                   FROM tasks LEFT JOIN subtasks ON subtasks.task_id = tasks.id
+                   WHERE 1=1"""
         params = []
-
-        if search_term:
-            query += " AND (LOWER(title) LIKE ? OR LOWER(description) LIKE ?)"
-            params.extend([f"%{search_term.lower()}%", f"%{search_term.lower()}%"])
+        if task_ids is not None:
+            query += " AND tasks.id IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps([int(task_id) for task_id in task_ids]))
+
+        if search_term.strip() and self.fuzzy_search_var.get() and self.fuzzy_enabled:
+            refresh_tasks_terms_index(self.conn)
+            fuzzy = fuzzy_match_sql(self.conn, "tasks_fts", "tasks_terms", search_term.split())
+            if fuzzy is None:
+                query += " AND 0"
+            else:
+                query += f" AND tasks.id IN (SELECT rowid FROM ({fuzzy[0]}))"
+                params.extend(fuzzy[1])
+        elif search_term:
+            query += " AND (normalize_text(tasks.title) LIKE ? OR normalize_text(tasks.description) LIKE ?)"
+            params.extend([f"%{normalize_text(search_term)}%", f"%{normalize_text(search_term)}%"])
 
         if status_filter != "Tous":
-            query += " AND status = ?"
+            query += " AND tasks.status = ?"
             params.append(status_filter)
 
         if due_filter != "Toutes":
@@ -1198,45 +1424,143 @@ class TaskManager:
                 query += " AND due_date BETWEEN ? AND ?"
                 params.extend([month_start.strftime("%Y-%m-%d"), month_end.strftime("%Y-%m-%d")])
 
-        self.cursor.execute(query, params)
-        rows = self.cursor.fetchall()
+        # Tri par échéance (tâches sans échéance en dernier), puis par ordre de création
+        query += " GROUP BY tasks.id ORDER BY COALESCE(NULLIF(tasks.due_date, ''), '9999-12-31'), tasks.id"
+        return query, params
+
+    @staticmethod
+    def task_sort_key(row):
+        # Même ordre que la requête : échéance (sans échéance en dernier), puis identifiant
+        return (row[2] or "9999-12-31", row[0])
+
+    def task_row(self, row, index):
+        total_subtasks = row[6]
+        completed_subtasks = row[7]
+        progress = f"{int((completed_subtasks / total_subtasks) * 100) if total_subtasks > 0 else 0}%"
+        if row[4] == "Terminé" and total_subtasks == 0:
+            progress = "100%"
+        values = (row[0], row[1], row[2], row[3], row[4], row[5], progress)
+        tags = ["OddRow" if index % 2 else "EvenRow"]
+        if row[2]:
+            today = datetime.now().date()
+            threshold_date = today + timedelta(days=3)
+            due_date_obj = datetime.strptime(row[2], "%Y-%m-%d").date()
+            if (due_date_obj <= today or due_date_obj <= threshold_date) and row[4] == "En cours":
+                tags.append("urgent")
+            elif row[4] == "Terminé":
+                tags.append("completed")
+        return values, tags
 
-        items = []
-        today = datetime.now().date()
-        threshold_date = today + timedelta(days=3)
+    def refresh_task_list(self):
+        # Toute la sélection est conservée (actions groupées)
+        selected_ids = [self.task_tree.item(item)["values"][0] for item in self.task_tree.selection()]
 
-        for index, row in enumerate(rows):
-            task_id = row[0]
-            due_date = row[2] if row[2] else "9999-12-31"
-            self.cursor.execute("SELECT COUNT(*) FROM subtasks WHERE task_id=?", (task_id,))
-            total_subtasks = self.cursor.fetchone()[0]
-            self.cursor.execute("SELECT COUNT(*) FROM subtasks WHERE task_id=? AND status='Terminé'", (task_id,))
-            completed_subtasks = self.cursor.fetchone()[0]
-            progress = f"{int((completed_subtasks / total_subtasks) * 100) if total_subtasks > 0 else 0}%"
-            if row[4] == "Terminé" and total_subtasks == 0:
-                progress = "100%"
-            values = (row[0], row[1], row[2], row[3], row[4], row[5], progress)
-            tags = ["OddRow" if index % 2 else "EvenRow"]
-            if row[2]:
-                due_date_obj = datetime.strptime(row[2], "%Y-%m-%d").date()
-                if (due_date_obj <= today or due_date_obj <= threshold_date) and row[4] == "En cours":
-                    tags.append("urgent")
-                elif row[4] == "Terminé":
-                    tags.append("completed")
-            item = self.task_tree.insert("", tk.END, values=values, tags=tags)
-            items.append((item, task_id, due_date))
+        for item in self.task_tree.get_children():
+            self.task_tree.delete(item)
 
-        items.sort(key=lambda x: x[2])
-        for index, (item, task_id, due_date) in enumerate(items):
-            self.task_tree.move(item, "", index)
+        query, params = self.task_list_query()
+        rows = query_cache.execute(self.conn, query, params)
 
-        if selected_id:
-            for item, task_id, _ in items:
-                if task_id == selected_id:
-                    self.task_tree.selection_set(item)
-                    self.task_tree.focus(item)
-                    self.task_tree.see(item)
-                    break
+        # Élément de l'arborescence par tâche et clé de tri par élément, pour les mises à jour partielles
+        self.task_items = {}
+        self.task_item_keys = {}
+        for index, row in enumerate(rows):
+            values, tags = self.task_row(row, index)
+            item = self.task_tree.insert("", tk.END, values=values, tags=tags)
+            self.task_items[row[0]] = item
+            self.task_item_keys[item] = self.task_sort_key(row)
+
+        # Le tri choisi par en-tête de colonne est réappliqué à la liste rechargée
+        if self.task_sort is not None:
+            self.sort_column(*self.task_sort)
+
+        selected_items = [self.task_items[task_id] for task_id in selected_ids if task_id in self.task_items]
+        if selected_items:
+            self.task_tree.selection_set(selected_items)
+            self.task_tree.focus(selected_items[0])
+            self.task_tree.see(selected_items[0])
+
+    def update_task_rows(self, task_ids):
+        # Ne recharge que les tâches modifiées : ligne mise à jour sur place, réinsérée à sa place si son
+        # échéance a changé, ou retirée si la tâche n'existe plus ou ne correspond plus aux filtres.
+        # Les positions sont calculées dans l'ordre de la requête : après un tri par en-tête de colonne,
+        # la liste est rechargée (et triée de nouveau)
+        if len(task_ids) > MAX_PARTIAL_REFRESH or self.task_sort is not None:
+            self.refresh_task_list()
+            return
+        query, params = self.task_list_query(task_ids)
+        rows = {row[0]: row for row in query_cache.execute(self.conn, query, params)}
+        restripe_from = None  # Première ligne dont l'alternance des couleurs a pu changer
+        for task_id in task_ids:
+            item = self.task_items.get(task_id)
+            row = rows.get(task_id)
+            if row is None:
+                if item is not None:
+                    index = self.task_tree.index(item)
+                    restripe_from = index if restripe_from is None else min(restripe_from, index)
+                    self.task_tree.delete(item)
+                    del self.task_items[task_id]
+                    del self.task_item_keys[item]
+                continue
+            key = self.task_sort_key(row)
+            if item is not None and self.task_item_keys[item] == key:
+                values, tags = self.task_row(row, self.task_tree.index(item))
+                self.task_tree.item(item, values=values, tags=tags)
+                continue
+            selected = item is not None and item in self.task_tree.selection()
+            if item is not None:
+                index = self.task_tree.index(item)
+                restripe_from = index if restripe_from is None else min(restripe_from, index)
+                self.task_tree.delete(item)
+                del self.task_item_keys[item]
+            index = bisect.bisect_left([self.task_item_keys[child] for child in self.task_tree.get_children()], key)
+            values, tags = self.task_row(row, index)
+            item = self.task_tree.insert("", index, values=values, tags=tags)
+            self.task_items[task_id] = item
+            self.task_item_keys[item] = key
+            if selected:
+                self.task_tree.selection_add(item)
+            restripe_from = index if restripe_from is None else min(restripe_from, index)
+        if restripe_from is not None:
+            for index, item in enumerate(self.task_tree.get_children()[restripe_from:], restripe_from):
+                tags = [tag for tag in self.task_tree.item(item, "tags") if tag not in ("OddRow", "EvenRow")]
+                self.task_tree.item(item, tags=["OddRow" if index % 2 else "EvenRow"] + tags)
+
+    def schedule_refresh(self, task_ids=None, subtasks=False, calendar=True, select_task_id=None):
+        # Les vues sont marquées à actualiser ; les demandes reçues d'ici la prochaine image sont regroupées
+        # en une seule actualisation (flush_refresh). task_ids=None : liste des tâches entièrement rechargée.
+        if task_ids is None:
+            self.pending_task_ids = None
+        elif self.pending_task_ids is not None:
+            self.pending_task_ids.update(int(task_id) for task_id in task_ids)
+        self.pending_subtasks = self.pending_subtasks or subtasks
+        self.pending_calendar = self.pending_calendar or calendar
+        if select_task_id is not None:
+            self.pending_select_id = select_task_id
+        if self.refresh_after_id is None:
+            self.refresh_after_id = self.parent.after(REFRESH_DELAY_MS, self.flush_refresh)
+
+    def flush_refresh(self):
+        self.refresh_after_id = None
+        task_ids, self.pending_task_ids = self.pending_task_ids, set()
+        subtasks, self.pending_subtasks = self.pending_subtasks, False
+        calendar, self.pending_calendar = self.pending_calendar, False
+        select_task_id, self.pending_select_id = self.pending_select_id, None
+
+        if task_ids is None:
+            self.refresh_task_list()
+        elif task_ids:
+            self.update_task_rows(sorted(task_ids))
+        if subtasks:
+            self.refresh_subtasks()
+        if calendar:
+            self.refresh_calendar()
+        if select_task_id in self.task_items:
+            item = self.task_items[select_task_id]
+            self.task_tree.selection_set(item)
+            self.task_tree.focus(item)
+            self.task_tree.see(item)
+            self.load_task_to_form(None)
 
     def filter_tasks(self, event=None):
         self.refresh_task_list()
@@ -1307,28 +1631,153 @@ class TaskManager:
             tag = "OddRow" if index % 2 else "EvenRow"
             self.associated_tree.insert("", tk.END, values=row, tags=(tag,))
 
-    def export_to_csv(self):
-        if not self.task_tree.get_children():
-            messagebox.showwarning("Erreur", "Aucune tâche à exporter.")
-            return
-        file_path = filedialog.asksaveasfilename(
-            defaultextension=".csv",
-            filetypes=[("Fichiers CSV", "*.csv")],
-            initialfile=f"taches_{datetime.now().strftime('%Y%m%d')}.csv"
-        )
-        if not file_path:
-            return
+    def archive_old_tasks(self):
+        # Archivage automatique (0 jour : désactivé)
+        if self.archive_after_days <= 0:
+            return 0
         try:
-            with open(file_path, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f, delimiter=";")
-                writer.writerow(["ID", "Titre", "Échéance", "Priorité", "Statut", "Récurrence", "Description"])
-                for item in self.task_tree.get_children():
-                    values = list(self.task_tree.item(item)["values"])
-                    task_id = values[0]
-                    self.cursor.execute("SELECT description FROM tasks WHERE id=?", (task_id,))
-                    description = self.cursor.fetchone()[0] or ""
-                    values.append(description)
-                    writer.writerow(values)
-            messagebox.showinfo("Succès", f"Tâches exportées dans {file_path}.")
-        except Exception as e:
-            messagebox.showerror("Erreur", f"Erreur lors de l'exportation : {e}")
\ No newline at end of file
+            return archive_tasks(self.conn, self.conn_library, archivable_task_ids(self.conn, archive_cutoff(self.archive_after_days)))
+        except sqlite3.Error as e:
+            print(f"Archivage des tâches terminées impossible : {e}")
+            return 0
+
+    def show_task_archive(self):
+        archive_window = tk.Toplevel(self.parent)
+        archive_window.title("Archives des tâches")
+        archive_window.geometry("900x600")
+        archive_window.transient(self.parent)
+        archive_window.grab_set()
+
+        settings_frame = ttk.Frame(archive_window)
+        settings_frame.pack(fill="x", padx=5, pady=5)
+        ttk.Label(settings_frame, text="Archiver les tâches terminées depuis plus de").pack(side="left")
+        days_var = tk.StringVar(value=str(self.archive_after_days))
+        ttk.Spinbox(settings_frame, from_=0, to=3650, increment=30, textvariable=days_var, width=6).pack(side="left", padx=5)
+        ttk.Label(settings_frame, text="jours (0 : jamais)").pack(side="left")
+
+        search_frame = ttk.Frame(archive_window)
+        search_frame.pack(fill="x", padx=5, pady=5)
+        ttk.Label(search_frame, text="Rechercher :").pack(side="left")
+        search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=search_var)
+        search_entry.pack(side="left", fill="x", expand=True, padx=5)
+
+        archive_tree = ttk.Treeview(archive_window, columns=("ID", "Title", "Due Date", "Completed", "Archived"), show="headings", selectmode="extended")
+        archive_tree.heading("ID", text="ID")
+        archive_tree.heading("Title", text="Titre")
+        archive_tree.heading("Due Date", text="Échéance")
+        archive_tree.heading("Completed", text="Terminée le")
+        archive_tree.heading("Archived", text="Archivée le")
+        archive_tree.column("ID", width=50, anchor="center")
+        archive_tree.column("Title", width=350)
+        archive_tree.column("Due Date", width=100, anchor="center")
+        archive_tree.column("Completed", width=100, anchor="center")
+        archive_tree.column("Archived", width=140, anchor="center")
+        archive_tree.pack(fill="both", expand=True, padx=5, pady=5)
+        count_label = ttk.Label(archive_window, text="")
+        count_label.pack(fill="x", padx=5)
+
+        def load_archive(event=None):
+            # Recherche à la demande dans les archives, limitée aux 1000 plus récentes
+            for item in archive_tree.get_children():
+                archive_tree.delete(item)
+            query = "SELECT id, title, due_date, completed_at, archived_at FROM tasks_archive"
+            params = []
+            search_term = search_var.get().strip()
+            if search_term:
+                query += " WHERE normalize_text(title) LIKE ? OR normalize_text(description) LIKE ?"
+                params = [f"%{normalize_text(search_term)}%"] * 2
+            rows = self.conn.execute(query + " ORDER BY archived_at DESC, id DESC LIMIT 1000", params).fetchall()
+            for index, row in enumerate(rows):
+                archive_tree.insert("", tk.END, values=row, tags=("OddRow" if index % 2 else "EvenRow",))
+            total = self.conn.execute("SELECT COUNT(*) FROM tasks_archive").fetchone()[0]
+            count_label.config(text=f"{len(rows)} tâche(s) affichée(s) sur {total} archivée(s)")
+
+        def archive_now():
+            try:
+                days = int(days_var.get())
+            except ValueError:
+                messagebox.showwarning("Erreur", "Le nombre de jours doit être un entier.", parent=archive_window)
+                return
+            self.archive_after_days = max(0, days)
+            self.save_config()
+            if self.archive_after_days == 0:
+                return
+            task_ids = archivable_task_ids(self.conn, archive_cutoff(self.archive_after_days))
+            if not task_ids:
+                messagebox.showinfo("Archives", "Aucune tâche à archiver.", parent=archive_window)
+                return
+            if not messagebox.askyesno("Confirmation", f"Archiver {len(task_ids)} tâche(s) terminée(s) ?", parent=archive_window):
+                return
+            try:
+                archive_tasks(self.conn, self.conn_library, task_ids)
+            except sqlite3.Error as e:
+                messagebox.showerror("Erreur", f"Erreur lors de l'archivage : {e}", parent=archive_window)
+                return
+            self.calendar_dirty_days = None
+            self.clear_task_form()
+            self.schedule_refresh(task_ids)
+            load_archive()
+
+        def restore_selected():
+            task_ids = [archive_tree.item(item)["values"][0] for item in archive_tree.selection()]
+            if not task_ids:
+                messagebox.showwarning("Erreur", "Veuillez sélectionner au moins une tâche archivée.", parent=archive_window)
+                return
+            if not messagebox.askyesno("Confirmation", f"Restaurer les {len(task_ids)} tâches sélectionnées ?", parent=archive_window):
+                return
+            try:
+                restore_tasks(self.conn, self.conn_library, task_ids)
+            except sqlite3.Error as e:
+                messagebox.showerror("Erreur", f"Erreur lors de la restauration : {e}", parent=archive_window)
+                return
+            self.calendar_dirty_days = None
+            self.schedule_refresh(task_ids)
+            load_archive()
+
+        search_entry.bind("<Return>", load_archive)
+        ttk.Button(search_frame, text="Rechercher", command=load_archive).pack(side="left", padx=5)
+        ttk.Button(settings_frame, text="Archiver maintenant", command=archive_now).pack(side="left", padx=10)
+        button_frame = ttk.Frame(archive_window)
+        button_frame.pack(fill="x", pady=5)
+        ttk.Button(button_frame, text="Restaurer la sélection", command=restore_selected).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Fermer", command=archive_window.destroy).pack(side="right", padx=5)
+        load_archive()
+
+    def export_to_csv(self):
+        export_window = tk.Toplevel(self.parent)
+        export_window.title("Exporter les tâches")
+        export_window.geometry("320x170")
+        export_window.transient(self.parent)
+        export_window.grab_set()
+
+        scope_var = tk.StringVar(value="filter")
+        compress_var = tk.BooleanVar(value=False)
+        ttk.Radiobutton(export_window, text="Tâches du filtre actuel", variable=scope_var, value="filter").pack(anchor="w", padx=10, pady=2)
+        ttk.Radiobutton(export_window, text="Toutes les tâches", variable=scope_var, value="all").pack(anchor="w", padx=10, pady=2)
+        ttk.Checkbutton(export_window, text="Compresser (gzip)", variable=compress_var).pack(anchor="w", padx=10, pady=5)
+
+        def confirm():
+            compress = compress_var.get()
+            extension = ".csv.gz" if compress else ".csv"
+            file_path = filedialog.asksaveasfilename(
+                parent=export_window,
+                defaultextension=extension,
+                filetypes=[("Fichiers CSV compressés", "*.csv.gz")] if compress else [("Fichiers CSV", "*.csv")],
+                initialfile=f"taches_{datetime.now().strftime('%Y%m%d')}{extension}"
+            )
+            if not file_path:
+                return
+            # Le filtre courant est repris tel quel : mêmes tâches que la liste affichée
+            scope_query, scope_params = self.task_list_query() if scope_var.get() == "filter" else (None, ())
+            try:
+                count = export_tasks_csv(database_path(self.conn), database_path(self.conn_library), file_path,
+                                         scope_query, scope_params, compress=compress)
+            except (sqlite3.Error, OSError) as e:
+                messagebox.showerror("Erreur", f"Erreur lors de l'exportation : {e}", parent=export_window)
+                return
+            export_window.destroy()
+            messagebox.showinfo("Succès", f"{count} tâches exportées dans {file_path}.")
+
+        ttk.Button(export_window, text="Exporter", command=confirm).pack(pady=5)
+
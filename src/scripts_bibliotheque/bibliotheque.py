@@ -7,10 +7,31 @@ import subprocess
 import platform
 import sys
 import json
+import csv
+import queue
+import time
 from datetime import datetime
+from concurrent.futures.process import BrokenProcessPool
+
+from search_index import database_path
+from scripts_bibliotheque.content_indexer import ContentIndexer, ensure_content_index
+from scripts_bibliotheque.content_store import ContentStore, HashBackfill, file_digest, replace_file
+from scripts_bibliotheque.bulk_import import BulkImporter, collect_files, plan_import
+from scripts_bibliotheque.folder_rename import can_rename_folder, finish_folder_rename, rename_folder, recover_folder_rename
+from scripts_bibliotheque.fs_sync import LibrarySync, ensure_sync_snapshot
+from scripts_bibliotheque.thumbnail_cache import ThumbnailCache, can_preview
+from scripts_bibliotheque.integrity import IntegrityChecker, IntegrityIssue, accept_changes, ensure_integrity_table, integrity_issues
+from scripts_bibliotheque.file_index import FileIndex
+from scripts_bibliotheque.path_verifier import PathVerifier
+from scripts_bibliotheque.orphan_scanner import OrphanFolderScanner
+
+# Version du schéma et des données de library.db (PRAGMA user_version) :
+# 1 = colonne content_hash, 2 = chemins des fichiers alignés sur les métadonnées
+LIBRARY_SCHEMA_VERSION = 2
 
 class LibraryManager:
     def __init__(self, parent, conn):
+        init_start = time.perf_counter()
         self.parent = parent
         self.conn = conn
         self.cursor = conn.cursor()
@@ -18,9 +39,28 @@ class LibraryManager:
         os.makedirs(self.files_dir, exist_ok=True)
         self.nomenclatures_file = os.path.normpath(os.path.join(os.path.dirname(sys.argv[0]), "nomenclatures.json"))
         self.sites_file = os.path.normpath(os.path.join(os.path.dirname(sys.argv[0]), "sites.json"))
+        self.config_file = os.path.normpath(os.path.join(os.path.dirname(sys.argv[0]), "config_library.json"))
+        self.rename_journal_file = os.path.normpath(os.path.join(os.path.dirname(sys.argv[0]), "bibliotheque_renommage.json"))
+        self.content_store = ContentStore(os.path.normpath(os.path.join(os.path.dirname(sys.argv[0]), "bibliotheque_objets")))
         self.init_nomenclatures_file()
         self.init_sites_file()
+        self.load_config()
+        db_start = time.perf_counter()
         self.init_db()
+        db_seconds = time.perf_counter() - db_start
+        self.recover_interrupted_rename()
+        # Empreintes des pièces ajoutées avant la colonne content_hash, calculées en arrière-plan
+        HashBackfill(database_path(self.conn), self.files_dir).start()
+        self.content_indexer = None
+        if ensure_content_index(self.conn):
+            self.content_indexer = ContentIndexer(database_path(self.conn), self.files_dir)
+            self.content_indexer.start()
+        # Synchronisation périodique du dossier bibliotheque vers la base (différences seulement)
+        self.fs_sync = LibrarySync(database_path(self.conn), self.files_dir, content_store=self.content_store)
+        self.fs_sync.start()
+        self.thumbnails = ThumbnailCache(os.path.normpath(os.path.join(os.path.dirname(sys.argv[0]), "cache_apercus")))
+        self.preview_path = None
+        self.preview_image = None
         self.year_filter_var = tk.StringVar()
         self.category_filter_var = tk.StringVar()
         self.archives_filter_var = tk.StringVar()
@@ -29,8 +69,13 @@ class LibraryManager:
         self.sort_reverse = False
         self.sort_direction = {"year": False, "category": False, "archives": False, "project": False, "notes": False}
         self.all_folders = []
-        self.all_files = []
+        self.files = FileIndex()
+        self.path_verifier = None
+        self.bulk_importer = None
+        self.integrity_checker = None
+        load_start = time.perf_counter()
         self.load_initial_data()
+        load_seconds = time.perf_counter() - load_start
         style = ttk.Style()
         style.theme_use("alt")
         style.configure("Add.TButton", background="#90EE90", foreground="black")
@@ -103,6 +148,10 @@ class LibraryManager:
         ttk.Checkbutton(file_form_frame, text="Conserver le nom du fichier", variable=self.keep_name_var, command=self.toggle_file_fields).grid(row=0, column=0, columnspan=2, pady=2, sticky="w")
         self.move_file_var = tk.BooleanVar(value=False)
         ttk.Checkbutton(file_form_frame, text="Couper (déplacer) / Copier", variable=self.move_file_var).grid(row=1, column=0, columnspan=2, pady=2, sticky="w")
+        # Stockage dédupliqué : un contenu identique n'est conservé qu'une fois, les pièces sont des liens physiques.
+        # Une pièce ouverte depuis l'application reçoit d'abord sa propre copie (copie à l'écriture).
+        self.dedup_var = tk.BooleanVar(value=self.dedup_enabled)
+        ttk.Checkbutton(file_form_frame, text="Stockage dédupliqué (copie privée à l'ouverture)", variable=self.dedup_var, command=self.save_config).grid(row=1, column=2, columnspan=2, pady=2, sticky="w")
         ttk.Label(file_form_frame, text="Site :").grid(row=2, column=0, padx=5, pady=2, sticky="w")
         self.site_var = tk.StringVar()
         self.site_entry = ttk.Entry(file_form_frame, textvariable=self.site_var, width=15)
@@ -128,12 +177,14 @@ class LibraryManager:
         file_button_frame = ttk.Frame(file_form_frame)
         file_button_frame.grid(row=7, column=0, columnspan=3, pady=5)
         ttk.Button(file_button_frame, text="Ajouter pièce", style="Add.TButton", command=self.add_file).pack(side="left", padx=5)
+        ttk.Button(file_button_frame, text="Import en masse", style="Add.TButton", command=self.bulk_import_files).pack(side="left", padx=5)
         ttk.Button(file_button_frame, text="Ouvrir pièce", style="Add.TButton", command=self.open_file).pack(side="left", padx=5)
         ttk.Button(file_button_frame, text="Ouvrir l'emplacement", style="Add.TButton", command=self.open_file_explorer).pack(side="left", padx=5)
         ttk.Button(file_button_frame, text="Modifier pièce", style="Modify.TButton", command=self.modify_file).pack(side="left", padx=15)
         ttk.Button(file_button_frame, text="Vider formulaire", style="Clear.TButton", command=self.clear_file_form).pack(side="left", padx=5)
         ttk.Button(file_button_frame, text="Supprimer pièce", style="Delete.TButton", command=self.delete_file).pack(side="right", padx=5)
         ttk.Button(file_button_frame, text="Vérifier chemins", style="Modify.TButton", command=self.verify_and_fix_file_paths).pack(side="right", padx=5)
+        ttk.Button(file_button_frame, text="Vérifier intégrité", style="Modify.TButton", command=self.check_integrity).pack(side="right", padx=5)
         search_frame = ttk.Frame(right_frame)
         search_frame.pack(fill="x", pady=5)
         ttk.Label(search_frame, text="Rechercher pièces :").pack(side="left")
@@ -148,6 +199,10 @@ class LibraryManager:
         self.file_tree.column("Title", width=450)
         self.file_tree.pack(fill="both", expand=True, padx=5, pady=5)
         self.file_tree.bind("<<TreeviewSelect>>", self.load_file_to_form)
+        preview_frame = ttk.LabelFrame(right_frame, text="Aperçu")
+        preview_frame.pack(fill="x", padx=5, pady=5)
+        self.preview_label = ttk.Label(preview_frame, text="Aucune pièce sélectionnée", anchor="center")
+        self.preview_label.pack(fill="x", pady=5)
         self.parent.bind("<Control-a>", lambda event: self.add_folder())
         self.parent.bind("<Control-o>", lambda event: self.open_file())
         self.current_file_id = None
@@ -155,6 +210,10 @@ class LibraryManager:
         self.current_selected_folder = None
         self.toggle_file_fields()
         self.refresh_folder_list()
+        self.parent.after(1000, self.poll_fs_sync)
+        self.parent.after(200, self.poll_thumbnails)
+        print(f"Bibliothèque : initialisation en {(time.perf_counter() - init_start) * 1000:.0f} ms "
+              f"(base : {db_seconds * 1000:.0f} ms, chargement : {load_seconds * 1000:.0f} ms)")
 
     def init_db(self):
         try:
@@ -178,52 +237,94 @@ class LibraryManager:
             self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_archives ON library (archives)")
             self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_project ON library (project)")
             self.conn.commit()
-            self.migrate_file_paths()
+            self.migrate_db()
+            ensure_sync_snapshot(self.conn)
+            ensure_integrity_table(self.conn)
         except sqlite3.Error as e:
             messagebox.showerror("Erreur", f"Échec de l'initialisation de la base de données : {str(e)}")
 
+    def migrate_db(self):
+        # Migrations appliquées une seule fois, dans l'ordre ; une base à jour ne fait aucun travail par ligne.
+        # La version n'avance qu'après la réussite d'une migration : en cas d'échec, elle sera retentée au prochain lancement.
+        self.cursor.execute("PRAGMA user_version")
+        version = self.cursor.fetchone()[0]
+        if version < 1:
+            self.cursor.execute("PRAGMA table_info(library)")
+            columns = [info[1] for info in self.cursor.fetchall()]
+            if 'content_hash' not in columns:
+                self.cursor.execute("ALTER TABLE library ADD COLUMN content_hash TEXT")
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_content_hash ON library (content_hash)")
+            self.set_db_version(1)
+        if version < 2:
+            if not self.migrate_file_paths():
+                return
+            self.set_db_version(2)
+        if version < LIBRARY_SCHEMA_VERSION:
+            print(f"Bibliothèque : base migrée de la version {version} à la version {LIBRARY_SCHEMA_VERSION}")
+
+    def set_db_version(self, version):
+        self.cursor.execute(f"PRAGMA user_version = {int(version)}")
+        self.conn.commit()
+
+    def recover_interrupted_rename(self):
+        try:
+            if recover_folder_rename(self.conn, self.rename_journal_file):
+                messagebox.showwarning("Renommage interrompu", "Un renommage de dossier interrompu a été annulé : le dossier a repris son ancien nom.")
+        except (sqlite3.Error, OSError, ValueError, KeyError) as e:
+            messagebox.showerror("Erreur", f"Échec de la reprise du renommage interrompu : {str(e)}")
+
+    def load_config(self):
+        try:
+            if os.path.exists(self.config_file):
+                with open(self.config_file, "r") as f:
+                    config = json.load(f)
+                self.dedup_enabled = config.get("library_dedup", False)
+            else:
+                self.dedup_enabled = False
+        except Exception:
+            self.dedup_enabled = False
+
+    def save_config(self):
+        try:
+            config = {"library_dedup": self.dedup_var.get()}
+            with open(self.config_file, "w") as f:
+                json.dump(config, f, indent=4)
+        except Exception:
+            pass
+
     def load_initial_data(self):
             try:
-                # Étape 1: Obtenir les dossiers uniques en se basant sur leur structure de chemin
-                self.cursor.execute("SELECT DISTINCT year, category, archives, project FROM library WHERE file_path != '' OR title = '[Dossier]'")
-                distinct_folders = self.cursor.fetchall()
-
+                # Dossiers uniques et leur note en une seule requête : pour chaque dossier, la note retenue
+                # est celle de l'entrée '[Dossier]' ou, à défaut, de l'entrée la plus récente
+                self.cursor.execute("""
+                    WITH folders AS (
+                        SELECT DISTINCT year, category, archives, project FROM library
+                        WHERE file_path != '' OR title = '[Dossier]'
+                    ),
+                    folder_notes AS (
+                        SELECT year, category, COALESCE(archives, '') AS archives, project, notes,
+                               ROW_NUMBER() OVER (
+                                   PARTITION BY year, category, COALESCE(archives, ''), project
+                                   ORDER BY CASE WHEN title = '[Dossier]' THEN 0 ELSE 1 END, id DESC
+                               ) AS rank
+                        FROM library
+                    )
+                    SELECT f.year, f.category, f.archives, f.project, n.notes
+                    FROM folders f
+                    LEFT JOIN folder_notes n ON n.rank = 1 AND n.year = f.year AND n.category = f.category
+                        AND n.archives = COALESCE(f.archives, '') AND n.project = f.project
+                """)
                 self.all_folders = []
-                # Étape 2: Pour chaque dossier unique, trouver la note correspondante
-                for folder_row in distinct_folders:
-                    year, category, archives, project = folder_row
-                    
-                    # Normalisation des valeurs pour la recherche
+                for year, category, archives, project, notes in self.cursor.fetchall():
                     year_str = str(year).strip() if year is not None else ""
                     category_str = str(category).strip() if category is not None else ""
                     archives_str = str(archives).strip() if archives is not None else ""
                     project_str = str(project).strip() if project is not None else ""
-
-                    # Recherche de la note, en donnant la priorité à l'entrée '[Dossier]' ou à la plus récente
-                    self.cursor.execute("""
-                        SELECT notes FROM library 
-                        WHERE year = ? AND category = ? AND (archives = ? OR (archives IS NULL AND ? = '')) AND project = ?
-                        ORDER BY CASE WHEN title = '[Dossier]' THEN 0 ELSE 1 END, id DESC
-                        LIMIT 1
-                    """, (year_str, category_str, archives_str, archives_str, project_str))
-                    
-                    note_row = self.cursor.fetchone()
-                    notes_str = str(note_row[0]).strip() if note_row and note_row[0] is not None else ""
-
+                    notes_str = str(notes).strip() if notes is not None else ""
                     self.all_folders.append((year_str, category_str, archives_str, project_str, notes_str))
 
-                # Le reste de la fonction (chargement des fichiers) reste inchangé
                 self.cursor.execute("SELECT id, title, year, category, archives, project FROM library WHERE file_path != ''")
-                raw_files = self.cursor.fetchall()
-                self.all_files = []
-                for row in raw_files:
-                    file_id = row[0]
-                    title = str(row[1]).strip() if row[1] is not None else ""
-                    year = str(row[2]).strip() if row[2] is not None else ""
-                    category = str(row[3]).strip() if row[3] is not None else ""
-                    archives = str(row[4]).strip() if row[4] is not None else ""
-                    project = str(row[5]).strip() if row[5] is not None else ""
-                    self.all_files.append((file_id, title, year, category, archives, project))
+                self.files.load(self.cursor.fetchall())
             except sqlite3.Error as e:
                 messagebox.showerror("Erreur", f"Échec du chargement des données initiales : {str(e)}")
 
@@ -342,97 +443,209 @@ class LibraryManager:
                         os.makedirs(os.path.dirname(new_full_path), exist_ok=True)
                         shutil.move(old_full_path, new_full_path)
             self.conn.commit()
+            return True
         except (sqlite3.Error, OSError) as e:
             messagebox.showerror("Erreur", f"Échec de la migration des chemins : {str(e)}")
+            return False
 
-    def verify_and_fix_file_paths(self):
+    def verify_and_fix_file_paths(self, on_complete=None):
+        # La vérification s'exécute en arrière-plan ; on_complete est appelé une fois les corrections appliquées
+        # (ou la vérification refusée, annulée ou en échec), pour enchaîner une opération qui en dépend.
+        if self.path_verifier is not None:
+            messagebox.showinfo("Vérification en cours", "Une vérification des chemins est déjà en cours.")
+            return
         try:
             if not messagebox.askyesno("Confirmation", "Voulez-vous vérifier et corriger les chemins et métadonnées ?"):
+                if on_complete:
+                    on_complete()
                 return
             self.cursor.execute("SELECT id, year, category, archives, project, title, file_path FROM library WHERE file_path != ''")
             files = self.cursor.fetchall()
-            corrected_paths = 0
-            corrected_metadata = 0
-            missing_files = 0
-            files_to_remove = []
-
-            for file_id, year, category, archives, project, title, file_path in files:
-                db_year = str(year).strip() or str(datetime.now().year)
-                db_category = str(category).strip() or "Unknown"
-                db_archives = str(archives).strip() if archives else ""
-                db_project = str(project).strip() or "Unknown"
-                db_title = str(title).strip()
-                db_file_path = str(file_path).strip().replace('\\', '/')
-
-                path_components = [db_year, db_category] + ([db_archives] if db_archives else []) + [db_project, db_title]
-                expected_path = os.path.join(*path_components).replace('\\', '/')
-                expected_full_path = os.path.normpath(os.path.join(self.files_dir, expected_path))
-
-                current_full_path = os.path.normpath(os.path.join(self.files_dir, db_file_path))
-                if not os.path.exists(current_full_path):
-                    missing_files += 1
-                    files_to_remove.append(file_id)
-                    continue
-
-                path_parts = db_file_path.split('/')
-                if len(path_parts) < (5 if db_archives else 4):
-                    continue
-                path_year = path_parts[0]
-                path_category = path_parts[1]
-                path_archives = path_parts[2] if db_archives else ""
-                path_project = path_parts[-2]
-                path_title = path_parts[-1]
-
-                metadata_updated = False
-                if db_year != path_year:
-                    self.cursor.execute("UPDATE library SET year = ? WHERE id = ?", (path_year, file_id))
-                    db_year = path_year
-                    metadata_updated = True
-                    corrected_metadata += 1
-                if db_category != path_category:
-                    self.cursor.execute("UPDATE library SET category = ? WHERE id = ?", (path_category, file_id))
-                    db_category = path_category
-                    metadata_updated = True
-                    corrected_metadata += 1
-                if db_archives != path_archives:
-                    self.cursor.execute("UPDATE library SET archives = ? WHERE id = ?", (path_archives if path_archives else None, file_id))
-                    db_archives = path_archives
-                    metadata_updated = True
-                    corrected_metadata += 1
-                if db_project != path_project:
-                    self.cursor.execute("UPDATE library SET project = ? WHERE id = ?", (path_project, file_id))
-                    db_project = path_project
-                    metadata_updated = True
-                    corrected_metadata += 1
-                if db_title != path_title:
-                    self.cursor.execute("UPDATE library SET title = ? WHERE id = ?", (path_title, file_id))
-                    db_title = path_title
-                    metadata_updated = True
-                    corrected_metadata += 1
-
-                if metadata_updated:
-                    path_components = [db_year, db_category] + ([db_archives] if db_archives else []) + [db_project, db_title]
-                    expected_path = os.path.join(*path_components).replace('\\', '/')
-                    expected_full_path = os.path.normpath(os.path.join(self.files_dir, expected_path))
-
-                if db_file_path != expected_path:
-                    self.cursor.execute("UPDATE library SET file_path = ? WHERE id = ?", (expected_path, file_id))
-                    corrected_paths += 1
-                    if os.path.exists(current_full_path) and not os.path.exists(expected_full_path):
-                        os.makedirs(os.path.dirname(expected_full_path), exist_ok=True)
-                        shutil.move(current_full_path, expected_full_path)
-
-            if files_to_remove and messagebox.askyesno("Fichiers manquants", f"{len(files_to_remove)} fichiers sont manquants. Voulez-vous supprimer leurs entrées de la base de données ?"):
-                for file_id in files_to_remove:
-                    self.cursor.execute("DELETE FROM library WHERE id=?", (file_id,))
+        except sqlite3.Error as e:
+            messagebox.showerror("Erreur", f"Échec de la vérification des chemins : {str(e)}")
+            return
+
+        self.path_verifier = PathVerifier(self.files_dir, files)
+        dialog = tk.Toplevel(self.parent)
+        dialog.title("Vérification des chemins")
+        dialog.geometry("400x130")
+        dialog.transient(self.parent)
+        progress_label = ttk.Label(dialog, text=f"0 / {len(files)} fichiers vérifiés")
+        progress_label.pack(pady=10)
+        progress_bar = ttk.Progressbar(dialog, maximum=max(len(files), 1), length=350)
+        progress_bar.pack(pady=5)
+        ttk.Button(dialog, text="Annuler", command=self.path_verifier.cancel).pack(pady=5)
+        dialog.protocol("WM_DELETE_WINDOW", self.path_verifier.cancel)
+        self.path_verifier.start()
+        self.parent.after(100, self.poll_path_verification, dialog, progress_label, progress_bar, on_complete)
+
+    def poll_path_verification(self, dialog, progress_label, progress_bar, on_complete):
+        verifier = self.path_verifier
+        progress_bar["value"] = verifier.checked
+        progress_label.config(text=f"{verifier.checked} / {verifier.total} fichiers vérifiés")
+        if not verifier.done:
+            self.parent.after(100, self.poll_path_verification, dialog, progress_label, progress_bar, on_complete)
+            return
+        dialog.destroy()
+        self.path_verifier = None
+        if verifier.error is not None:
+            messagebox.showerror("Erreur", f"Échec de la vérification des chemins : {str(verifier.error)}")
+        elif verifier.cancelled:
+            messagebox.showinfo("Vérification annulée", "Aucune correction n'a été appliquée.")
+        else:
+            self.apply_path_fixes(verifier)
+        if on_complete:
+            on_complete()
+
+    def apply_path_fixes(self, verifier):
+        # Toutes les corrections dans une transaction : en cas d'échec, la base est restaurée
+        # et les fichiers déjà déplacés reviennent à leur place.
+        moved = []
+        try:
+            updates = {}
+            for fix in verifier.fixes:
+                updates.setdefault(fix.columns, []).append(fix.values + (fix.file_id,))
+            for columns, params in updates.items():
+                assignments = ", ".join(f"{column} = ?" for column in columns)
+                self.cursor.executemany(f"UPDATE library SET {assignments} WHERE id = ?", params)
+            for source, destination in (fix.move for fix in verifier.fixes if fix.move):
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                shutil.move(source, destination)
+                moved.append((source, destination))
+            self.conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            self.conn.rollback()
+            for source, destination in reversed(moved):
+                try:
+                    shutil.move(destination, source)
+                except OSError:
+                    pass
+            messagebox.showerror("Erreur", f"Échec de la correction des chemins : {str(e)}")
+            return
+
+        corrected_paths = sum(1 for fix in verifier.fixes if fix.path_changed)
+        corrected_metadata = sum(fix.corrected_metadata for fix in verifier.fixes)
+        try:
+            if verifier.missing and messagebox.askyesno("Fichiers manquants", f"{len(verifier.missing)} fichiers sont manquants. Voulez-vous supprimer leurs entrées de la base de données ?"):
+                self.cursor.executemany("DELETE FROM library WHERE id=?", [(file_id,) for file_id in verifier.missing])
                 self.conn.commit()
                 self.load_initial_data()
+            elif verifier.fixes:
+                self.load_initial_data()
+        except sqlite3.Error as e:
+            messagebox.showerror("Erreur", f"Échec de la suppression des entrées manquantes : {str(e)}")
+        self.refresh_folder_list()
+        messagebox.showinfo("Vérification terminée", f"Chemins corrigés: {corrected_paths}\nMétadonnées corrigées: {corrected_metadata}\nFichiers manquants: {len(verifier.missing)}")
 
-            self.conn.commit()
+    def poll_fs_sync(self):
+        # Recharge les vues lorsque la synchronisation a modifié la bibliothèque
+        if self.fs_sync.pop_results():
+            self.load_initial_data()
             self.refresh_folder_list()
-            messagebox.showinfo("Vérification terminée", f"Chemins corrigés: {corrected_paths}\nMétadonnées corrigées: {corrected_metadata}\nFichiers manquants: {missing_files}")
-        except (sqlite3.Error, OSError) as e:
-            messagebox.showerror("Erreur", f"Échec de la vérification des chemins : {str(e)}")
+            self.load_files()
+            self.request_content_index_update()
+        self.parent.after(1000, self.poll_fs_sync)
+
+    def check_integrity(self):
+        # Seuls les fichiers dont la taille ou la date a changé sont relus, sauf en vérification complète
+        if self.integrity_checker is not None:
+            messagebox.showinfo("Vérification en cours", "Une vérification d'intégrité est déjà en cours.")
+            return
+        choice = messagebox.askyesnocancel("Vérification d'intégrité", "Vérification rapide (seuls les fichiers modifiés depuis la dernière vérification sont relus) ?\n\nNon : relire tous les fichiers.")
+        if choice is None:
+            return
+        self.integrity_checker = IntegrityChecker(database_path(self.conn), self.files_dir, full=not choice)
+        dialog = tk.Toplevel(self.parent)
+        dialog.title("Vérification d'intégrité")
+        dialog.geometry("400x130")
+        dialog.transient(self.parent)
+        progress_label = ttk.Label(dialog, text="Préparation de la vérification...")
+        progress_label.pack(pady=10)
+        progress_bar = ttk.Progressbar(dialog, length=350)
+        progress_bar.pack(pady=5)
+        ttk.Button(dialog, text="Annuler", command=self.integrity_checker.cancel).pack(pady=5)
+        dialog.protocol("WM_DELETE_WINDOW", self.integrity_checker.cancel)
+        self.integrity_checker.start()
+        self.parent.after(200, self.poll_integrity_check, dialog, progress_label, progress_bar)
+
+    def poll_integrity_check(self, dialog, progress_label, progress_bar):
+        checker = self.integrity_checker
+        progress_bar["maximum"] = max(checker.total, 1)
+        progress_bar["value"] = checker.checked
+        progress_label.config(text=f"{checker.checked} / {checker.total} fichiers vérifiés ({checker.hashed} relus)")
+        if not checker.done:
+            self.parent.after(200, self.poll_integrity_check, dialog, progress_label, progress_bar)
+            return
+        dialog.destroy()
+        self.integrity_checker = None
+        if checker.error is not None:
+            messagebox.showerror("Erreur", f"Échec de la vérification d'intégrité : {str(checker.error)}")
+            return
+        try:
+            issues = integrity_issues(self.conn)
+        except sqlite3.Error as e:
+            messagebox.showerror("Erreur", f"Échec de la lecture du rapport d'intégrité : {str(e)}")
+            return
+        issues += [IntegrityIssue(file_id, file_path, "Fichier manquant", None, None) for file_id, file_path in checker.missing]
+        title = "Vérification annulée" if checker.cancelled else "Vérification terminée"
+        if not issues:
+            messagebox.showinfo(title, f"{checker.checked} fichiers vérifiés ({checker.hashed} relus) : aucune anomalie.")
+            return
+        self.show_integrity_report(issues, title)
+
+    def show_integrity_report(self, issues, title):
+        window = tk.Toplevel(self.parent)
+        window.title(f"{title} : {len(issues)} anomalie(s)")
+        window.geometry("800x400")
+        window.transient(self.parent)
+        tree = ttk.Treeview(window, columns=("ID", "Path", "Problem"), show="headings")
+        tree.heading("ID", text="ID")
+        tree.heading("Path", text="Chemin")
+        tree.heading("Problem", text="Anomalie")
+        tree.column("ID", width=60)
+        tree.column("Path", width=520)
+        tree.column("Problem", width=180)
+        tree.pack(fill="both", expand=True, padx=5, pady=5)
+        for index, issue in enumerate(issues):
+            tree.insert("", tk.END, values=(issue.file_id, issue.file_path, issue.problem), tags=("OddRow" if index % 2 else "EvenRow",))
+        button_frame = ttk.Frame(window)
+        button_frame.pack(pady=5)
+        ttk.Button(button_frame, text="Exporter (.csv)", command=lambda: self.export_integrity_report(issues)).pack(side="left", padx=5)
+
+        def accept():
+            modified = [issue.file_id for issue in issues if issue.current_hash]
+            if not modified or not messagebox.askyesno("Confirmation", f"Accepter le contenu actuel de {len(modified)} pièce(s) comme référence ?", parent=window):
+                return
+            try:
+                accept_changes(self.conn, modified)
+                window.destroy()
+            except sqlite3.Error as e:
+                messagebox.showerror("Erreur", f"Échec de la mise à jour des références : {str(e)}", parent=window)
+
+        ttk.Button(button_frame, text="Accepter les modifications", style="Modify.TButton", command=accept).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Fermer", command=window.destroy).pack(side="left", padx=5)
+
+    def export_integrity_report(self, issues):
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("Fichiers CSV", "*.csv")],
+            initialfile=f"integrite_bibliotheque_{datetime.now().strftime('%Y%m%d')}.csv"
+        )
+        if not file_path:
+            return
+        try:
+            with open(file_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f, delimiter=";")
+                writer.writerow(["ID", "Chemin", "Anomalie", "Empreinte de référence", "Empreinte actuelle"])
+                for issue in issues:
+                    writer.writerow([issue.file_id, issue.file_path, issue.problem, issue.expected_hash or "", issue.current_hash or ""])
+            messagebox.showinfo("Succès", f"Rapport exporté dans {file_path}.")
+        except OSError as e:
+            messagebox.showerror("Erreur", f"Erreur lors de l'exportation : {e}")
+
+    def request_content_index_update(self):
+        if self.content_indexer:
+            self.content_indexer.request_update()
 
     def toggle_file_fields(self):
         try:
@@ -502,6 +715,18 @@ class LibraryManager:
             new_path_components.append(new_project)
             new_folder_path = os.path.normpath(os.path.join(*new_path_components))
 
+            # Dossier sur le même volume et ne contenant que ses propres pièces : un seul renommage
+            # sur le disque et une seule requête pour les chemins, au lieu d'un déplacement par fichier
+            old_folder = (old_year, old_category, old_archives, old_project)
+            new_folder = (new_year, new_category, new_archives, new_project)
+            if can_rename_folder(self.conn, self.files_dir, old_folder, new_folder):
+                log_message(f"Renommage du dossier {old_folder_path} en {new_folder_path}")
+                updated_count = rename_folder(self.conn, self.files_dir, self.rename_journal_file, old_folder, new_folder)
+                if updated_count is not None:
+                    log_message(f"Dossier renommé, {updated_count} chemin(s) mis à jour.")
+                    return old_folder_path, []
+                log_message("Renommage impossible, déplacement des fichiers un par un.")
+
             log_message(f"Étape 1 : Création du nouveau dossier {new_folder_path}")
             os.makedirs(new_folder_path, exist_ok=True)
             log_message(f"Dossier créé : {new_folder_path}")
@@ -564,11 +789,11 @@ class LibraryManager:
                 log_text.config(state='normal')
                 log_text.insert(tk.END, message + "\n")
                 log_text.see(tk.END)
-                log_text.update()
                 log_text.config(state='disabled')
 
             log_message("Recherche des dossiers orphelins...")
 
+            # Phase 1 : dossiers actifs et chemins référencés, chargés une seule fois
             self.cursor.execute("SELECT DISTINCT year, category, archives, project FROM library")
             active_folders = set()
             for row in self.cursor.fetchall():
@@ -577,118 +802,54 @@ class LibraryManager:
                 archives = str(row[2]).strip() if row[2] else ""
                 project = str(row[3]).strip()
                 active_folders.add((year, category, archives, project))
+            self.cursor.execute("SELECT file_path FROM library WHERE file_path != ''")
+            referenced_paths = {str(row[0]).strip().replace('\\', '/') for row in self.cursor.fetchall()}
+        except sqlite3.Error as e:
+            log_message(f"Erreur lors de la suppression des dossiers orphelins : {str(e)}")
+            ttk.Button(log_window, text="Fermer", command=log_window.destroy).pack(pady=5)
+            return
 
-            orphan_folders = []
-            for year_dir in os.listdir(self.files_dir):
-                year_path = os.path.join(self.files_dir, year_dir)
-                if not os.path.isdir(year_path):
-                    continue
-                for category_dir in os.listdir(year_path):
-                    category_path = os.path.join(year_path, category_dir)
-                    if not os.path.isdir(category_path):
-                        continue
-                    for dir_name in os.listdir(category_path):
-                        dir_path = os.path.join(category_path, dir_name)
-                        if not os.path.isdir(dir_path):
-                            continue
-                        archives = ""
-                        project = dir_name
-                        folder_tuple = (year_dir, category_dir, archives, project)
-                        if folder_tuple not in active_folders:
-                            has_referenced_files = False
-                            for root, _, files in os.walk(dir_path):
-                                for file in files:
-                                    file_path = os.path.normpath(os.path.join(root, file))
-                                    relative_path = os.path.relpath(file_path, self.files_dir).replace('\\', '/')
-                                    self.cursor.execute("SELECT 1 FROM library WHERE file_path=?", (relative_path,))
-                                    if self.cursor.fetchone():
-                                        has_referenced_files = True
-                                        break
-                                if has_referenced_files:
-                                    break
-                            if not has_referenced_files:
-                                orphan_folders.append(os.path.join(year_dir, category_dir, project))
-                        for sub_dir in os.listdir(dir_path):
-                            sub_dir_path = os.path.join(dir_path, sub_dir)
-                            if not os.path.isdir(sub_dir_path):
-                                continue
-                            archives = dir_name
-                            project = sub_dir
-                            folder_tuple = (year_dir, category_dir, archives, project)
-                            if folder_tuple not in active_folders:
-                                has_referenced_files = False
-                                for root, _, files in os.walk(sub_dir_path):
-                                    for file in files:
-                                        file_path = os.path.normpath(os.path.join(root, file))
-                                        relative_path = os.path.relpath(file_path, self.files_dir).replace('\\', '/')
-                                        self.cursor.execute("SELECT 1 FROM library WHERE file_path=?", (relative_path,))
-                                        if self.cursor.fetchone():
-                                            has_referenced_files = True
-                                            break
-                                    if has_referenced_files:
-                                        break
-                                if not has_referenced_files:
-                                    orphan_folders.append(os.path.join(year_dir, category_dir, archives, project))
+        # Phase 2 : parcours du disque en arrière-plan, les résultats s'affichent au fur et à mesure
+        scanner = OrphanFolderScanner(self.files_dir, active_folders, referenced_paths)
 
+        def poll_messages():
+            if not log_window.winfo_exists():
+                return
+            while True:
+                try:
+                    kind, payload = scanner.messages.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == "log":
+                    log_message(payload)
+                elif kind == "scan_done":
+                    scan_done(payload)
+                    return
+                elif kind == "delete_done":
+                    log_message(f"Suppression terminée : {payload} dossiers supprimés.")
+                    ttk.Button(log_window, text="Valider", command=log_window.destroy).pack(pady=5)
+                    return
+                elif kind == "error":
+                    log_message(f"Erreur lors de la suppression des dossiers orphelins : {payload}")
+                    ttk.Button(log_window, text="Fermer", command=log_window.destroy).pack(pady=5)
+                    return
+            log_window.after(50, poll_messages)
+
+        def scan_done(orphan_folders):
             if not orphan_folders:
                 log_message("Aucun dossier orphelin trouvé.")
                 ttk.Button(log_window, text="Fermer", command=log_window.destroy).pack(pady=5)
                 return
-
-            log_message(f"{len(orphan_folders)} dossiers orphelins trouvés :\n" + "\n".join(orphan_folders))
-            if not messagebox.askyesno("Confirmation", f"Voulez-vous supprimer {len(orphan_folders)} dossiers orphelins ?"):
+            log_message(f"{len(orphan_folders)} dossiers orphelins trouvés.")
+            if not messagebox.askyesno("Confirmation", f"Voulez-vous supprimer {len(orphan_folders)} dossiers orphelins ?", parent=log_window):
                 log_message("Suppression annulée par l'utilisateur.")
                 ttk.Button(log_window, text="Fermer", command=log_window.destroy).pack(pady=5)
                 return
+            scanner.start_delete(orphan_folders)
+            log_window.after(50, poll_messages)
 
-            deleted_count = 0
-            for folder in orphan_folders:
-                folder_path = os.path.normpath(os.path.join(self.files_dir, folder))
-                if not os.path.exists(folder_path):
-                    log_message(f"Dossier {folder_path} n'existe plus.")
-                    continue
-
-                try:
-                    for root, _, files in os.walk(folder_path):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            if not os.access(file_path, os.W_OK):
-                                log_message(f"Erreur : Permissions insuffisantes pour {file_path}")
-                                continue
-                    shutil.rmtree(folder_path)
-                    log_message(f"Dossier supprimé : {folder_path}")
-                    deleted_count += 1
-                except Exception as e:
-                    log_message(f"Erreur lors de la suppression de {folder_path} : {str(e)}")
-
-            for year_dir in os.listdir(self.files_dir):
-                year_path = os.path.join(self.files_dir, year_dir)
-                if not os.path.isdir(year_path):
-                    continue
-                for category_dir in os.listdir(year_path):
-                    category_path = os.path.join(year_path, category_dir)
-                    if not os.path.isdir(category_path):
-                        continue
-                    if not os.listdir(category_path):
-                        try:
-                            shutil.rmtree(category_path)
-                            log_message(f"Dossier vide supprimé : {category_path}")
-                            deleted_count += 1
-                        except Exception as e:
-                            log_message(f"Erreur lors de la suppression de {category_path} : {str(e)}")
-                if not os.listdir(year_path):
-                    try:
-                        shutil.rmtree(year_path)
-                        log_message(f"Dossier vide supprimé : {year_path}")
-                        deleted_count += 1
-                    except Exception as e:
-                        log_message(f"Erreur lors de la suppression de {year_path} : {str(e)}")
-
-            log_message(f"Suppression terminée : {deleted_count} dossiers supprimés.")
-            ttk.Button(log_window, text="Valider", command=log_window.destroy).pack(pady=5)
-        except Exception as e:
-            log_message(f"Erreur lors de la suppression des dossiers orphelins : {str(e)}")
-            ttk.Button(log_window, text="Fermer", command=log_window.destroy).pack(pady=5)
+        scanner.start_scan()
+        log_window.after(50, poll_messages)
 
     def modify_folder(self):
         try:
@@ -728,8 +889,17 @@ class LibraryManager:
                 messagebox.showerror("Erreur", "Ce dossier existe déjà.")
                 return
 
-            self.verify_and_fix_file_paths()
+            # Les chemins sont vérifiés en arrière-plan ; la modification reprend une fois la vérification terminée
+            old_folder = (old_year, old_category, old_archives, old_project, old_notes)
+            new_folder = (new_year, new_category, new_archives, new_project, new_notes)
+            self.verify_and_fix_file_paths(on_complete=lambda: self.apply_folder_modification(old_folder, new_folder))
+        except Exception as e:
+            messagebox.showerror("Erreur", f"Échec de la modification : {str(e)}")
 
+    def apply_folder_modification(self, old_folder, new_folder):
+        old_year, old_category, old_archives, old_project, old_notes = old_folder
+        new_year, new_category, new_archives, new_project, new_notes = new_folder
+        try:
             log_window = tk.Toplevel(self.parent)
             log_window.title("Suivi de la modification")
             log_window.geometry("500x400")
@@ -766,13 +936,14 @@ class LibraryManager:
                                 new_notes if new_notes else "", old_year, old_category, 
                                 old_archives if old_archives else None, old_archives, old_project, "[Dossier]"))
             log_message("Métadonnées du dossier mises à jour.")
+            # Chemins des pièces (renommage d'un bloc) et ligne du dossier sont validés ensemble
             self.conn.commit()
+            finish_folder_rename(self.rename_journal_file)
 
             self.all_folders = [f for f in self.all_folders if f != (old_year, old_category, old_archives, old_project, old_notes)]
             self.all_folders.append((new_year, new_category, new_archives if new_archives else "", new_project, new_notes if new_notes else ""))
-            for i, (file_id, title, f_year, f_category, f_archives, f_project) in enumerate(self.all_files):
-                if (f_year, f_category, f_archives, f_project) == (old_year, old_category, old_archives, old_project):
-                    self.all_files[i] = (file_id, title, new_year, new_category, new_archives if new_archives else "", new_project)
+            self.files.move_folder((old_year, old_category, old_archives, old_project),
+                                   (new_year, new_category, new_archives if new_archives else "", new_project))
 
             if old_folder_path and updated_files:
                 log_message(f"Ancien dossier {old_folder_path} conservé. Utilisez 'Supprimer anciens dossiers' pour le supprimer ultérieurement.")
@@ -787,6 +958,12 @@ class LibraryManager:
         except Exception as e:
             log_message(f"Erreur lors de la modification : {str(e)}")
             self.conn.rollback()
+            # Un dossier renommé sur le disque reprend son nom, la base étant revenue à l'ancien
+            try:
+                if recover_folder_rename(self.conn, self.rename_journal_file):
+                    log_message("Renommage du dossier annulé.")
+            except (sqlite3.Error, OSError, ValueError, KeyError) as recover_error:
+                log_message(f"Échec de l'annulation du renommage : {str(recover_error)}")
             messagebox.showerror("Erreur", f"Échec de la modification : {str(e)}")
             ttk.Button(log_window, text="Fermer", command=log_window.destroy).pack(pady=5)
 
@@ -802,15 +979,14 @@ class LibraryManager:
             archives = str(archives).strip()
             project = str(project).strip()
             notes = str(notes).strip()
-            num_files = sum(1 for f in self.all_files if f[2].lower() == year.lower() and f[3].lower() == category.lower() and f[4].lower() == archives.lower() and f[5].lower() == project.lower())
+            num_files = self.files.count_in_folder(year, category, archives, project)
             if not messagebox.askyesno("Confirmation", f"Supprimer le dossier {year}/{category}/{archives}/{project} et ses {num_files} pièce(s) ?"):
                 return
             path_components = [self.files_dir, year, category] + ([archives] if archives else []) + [project]
             folder_path = os.path.normpath(os.path.join(*path_components))
-            self.cursor.execute("SELECT file_path FROM library WHERE year=? AND category=? AND (archives=? OR archives IS NULL) AND project=?", 
+            self.cursor.execute("SELECT file_path, content_hash FROM library WHERE year=? AND category=? AND (archives=? OR archives IS NULL) AND project=?", 
                                (year, category, archives if archives else None, project))
-            for row in self.cursor.fetchall():
-                file_path = row[0]
+            for file_path, content_hash in self.cursor.fetchall():
                 if file_path:
                     full_path = os.path.normpath(os.path.join(self.files_dir, file_path))
                     if os.path.exists(full_path):
@@ -819,6 +995,7 @@ class LibraryManager:
                         except OSError as e:
                             messagebox.showerror("Erreur", f"Impossible de supprimer un fichier dans le dossier : {str(e)}")
                             return
+                    self.content_store.release(content_hash)
             if os.path.exists(folder_path):
                 try:
                     shutil.rmtree(folder_path)
@@ -829,7 +1006,7 @@ class LibraryManager:
                                (year, category, archives if archives else None, project))
             self.conn.commit()
             self.all_folders = [f for f in self.all_folders if f != (year, category, archives, project, notes)]
-            self.all_files = [f for f in self.all_files if not (f[2].lower() == year.lower() and f[3].lower() == category.lower() and f[4].lower() == archives.lower() and f[5].lower() == project.lower())]
+            self.files.remove_folder(year, category, archives, project)
             self.cursor.execute("SELECT 1 FROM library WHERE category=?", (category,))
             if not self.cursor.fetchone():
                 for year_dir in os.listdir(self.files_dir):
@@ -854,7 +1031,7 @@ class LibraryManager:
             _, category, _, _, _ = self.current_selected_folder
             category = str(category).strip()
             num_folders = sum(1 for f in self.all_folders if f[1].lower() == category.lower())
-            num_files = sum(1 for f in self.all_files if f[3].lower() == category.lower())
+            num_files = self.files.count_in_category(category)
             if not messagebox.askyesno("Confirmation", f"Supprimer la catégorie '{category}' ? Cela supprimera {num_folders} dossier(s) et {num_files} pièce(s)."):
                 return
             self.cursor.execute("SELECT DISTINCT year, archives, project FROM library WHERE category=?", (category,))
@@ -864,10 +1041,9 @@ class LibraryManager:
                 project = str(project).strip()
                 path_components = [self.files_dir, year, category] + ([archives] if archives else []) + [project]
                 folder_path = os.path.normpath(os.path.join(*path_components))
-                self.cursor.execute("SELECT file_path FROM library WHERE year=? AND category=? AND (archives=? OR archives IS NULL) AND project=?", 
+                self.cursor.execute("SELECT file_path, content_hash FROM library WHERE year=? AND category=? AND (archives=? OR archives IS NULL) AND project=?", 
                                    (year, category, archives if archives else None, project))
-                for row in self.cursor.fetchall():
-                    file_path = row[0]
+                for file_path, content_hash in self.cursor.fetchall():
                     if file_path:
                         full_path = os.path.normpath(os.path.join(self.files_dir, file_path))
                         if os.path.exists(full_path):
@@ -876,6 +1052,7 @@ class LibraryManager:
                             except OSError as e:
                                 messagebox.showerror("Erreur", f"Impossible de supprimer un fichier : {str(e)}")
                                 return
+                        self.content_store.release(content_hash)
                 if os.path.exists(folder_path):
                     try:
                         shutil.rmtree(folder_path)
@@ -893,7 +1070,7 @@ class LibraryManager:
             self.cursor.execute("DELETE FROM library WHERE category=?", (category,))
             self.conn.commit()
             self.all_folders = [f for f in self.all_folders if f[1].lower() != category.lower()]
-            self.all_files = [f for f in self.all_files if f[3].lower() != category.lower()]
+            self.files.remove_category(category)
             self.refresh_folder_list()
             self.clear_folder()
             self.load_files()
@@ -920,6 +1097,11 @@ class LibraryManager:
             move_file = self.move_file_var.get()
             if move_file and not messagebox.askyesno("Confirmation", "Voulez-vous déplacer ce fichier ?"):
                 return
+            content_hash = file_digest(file_path)
+            self.cursor.execute("SELECT file_path FROM library WHERE content_hash=? LIMIT 5", (content_hash,))
+            duplicates = [row[0] for row in self.cursor.fetchall()]
+            if duplicates and not messagebox.askyesno("Doublon", "Ce fichier est déjà présent dans la bibliothèque :\n" + "\n".join(duplicates) + "\n\nVoulez-vous l'ajouter quand même ?"):
+                return
             if keep_name:
                 title = os.path.basename(file_path)
                 site = None
@@ -946,17 +1128,19 @@ class LibraryManager:
             if os.path.exists(dest_path):
                 if not messagebox.askyesno("Confirmation", f"Le fichier {title} existe déjà. Voulez-vous l'écraser ?"):
                     return
-            if move_file:
-                shutil.move(file_path, dest_path)
+            if self.dedup_var.get():
+                self.content_store.ingest(file_path, dest_path, content_hash, move=move_file)
             else:
-                shutil.copy2(file_path, dest_path)
-            self.cursor.execute('''INSERT INTO library (title, year, category, archives, project, site, nomenclature, emetteur, objet, version, file_path, notes)
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                               (title, year, category, archives if archives else None, project, site, nomenclature, emetteur, objet, version, relative_dest_path, notes))
+                # Le fichier écrasé peut être un lien vers un objet partagé : il est remplacé, pas réécrit
+                replace_file(file_path, dest_path, move=move_file)
+            self.cursor.execute('''INSERT INTO library (title, year, category, archives, project, site, nomenclature, emetteur, objet, version, file_path, notes, content_hash)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                               (title, year, category, archives if archives else None, project, site, nomenclature, emetteur, objet, version, relative_dest_path, notes, content_hash))
             self.conn.commit()
             self.cursor.execute("SELECT last_insert_rowid()")
             file_id = self.cursor.fetchone()[0]
-            self.all_files.append((file_id, title, year, category, archives, project))
+            self.files.add(file_id, title, year, category, archives, project)
+            self.request_content_index_update()
             self.current_selected_folder = (year, category, archives, project, notes)
             self.current_folder = self.current_selected_folder
             self.refresh_folder_list()
@@ -975,6 +1159,165 @@ class LibraryManager:
         except (sqlite3.Error, OSError) as e:
             messagebox.showerror("Erreur", f"Échec de l'ajout du fichier : {str(e)}")
 
+    def bulk_import_files(self):
+        # Import de nombreux fichiers ou d'une arborescence entière dans le dossier sélectionné : copies
+        # simultanées en arrière-plan, puis insertion de toutes les pièces en une transaction.
+        if self.bulk_importer is not None:
+            messagebox.showinfo("Import en cours", "Un import en masse est déjà en cours.")
+            return
+        try:
+            selected = self.folder_tree.selection()
+            if not selected:
+                messagebox.showwarning("Erreur", "Veuillez sélectionner un dossier.")
+                return
+            year, category, archives, project, notes = self.folder_tree.item(selected[0])["values"]
+            year = str(year).strip()
+            category = str(category).strip()
+            archives = str(archives).strip() if archives else ""
+            project = str(project).strip()
+            notes = str(notes).strip() if notes else ""
+            keep_name = self.keep_name_var.get()
+            if keep_name:
+                site = nomenclature = emetteur = version = None
+
+                def naming(source):
+                    return os.path.basename(source), None
+            else:
+                site = self.site_var.get().strip()
+                nomenclature = self.nomenclature_var.get().strip()
+                emetteur = self.emetteur_var.get().strip()
+                objet_prefix = self.objet_var.get().strip()
+                version = self.version_var.get().strip()
+                if not all([site, nomenclature, emetteur, version]):
+                    messagebox.showwarning("Erreur", "Les champs Site, Nomenclature, Émetteur et Version sont obligatoires (l'objet est déduit du nom de chaque fichier).")
+                    return
+
+                def naming(source):
+                    # Objet : nom du fichier (sans tiret, séparateur de la nomenclature), précédé de l'objet saisi
+                    stem, extension = os.path.splitext(os.path.basename(source))
+                    objet = " ".join(part for part in (objet_prefix, stem.replace("-", " ").strip()) if part)
+                    return f"{year}-{site}-{nomenclature}-{emetteur}-{objet}-{version}{extension}", objet
+
+            choice = messagebox.askyesnocancel("Import en masse", "Importer un dossier entier (avec ses sous-dossiers) ?\n\nNon : sélectionner des fichiers.")
+            if choice is None:
+                return
+            if choice:
+                directory = filedialog.askdirectory(title="Sélectionner un dossier à importer")
+                if not directory:
+                    return
+                sources = collect_files(directory)
+            else:
+                sources = list(filedialog.askopenfilenames(filetypes=[("Tous les fichiers", "*.*")], title="Sélectionner des fichiers"))
+            if not sources:
+                messagebox.showinfo("Import en masse", "Aucun fichier à importer.")
+                return
+            move_file = self.move_file_var.get()
+            if not messagebox.askyesno("Confirmation", f"{'Déplacer' if move_file else 'Copier'} {len(sources)} fichier(s) dans {year}/{category}/{archives}/{project} ?"):
+                return
+
+            path_components = [year, category] + ([archives] if archives else []) + [project]
+            relative_dest_dir = os.path.join(*path_components).replace('\\', '/')
+            dest_dir = os.path.normpath(os.path.join(self.files_dir, relative_dest_dir))
+            os.makedirs(dest_dir, exist_ok=True)
+            items = plan_import(sources, self.files_dir, relative_dest_dir, naming)
+            existing = [item for item in items if os.path.exists(item.dest_path)]
+            if existing:
+                overwrite = messagebox.askyesnocancel("Confirmation", f"{len(existing)} fichier(s) existent déjà dans ce dossier. Voulez-vous les écraser ?\n\nNon : les ignorer.")
+                if overwrite is None:
+                    return
+                if not overwrite:
+                    existing_paths = {item.dest_path for item in existing}
+                    items = [item for item in items if item.dest_path not in existing_paths]
+            if not items:
+                messagebox.showinfo("Import en masse", "Aucun fichier à importer.")
+                return
+        except OSError as e:
+            messagebox.showerror("Erreur", f"Échec de l'import en masse : {str(e)}")
+            return
+
+        fields = (year, category, archives, project, site, nomenclature, emetteur, version, notes)
+        self.bulk_importer = BulkImporter(items, move=move_file, content_store=self.content_store if self.dedup_var.get() else None)
+        dialog = tk.Toplevel(self.parent)
+        dialog.title("Import en masse")
+        dialog.geometry("400x130")
+        dialog.transient(self.parent)
+        progress_label = ttk.Label(dialog, text=f"0 / {len(items)} fichiers importés")
+        progress_label.pack(pady=10)
+        progress_bar = ttk.Progressbar(dialog, maximum=len(items), length=350)
+        progress_bar.pack(pady=5)
+        ttk.Button(dialog, text="Annuler", command=self.bulk_importer.cancel).pack(pady=5)
+        dialog.protocol("WM_DELETE_WINDOW", self.bulk_importer.cancel)
+        self.bulk_importer.start()
+        self.parent.after(100, self.poll_bulk_import, dialog, progress_label, progress_bar, fields)
+
+    def poll_bulk_import(self, dialog, progress_label, progress_bar, fields):
+        importer = self.bulk_importer
+        progress_bar["value"] = importer.processed
+        progress_label.config(text=f"{importer.processed} / {importer.total} fichiers importés")
+        if not importer.done:
+            self.parent.after(100, self.poll_bulk_import, dialog, progress_label, progress_bar, fields)
+            return
+        dialog.destroy()
+        self.bulk_importer = None
+        self.apply_bulk_import(importer, fields)
+
+    def apply_bulk_import(self, importer, fields):
+        # Les fichiers copiés sont enregistrés même après une annulation : la base reste fidèle au disque
+        year, category, archives, project, site, nomenclature, emetteur, version, notes = fields
+        duplicates = 0
+        if importer.imported:
+            try:
+                paths = json.dumps([item.relative_path for item, _ in importer.imported])
+                # Contenus déjà présents ailleurs dans la bibliothèque (les pièces écrasées ne comptent pas)
+                self.cursor.execute("""SELECT COUNT(DISTINCT content_hash) FROM library
+                                       WHERE content_hash IN (SELECT value FROM json_each(?))
+                                       AND file_path NOT IN (SELECT value FROM json_each(?))""",
+                                    (json.dumps([digest for _, digest in importer.imported]), paths))
+                duplicates = self.cursor.fetchone()[0]
+                # Une pièce écrasée garde sa ligne (et donc son id, auquel sont rattachés les liens vers les tâches,
+                # l'intégrité et l'index de contenu) : seules ses métadonnées et son empreinte changent
+                self.cursor.execute("SELECT file_path, id, content_hash FROM library WHERE file_path IN (SELECT value FROM json_each(?))", (paths,))
+                existing = {file_path: (file_id, content_hash) for file_path, file_id, content_hash in self.cursor.fetchall()}
+                self.cursor.executemany('''UPDATE library SET title=?, year=?, category=?, archives=?, project=?, site=?, nomenclature=?, emetteur=?, objet=?, version=?, notes=?, content_hash=?
+                                        WHERE id=?''',
+                                        [(item.title, year, category, archives if archives else None, project, site, nomenclature, emetteur, item.objet, version, notes, digest, existing[item.relative_path][0])
+                                         for item, digest in importer.imported if item.relative_path in existing])
+                self.cursor.executemany('''INSERT INTO library (title, year, category, archives, project, site, nomenclature, emetteur, objet, version, file_path, notes, content_hash)
+                                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                                        [(item.title, year, category, archives if archives else None, project, site, nomenclature, emetteur, item.objet, version, item.relative_path, notes, digest)
+                                         for item, digest in importer.imported if item.relative_path not in existing])
+                # Le nouveau contenu, importé volontairement, devient la référence de la vérification d'intégrité
+                self.cursor.execute("DELETE FROM library_integrity WHERE file_id IN (SELECT value FROM json_each(?))",
+                                    (json.dumps([file_id for file_id, _ in existing.values()]),))
+                self.conn.commit()
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                messagebox.showerror("Erreur", f"Échec de l'enregistrement des pièces importées : {str(e)}")
+                return
+            # Les contenus remplacés ne sont plus liés à ces chemins : leur objet est supprimé s'il n'est plus utilisé
+            new_hashes = {item.relative_path: digest for item, digest in importer.imported}
+            for file_path, (_, content_hash) in existing.items():
+                if content_hash != new_hashes[file_path]:
+                    self.content_store.release(content_hash)
+            self.request_content_index_update()
+            self.current_selected_folder = (year, category, archives, project, notes)
+            self.current_folder = self.current_selected_folder
+            self.load_initial_data()
+            self.refresh_folder_list()
+            self.load_files()
+
+        message = f"{len(importer.imported)} fichier(s) importé(s) sur {importer.total}."
+        if duplicates:
+            message += f"\n{duplicates} contenu(s) étaient déjà présents dans la bibliothèque."
+        if importer.errors:
+            message += f"\n{len(importer.errors)} erreur(s) :\n" + "\n".join(f"{source} : {error}" for source, error in importer.errors[:10])
+        if importer.cancelled:
+            messagebox.showinfo("Import annulé", message)
+        elif importer.errors:
+            messagebox.showwarning("Import en masse", message)
+        else:
+            messagebox.showinfo("Succès", message)
+
     def modify_file(self):
         try:
             if not self.current_file_id:
@@ -1042,10 +1385,8 @@ class LibraryManager:
                                 objet if objet else None, version if version else None, new_relative_path, notes, self.current_file_id))
             self.conn.commit()
 
-            for i, (file_id, _, f_year, f_category, f_archives, f_project) in enumerate(self.all_files):
-                if file_id == self.current_file_id:
-                    self.all_files[i] = (file_id, title, year, category, archives, project)
-                    break
+            self.files.update(self.current_file_id, title, year, category, archives, project)
+            self.request_content_index_update()
 
             self.current_selected_folder = (year, category, archives, project, notes)
             self.current_folder = self.current_selected_folder
@@ -1062,8 +1403,8 @@ class LibraryManager:
                 messagebox.showwarning("Erreur", "Veuillez sélectionner une pièce à supprimer.")
                 return
             file_id = self.file_tree.item(selected[0])["values"][0]
-            self.cursor.execute("SELECT title, file_path FROM library WHERE id=?", (file_id,))
-            file_title, file_path = self.cursor.fetchone()
+            self.cursor.execute("SELECT title, file_path, content_hash FROM library WHERE id=?", (file_id,))
+            file_title, file_path, content_hash = self.cursor.fetchone()
             file_title = str(file_title).strip()
             file_path = str(file_path).strip().replace('\\', '/')
             if not messagebox.askyesno("Confirmation", f"Supprimer la pièce '{file_title}' ?"):
@@ -1071,9 +1412,10 @@ class LibraryManager:
             full_path = os.path.normpath(os.path.join(self.files_dir, file_path))
             if os.path.exists(full_path):
                 os.remove(full_path)
+            self.content_store.release(content_hash)
             self.cursor.execute("DELETE FROM library WHERE id=?", (file_id,))
             self.conn.commit()
-            self.all_files = [f for f in self.all_files if f[0] != file_id]
+            self.files.remove(file_id)
             self.refresh_folder_list()
             self.clear_file_form()
             self.load_files()
@@ -1088,12 +1430,12 @@ class LibraryManager:
                 messagebox.showwarning("Erreur", "Veuillez sélectionner une pièce à ouvrir.")
                 return
             file_id = self.file_tree.item(selected[0])["values"][0]
-            self.cursor.execute("SELECT year, category, archives, project, title, file_path FROM library WHERE id=?", (file_id,))
+            self.cursor.execute("SELECT year, category, archives, project, title, file_path, content_hash FROM library WHERE id=?", (file_id,))
             result = self.cursor.fetchone()
             if not result:
                 messagebox.showerror("Erreur", f"Aucune entrée trouvée pour l'ID {file_id}.")
                 return
-            year, category, archives, project, title, stored_file_path = result
+            year, category, archives, project, title, stored_file_path, content_hash = result
             year = str(year).strip()
             category = str(category).strip()
             archives = str(archives).strip() if archives else ""
@@ -1110,6 +1452,9 @@ class LibraryManager:
             if not os.access(file_path, os.R_OK):
                 messagebox.showerror("Erreur", f"Permissions insuffisantes pour '{file_path}'.")
                 return
+            # Copie à l'écriture : une pièce du stockage dédupliqué est détachée de son objet avant d'être
+            # confiée à l'éditeur, qui pourrait l'enregistrer sur place et modifier les autres pièces
+            self.content_store.detach(file_path, content_hash)
             if platform.system() == "Windows":
                 os.startfile(file_path)
             elif platform.system() == "Linux":
@@ -1162,10 +1507,11 @@ class LibraryManager:
                 return
             file_id = self.file_tree.item(selected[0])["values"][0]
             self.current_file_id = file_id
-            self.cursor.execute("SELECT title, site, nomenclature, emetteur, objet, version FROM library WHERE id=?", (file_id,))
+            self.cursor.execute("SELECT title, site, nomenclature, emetteur, objet, version, file_path FROM library WHERE id=?", (file_id,))
             result = self.cursor.fetchone()
             if result:
-                title, site, nomenclature, emetteur, objet, version = result
+                title, site, nomenclature, emetteur, objet, version, file_path = result
+                self.show_preview(file_path)
                 self.site_var.set(str(site).strip() if site else "")
                 self.nomenclature_var.set(str(nomenclature).strip() if nomenclature else "")
                 self.emetteur_var.set(str(emetteur).strip() if emetteur else "")
@@ -1176,6 +1522,58 @@ class LibraryManager:
         except sqlite3.Error as e:
             messagebox.showerror("Erreur", f"Échec du chargement du fichier : {str(e)}")
 
+    def show_preview(self, file_path):
+        # Aperçu depuis le cache disque ; s'il manque, il est généré en arrière-plan et affiché par poll_thumbnails
+        self.preview_image = None
+        self.preview_path = None
+        if not file_path:
+            self.preview_label.config(image="", text="Aucun fichier associé")
+            return
+        full_path = os.path.normpath(os.path.join(self.files_dir, str(file_path).strip()))
+        if not can_preview(full_path):
+            self.preview_label.config(image="", text="Aperçu indisponible pour ce type de fichier")
+            return
+        self.preview_path = full_path
+        try:
+            thumbnail_path = self.thumbnails.request(full_path)
+        except BrokenProcessPool:
+            self.preview_label.config(image="", text="Aperçu indisponible")
+            return
+        if thumbnail_path:
+            self.display_thumbnail(thumbnail_path)
+        else:
+            self.preview_label.config(image="", text="Génération de l'aperçu...")
+
+    def display_thumbnail(self, thumbnail_path):
+        if thumbnail_path is None:
+            self.preview_label.config(image="", text="Aperçu indisponible")
+            return
+        try:
+            self.preview_image = tk.PhotoImage(file=thumbnail_path)
+            self.preview_label.config(image=self.preview_image, text="")
+        except tk.TclError:
+            self.preview_label.config(image="", text="Aperçu indisponible")
+
+    def shutdown(self):
+        # Arrêt des traitements en arrière-plan et de leurs pools de processus (fermeture de l'application)
+        self.fs_sync.stop()
+        if self.content_indexer is not None:
+            self.content_indexer.stop()
+        for task in (self.path_verifier, self.bulk_importer, self.integrity_checker):
+            if task is not None:
+                task.cancel()
+        self.thumbnails.shutdown()
+
+    def poll_thumbnails(self):
+        while True:
+            try:
+                full_path, thumbnail_path = self.thumbnails.ready.get_nowait()
+            except queue.Empty:
+                break
+            if full_path == self.preview_path:
+                self.display_thumbnail(thumbnail_path)
+        self.parent.after(200, self.poll_thumbnails)
+
     def clear_folder(self):
         try:
             self.current_selected_folder = None
@@ -1198,6 +1596,9 @@ class LibraryManager:
             self.keep_name_var.set(False)
             self.move_file_var.set(False)
             self.toggle_file_fields()
+            self.preview_path = None
+            self.preview_image = None
+            self.preview_label.config(image="", text="Aucune pièce sélectionnée")
         except Exception as e:
             messagebox.showerror("Erreur", f"Échec du vidage du formulaire : {str(e)}")
 
@@ -1305,17 +1706,7 @@ class LibraryManager:
                 return
             self.current_folder = self.current_selected_folder
             year, category, archives, project, notes = self.current_folder
-            year = str(year).strip()
-            category = str(category).strip()
-            archives = str(archives).strip()
-            project = str(project).strip()
-            matching_files = [
-                (file_id, title) for file_id, title, f_year, f_category, f_archives, f_project in self.all_files
-                if f_year.lower() == year.lower() and 
-                   f_category.lower() == category.lower() and 
-                   f_archives.lower() == archives.lower() and 
-                   f_project.lower() == project.lower()
-            ]
+            matching_files = [(f.id, f.title) for f in self.files.files_in_folder(year, category, archives, project)]
             for index, (file_id, title) in enumerate(matching_files):
                 tag = "OddRow" if index % 2 else "EvenRow"
                 self.file_tree.insert("", tk.END, values=(file_id, title), tags=(tag,))
@@ -1330,17 +1721,9 @@ class LibraryManager:
                 return
             search_term = self.search_var.get().lower()
             year, category, archives, project, notes = self.current_folder
-            year = str(year).strip()
-            category = str(category).strip()
-            archives = str(archives).strip()
-            project = str(project).strip()
             matching_files = [
-                (file_id, title) for file_id, title, f_year, f_category, f_archives, f_project in self.all_files
-                if f_year.lower() == year.lower() and 
-                   f_category.lower() == category.lower() and 
-                   f_archives.lower() == archives.lower() and 
-                   f_project.lower() == project.lower() and
-                   search_term in title.lower()
+                (f.id, f.title) for f in self.files.files_in_folder(year, category, archives, project)
+                if search_term in f.title_lower
             ]
             for index, (file_id, title) in enumerate(matching_files):
                 tag = "OddRow" if index % 2 else "EvenRow"
@@ -0,0 +1,110 @@
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from scripts_bibliotheque.content_store import file_digest, replace_file
+
+COPY_WORKERS = 8  # Copies simultanées (utile surtout vers ou depuis un partage réseau)
+
+# Pièce à importer : fichier source, titre et objet retenus, chemin relatif et chemin complet de destination.
+ImportItem = namedtuple("ImportItem", "source title objet relative_path dest_path")
+
+
+def collect_files(directory):
+    """Retourne tous les fichiers d'une arborescence, dans l'ordre des chemins."""
+    files = []
+    for root, dirs, names in os.walk(directory):
+        dirs.sort()
+        files.extend(os.path.join(root, name) for name in sorted(names))
+    return files
+
+
+def unique_title(title, used_titles):
+    """Ajoute un suffixe « (2) », « (3) »… au titre s'il est déjà pris (sans tenir compte de la casse)."""
+    stem, extension = os.path.splitext(title)
+    candidate = title
+    number = 2
+    while candidate.lower() in used_titles:
+        candidate = f"{stem} ({number}){extension}"
+        number += 1
+    used_titles.add(candidate.lower())
+    return candidate
+
+
+def plan_import(sources, files_dir, relative_dest_dir, naming):
+    """
+    Applique la règle de nommage à chaque fichier et retourne les pièces à importer.
+    Deux fichiers qui recevraient le même titre (fichiers homonymes de sous-dossiers différents,
+    par exemple) sont départagés par un suffixe.
+
+    Args:
+        naming: fonction qui reçoit le chemin d'un fichier source et retourne (titre, objet).
+    """
+    used_titles = set()
+    items = []
+    for source in sources:
+        title, objet = naming(source)
+        title = unique_title(title, used_titles)
+        relative_path = os.path.join(relative_dest_dir, title).replace('\\', '/')
+        items.append(ImportItem(source, title, objet, relative_path, os.path.normpath(os.path.join(files_dir, relative_path))))
+    return items
+
+
+class BulkImporter(threading.Thread):
+    """
+    Copie (ou déplace) en arrière-plan les fichiers d'un import en masse avec un pool de threads
+    et calcule leur empreinte. Les lignes de la base sont insérées ensuite par l'interface,
+    en une seule transaction, pour les pièces effectivement copiées (self.imported).
+    """
+    def __init__(self, items, move=False, content_store=None, max_workers=COPY_WORKERS):
+        super().__init__(daemon=True)
+        self.items = items
+        self.move = move
+        self.content_store = content_store
+        self.max_workers = max_workers
+        self.total = len(items)
+        self.processed = 0
+        self.imported = []
+        self.errors = []
+        self.done = False
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def import_item(self, item):
+        if self.cancelled:
+            return None
+        digest = file_digest(item.source)
+        if self.content_store is not None:
+            self.content_store.ingest(item.source, item.dest_path, digest, move=self.move)
+            return digest
+        # Copie dans un fichier temporaire substitué au fichier écrasé : celui-ci reste intact si la copie
+        # échoue, et un lien vers un objet partagé est remplacé au lieu d'être réécrit
+        replace_file(item.source, item.dest_path, move=self.move)
+        return digest
+
+    def run(self):
+        imported = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {pool.submit(self.import_item, item): index for index, item in enumerate(self.items)}
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        digest = future.result()
+                    except OSError as e:
+                        self.errors.append((self.items[index].source, str(e)))
+                    else:
+                        if digest is not None:
+                            imported.append((index, digest))
+                    self.processed += 1
+        finally:
+            # Ordre de la sélection conservé pour l'insertion
+            self.imported = [(self.items[index], digest) for index, digest in sorted(imported)]
+            self.done = True
@@ -0,0 +1,241 @@
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import threading
+import zipfile
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Extensions dont le contenu peut être extrait
+TEXT_EXTENSIONS = {".txt", ".csv", ".md", ".log", ".json", ".xml", ".html", ".htm", ".ini"}
+OFFICE_MEMBERS = {
+    ".docx": ("word/document.xml",),
+    ".xlsx": ("xl/sharedStrings.xml",),
+    ".pptx": ("ppt/slides/",),
+    ".odt": ("content.xml",),
+    ".ods": ("content.xml",),
+    ".odp": ("content.xml",),
+}
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS | set(OFFICE_MEMBERS) | {".pdf"}
+
+MAX_CHARS = 2_000_000  # Texte indexé au maximum par fichier
+BATCH_SIZE = 50  # Nombre de fichiers écrits par transaction
+RETRY_DELAY = 60  # Secondes avant de reprendre un passage interrompu par une erreur
+
+XML_TAG_RE = re.compile(r"<[^>]+>")
+SPACES_RE = re.compile(r"\s+")
+
+
+def ensure_content_index(conn):
+    """
+    Crée les tables de l'index de contenu dans library.db :
+    - library_content : taille et date de modification de chaque fichier indexé (clé : library.id),
+    - library_content_fts : le texte extrait (rowid = library.id).
+    Un trigger supprime l'index d'un fichier lorsque sa ligne library est supprimée.
+
+    Returns:
+        bool: True si l'index est disponible, False si FTS5 n'est pas supporté par SQLite.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''CREATE TABLE IF NOT EXISTS library_content (
+            file_id INTEGER PRIMARY KEY,
+            size INTEGER,
+            mtime REAL,
+            FOREIGN KEY (file_id) REFERENCES library(id)
+        )''')
+        cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS library_content_fts USING fts5(content, tokenize='unicode61 remove_diacritics 2')")
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS library_content_ad AFTER DELETE ON library BEGIN
+            DELETE FROM library_content WHERE file_id = old.id;
+            DELETE FROM library_content_fts WHERE rowid = old.id;
+        END''')
+        conn.commit()
+        return True
+    except sqlite3.OperationalError:
+        conn.rollback()
+        return False
+
+
+def _xml_to_text(data):
+    text = XML_TAG_RE.sub(" ", data.decode("utf-8", errors="replace"))
+    return SPACES_RE.sub(" ", text)
+
+
+def _extract_pdf(full_path):
+    if importlib.util.find_spec("pypdf") is not None:
+        from pypdf import PdfReader
+        reader = PdfReader(full_path)
+        parts = []
+        length = 0
+        for page in reader.pages:
+            page_text = page.extract_text() or ""
+            parts.append(page_text)
+            length += len(page_text)
+            if length >= MAX_CHARS:
+                break
+        return "\n".join(parts)
+    if shutil.which("pdftotext"):
+        result = subprocess.run(["pdftotext", "-q", "-enc", "UTF-8", full_path, "-"], capture_output=True, timeout=120)
+        return result.stdout.decode("utf-8", errors="replace")
+    return None
+
+
+def extract_text(full_path):
+    """
+    Extrait le texte d'un fichier selon son extension.
+    Exécutée dans un processus de travail : ne doit dépendre que de ses arguments.
+
+    Returns:
+        str | None: Le texte extrait (tronqué à MAX_CHARS), None si l'extraction est impossible.
+    """
+    ext = os.path.splitext(full_path)[1].lower()
+    try:
+        if ext in TEXT_EXTENSIONS:
+            with open(full_path, "r", encoding="utf-8", errors="replace") as f:
+                text = f.read(MAX_CHARS)
+            if ext in {".xml", ".html", ".htm"}:
+                text = _xml_to_text(text.encode("utf-8"))
+            return text
+        if ext in OFFICE_MEMBERS:
+            parts = []
+            with zipfile.ZipFile(full_path) as archive:
+                for name in sorted(archive.namelist()):
+                    if any(name == member or (member.endswith("/") and name.startswith(member) and name.endswith(".xml"))
+                           for member in OFFICE_MEMBERS[ext]):
+                        parts.append(_xml_to_text(archive.read(name)))
+            return " ".join(parts)[:MAX_CHARS]
+        if ext == ".pdf":
+            text = _extract_pdf(full_path)
+            return text[:MAX_CHARS] if text is not None else None
+    except (OSError, zipfile.BadZipFile, subprocess.SubprocessError, ValueError):
+        return None
+    except Exception:
+        # Les bibliothèques d'extraction tierces peuvent lever leurs propres exceptions
+        return None
+    return None
+
+
+def _extract_job(file_id, full_path, size, mtime):
+    return file_id, size, mtime, extract_text(full_path)
+
+
+class ContentIndexer:
+    """
+    Indexe le contenu des fichiers de la bibliothèque en arrière-plan.
+    Seuls les fichiers dont la taille ou la date de modification a changé depuis le
+    dernier passage sont relus ; l'extraction est répartie sur un pool de processus.
+    """
+    def __init__(self, db_path, files_dir, max_workers=None):
+        self.db_path = db_path
+        self.files_dir = files_dir
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._pool = None
+        self.indexed_count = 0
+
+    def start(self):
+        """Démarre le thread d'indexation et lance un premier passage."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self.request_update()
+
+    def request_update(self):
+        """Demande un nouveau passage incrémental (après un ajout ou une modification de pièce)."""
+        self._wakeup.set()
+
+    def stop(self):
+        """Arrête le thread d'indexation et annule les extractions en attente (fermeture de l'application)."""
+        self._stop_event.set()
+        self._wakeup.set()
+        pool = self._pool
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self):
+        retry = False
+        while not self._stop_event.is_set():
+            # Après un passage interrompu, le suivant est lancé sans attendre de demande
+            self._wakeup.wait(RETRY_DELAY if retry else None)
+            self._wakeup.clear()
+            if self._stop_event.is_set():
+                break
+            try:
+                self.update_index()
+                retry = False
+            except Exception as e:
+                if self._stop_event.is_set():
+                    break
+                # Base occupée, pool de processus cassé (BrokenProcessPool) ou autre erreur : le thread
+                # continue et le passage suivant recrée son pool
+                print(f"Indexation du contenu interrompue : {e}")
+                retry = True
+
+    def find_changed_files(self, conn):
+        """Retourne les fichiers à (ré)indexer et supprime l'index des fichiers disparus."""
+        rows = conn.execute('''SELECT l.id, l.file_path, c.size, c.mtime
+                               FROM library l LEFT JOIN library_content c ON c.file_id = l.id
+                               WHERE l.file_path != \'\'''').fetchall()
+        changed = []
+        vanished = []
+        for file_id, file_path, indexed_size, indexed_mtime in rows:
+            if os.path.splitext(file_path)[1].lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            full_path = os.path.normpath(os.path.join(self.files_dir, file_path))
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                if indexed_size is not None:
+                    vanished.append((file_id,))
+                continue
+            if st.st_size != indexed_size or st.st_mtime != indexed_mtime:
+                changed.append((file_id, full_path, st.st_size, st.st_mtime))
+        if vanished:
+            conn.executemany("DELETE FROM library_content WHERE file_id=?", vanished)
+            conn.executemany("DELETE FROM library_content_fts WHERE rowid=?", vanished)
+            conn.commit()
+        return changed
+
+    def update_index(self):
+        """Effectue un passage incrémental complet."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            changed = self.find_changed_files(conn)
+            if not changed:
+                return
+            batch = []
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                self._pool = pool
+                futures = [pool.submit(_extract_job, *job) for job in changed]
+                for future in as_completed(futures):
+                    if self._stop_event.is_set():
+                        break
+                    batch.append(future.result())
+                    if len(batch) >= BATCH_SIZE:
+                        self._write_batch(conn, batch)
+                        batch = []
+            if batch:
+                self._write_batch(conn, batch)
+            # Pièces supprimées pendant l'extraction
+            conn.execute("DELETE FROM library_content_fts WHERE rowid NOT IN (SELECT id FROM library)")
+            conn.execute("DELETE FROM library_content WHERE file_id NOT IN (SELECT id FROM library)")
+            conn.commit()
+        finally:
+            self._pool = None
+            conn.close()
+
+    def _write_batch(self, conn, batch):
+        # Les fichiers dont le texte n'a pas pu être extrait sont mémorisés avec un contenu vide
+        # pour ne pas être relus à chaque passage tant qu'ils ne changent pas.
+        conn.executemany("DELETE FROM library_content_fts WHERE rowid=?", [(file_id,) for file_id, _, _, _ in batch])
+        conn.executemany("INSERT INTO library_content_fts (rowid, content) VALUES (?, ?)",
+                         [(file_id, text or "") for file_id, _, _, text in batch])
+        conn.executemany("INSERT OR REPLACE INTO library_content (file_id, size, mtime) VALUES (?, ?, ?)",
+                         [(file_id, size, mtime) for file_id, size, mtime, _ in batch])
+        conn.commit()
+        self.indexed_count += len(batch)
+
@@ -0,0 +1,154 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+
+HASH_CHUNK_SIZE = 1024 * 1024  # Lecture par blocs de 1 Mo pour le calcul de l'empreinte
+BACKFILL_BATCH_SIZE = 200  # Empreintes enregistrées par transaction
+
+
+def file_digest(path):
+    """Retourne l'empreinte SHA-256 (hexadécimale) du contenu d'un fichier."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def replace_file(source_path, dest_path, move=False):
+    """
+    Copie (ou déplace) source_path vers dest_path par un fichier temporaire du dossier de destination,
+    substitué d'un bloc à dest_path (os.replace). Un fichier existant reste intact si la copie échoue,
+    et un lien vers un objet partagé est remplacé au lieu d'être réécrit.
+    """
+    temp_path = os.path.join(os.path.dirname(dest_path), f".{os.path.basename(dest_path)}.{threading.get_ident()}.tmp")
+    try:
+        if move:
+            shutil.move(source_path, temp_path)
+        else:
+            shutil.copy2(source_path, temp_path)
+        os.replace(temp_path, dest_path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class ContentStore:
+    """
+    Stockage des pièces par contenu : chaque contenu distinct est conservé une seule fois sous
+    son empreinte (objets/<2 premiers caractères>/<empreinte>) et les chemins de la bibliothèque
+    sont des liens physiques vers cet objet. Les autres fonctions (ouverture, export, vérification
+    des chemins) voient des fichiers ordinaires.
+    Le dossier des objets est placé à côté de la bibliothèque, et non dedans, pour rester sur le
+    même volume (condition des liens physiques) sans apparaître dans l'arborescence année/catégorie.
+    Un lien partage son contenu avec l'objet et les autres pièces : avant toute écriture possible
+    dans une pièce (ouverture dans un éditeur, remplacement), il est remplacé par une copie privée
+    (detach), pour que la modification ne touche qu'elle.
+    """
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+
+    def object_path(self, digest):
+        return os.path.join(self.store_dir, digest[:2], digest)
+
+    def ingest(self, source_path, dest_path, digest, move=False):
+        """
+        Place le contenu de source_path dans le stockage (s'il n'y est pas déjà) puis crée dest_path
+        comme lien physique vers l'objet. Si le volume ne permet pas les liens physiques, dest_path
+        est une copie ordinaire.
+
+        Returns:
+            bool: True si dest_path est un lien vers l'objet, False s'il s'agit d'une copie.
+        """
+        object_path = self.object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            # Nom temporaire propre au thread : deux imports simultanés du même contenu ne se gênent pas
+            temp_path = f"{object_path}.{threading.get_ident()}.tmp"
+            if move:
+                shutil.move(source_path, temp_path)
+            else:
+                shutil.copy2(source_path, temp_path)
+            os.replace(temp_path, object_path)
+        elif move:
+            os.remove(source_path)
+        # Lien créé sous un nom temporaire puis substitué à dest_path : un fichier écrasé reste intact
+        # si le lien et la copie échouent
+        temp_path = os.path.join(os.path.dirname(dest_path), f".{os.path.basename(dest_path)}.{threading.get_ident()}.tmp")
+        try:
+            os.link(object_path, temp_path)
+        except OSError:
+            replace_file(object_path, dest_path)
+            return False
+        os.replace(temp_path, dest_path)
+        return True
+
+    def detach(self, path, digest):
+        """
+        Remplace la pièce path, si elle est un lien vers un objet partagé, par une copie privée de
+        même contenu ; l'objet d'empreinte digest est libéré s'il n'est plus utilisé.
+
+        Returns:
+            bool: True si le lien a été remplacé par une copie.
+        """
+        if os.stat(path).st_nlink <= 1:
+            return False
+        replace_file(path, path)
+        self.release(digest)
+        return True
+
+    def release(self, digest):
+        """Supprime l'objet d'une empreinte lorsqu'aucun chemin de la bibliothèque n'y est plus lié."""
+        if not digest:
+            return
+        object_path = self.object_path(digest)
+        try:
+            if os.stat(object_path).st_nlink <= 1:
+                os.remove(object_path)
+        except FileNotFoundError:
+            pass
+
+
+class HashBackfill(threading.Thread):
+    """
+    Calcule en arrière-plan l'empreinte des pièces qui n'en ont pas encore (ajoutées avant
+    l'apparition de la colonne content_hash), avec sa propre connexion à la base.
+    """
+    def __init__(self, db_path, files_dir):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.files_dir = files_dir
+
+    def run(self):
+        if not self.db_path:
+            return
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+        except sqlite3.Error:
+            return
+        try:
+            rows = conn.execute("SELECT id, file_path FROM library WHERE content_hash IS NULL AND file_path != ''").fetchall()
+            batch = []
+            for file_id, file_path in rows:
+                full_path = os.path.normpath(os.path.join(self.files_dir, str(file_path).strip().replace('\\', '/')))
+                try:
+                    batch.append((file_digest(full_path), file_id))
+                except OSError:
+                    continue
+                if len(batch) >= BACKFILL_BATCH_SIZE:
+                    self._write(conn, batch)
+                    batch = []
+            if batch:
+                self._write(conn, batch)
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _write(conn, batch):
+        with conn:
+            conn.executemany("UPDATE library SET content_hash=? WHERE id=? AND content_hash IS NULL", batch)
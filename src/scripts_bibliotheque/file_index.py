@@ -0,0 +1,99 @@
+def clean(value):
+    return str(value).strip() if value is not None else ""
+
+
+def folder_key(year, category, archives, project):
+    """Clé normalisée (sans espaces superflus, en minuscules) d'un dossier de la bibliothèque."""
+    return (clean(year).lower(), clean(category).lower(), clean(archives).lower(), clean(project).lower())
+
+
+class LibraryFile:
+    __slots__ = ("id", "title", "title_lower", "year", "category", "archives", "project")
+
+    def __init__(self, file_id, title, year, category, archives, project):
+        self.id = file_id
+        self.title = clean(title)
+        self.title_lower = self.title.lower()
+        self.year = clean(year)
+        self.category = clean(category)
+        self.archives = clean(archives)
+        self.project = clean(project)
+
+    @property
+    def key(self):
+        return folder_key(self.year, self.category, self.archives, self.project)
+
+
+class FileIndex:
+    """
+    Pièces de la bibliothèque en mémoire, indexées par identifiant et par dossier.
+    Les pièces d'un dossier sont conservées dans leur ordre d'ajout, si bien que
+    la sélection d'un dossier ne parcourt que ses propres pièces.
+    """
+    def __init__(self):
+        self.by_id = {}
+        self.by_folder = {}
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def load(self, rows):
+        """Remplace le contenu de l'index par les lignes (id, title, year, category, archives, project)."""
+        self.by_id = {}
+        self.by_folder = {}
+        for row in rows:
+            self.add(*row)
+
+    def add(self, file_id, title, year, category, archives, project):
+        if file_id in self.by_id:
+            self.remove(file_id)
+        library_file = LibraryFile(file_id, title, year, category, archives, project)
+        self.by_id[file_id] = library_file
+        self.by_folder.setdefault(library_file.key, {})[file_id] = library_file
+
+    def update(self, file_id, title, year, category, archives, project):
+        """Met à jour une pièce ; elle garde sa place si elle reste dans le même dossier."""
+        old = self.by_id.get(file_id)
+        if old is None or old.key != folder_key(year, category, archives, project):
+            self.add(file_id, title, year, category, archives, project)
+            return
+        updated = LibraryFile(file_id, title, year, category, archives, project)
+        self.by_id[file_id] = updated
+        self.by_folder[old.key][file_id] = updated
+
+    def remove(self, file_id):
+        library_file = self.by_id.pop(file_id, None)
+        if library_file is None:
+            return
+        folder = self.by_folder.get(library_file.key)
+        if folder is not None:
+            folder.pop(file_id, None)
+            if not folder:
+                del self.by_folder[library_file.key]
+
+    def files_in_folder(self, year, category, archives, project):
+        return list(self.by_folder.get(folder_key(year, category, archives, project), {}).values())
+
+    def count_in_folder(self, year, category, archives, project):
+        return len(self.by_folder.get(folder_key(year, category, archives, project), {}))
+
+    def remove_folder(self, year, category, archives, project):
+        for file_id in list(self.by_folder.get(folder_key(year, category, archives, project), {})):
+            self.remove(file_id)
+
+    def move_folder(self, old_folder, new_folder):
+        """Déplace toutes les pièces d'un dossier (year, category, archives, project) vers un autre."""
+        for library_file in self.files_in_folder(*old_folder):
+            self.add(library_file.id, library_file.title, *new_folder)
+
+    def folder_keys_in_category(self, category):
+        category = clean(category).lower()
+        return [key for key in self.by_folder if key[1] == category]
+
+    def count_in_category(self, category):
+        return sum(len(self.by_folder[key]) for key in self.folder_keys_in_category(category))
+
+    def remove_category(self, category):
+        for key in self.folder_keys_in_category(category):
+            for file_id in list(self.by_folder[key]):
+                self.remove(file_id)
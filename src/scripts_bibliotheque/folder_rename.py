@@ -0,0 +1,115 @@
+import json
+import os
+import sqlite3
+
+
+def relative_folder(year, category, archives, project):
+    """Chemin relatif (séparateur '/') d'un dossier de la bibliothèque."""
+    return "/".join([year, category] + ([archives] if archives else []) + [project])
+
+
+def existing_ancestor(path):
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def can_rename_folder(conn, files_dir, old_folder, new_folder):
+    """
+    Indique si un dossier peut être renommé d'un seul bloc : l'ancien dossier existe, la destination
+    est libre et sur le même volume, aucun des deux n'est inclus dans l'autre, et le dossier ne
+    contient que ses propres pièces (pas les dossiers d'archives d'un autre projet, par exemple),
+    toutes enregistrées sous son chemin.
+    Les dossiers sont des tuples (year, category, archives, project).
+    """
+    old_path = os.path.normpath(os.path.join(files_dir, relative_folder(*old_folder)))
+    new_path = os.path.normpath(os.path.join(files_dir, relative_folder(*new_folder)))
+    if not os.path.isdir(old_path):
+        return False
+    case_only = os.path.normcase(old_path) == os.path.normcase(new_path)
+    if os.path.exists(new_path) and not case_only:
+        return False
+    if not case_only and os.path.normcase(os.path.commonpath([old_path, new_path])) in (os.path.normcase(old_path), os.path.normcase(new_path)):
+        return False
+    if os.stat(old_path).st_dev != os.stat(existing_ancestor(os.path.dirname(new_path))).st_dev:
+        return False
+    old_prefix = relative_folder(*old_folder) + "/"
+    year, category, archives, project = old_folder
+    mismatched = conn.execute('''SELECT 1 FROM library WHERE file_path != ''
+                                 AND (substr(file_path, 1, ?) = ?) != (year = ? AND category = ? AND COALESCE(archives, '') = ? AND project = ?)
+                                 LIMIT 1''',
+                              (len(old_prefix), old_prefix, year, category, archives, project)).fetchone()
+    return mismatched is None
+
+
+def rename_folder(conn, files_dir, journal_path, old_folder, new_folder):
+    """
+    Renomme un dossier sur le disque en une opération, puis réécrit le préfixe des chemins de ses
+    pièces par une seule requête UPDATE, sans valider la transaction : l'appelant y ajoute ses propres
+    mises à jour (ligne du dossier), valide l'ensemble puis appelle finish_folder_rename. Un journal
+    est écrit avant le renommage : si la mise à jour échoue, le dossier reprend son nom ; si l'appelant
+    annule sa transaction ou si l'application s'interrompt avant la validation, recover_folder_rename
+    rétablit l'ancien nom.
+
+    Returns:
+        int | None: le nombre de pièces mises à jour, ou None si le renommage du dossier a échoué
+        (rien n'a été modifié, l'appelant peut déplacer les fichiers un par un).
+    """
+    old_path = os.path.normpath(os.path.join(files_dir, relative_folder(*old_folder)))
+    new_path = os.path.normpath(os.path.join(files_dir, relative_folder(*new_folder)))
+    old_prefix = relative_folder(*old_folder) + "/"
+    new_prefix = relative_folder(*new_folder) + "/"
+    with open(journal_path, "w", encoding="utf-8") as f:
+        json.dump({"old_path": old_path, "new_path": new_path, "new_folder": list(new_folder)}, f, indent=4)
+    try:
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+        os.rename(old_path, new_path)
+    except OSError:
+        os.remove(journal_path)
+        return None
+    year, category, archives, project = old_folder
+    new_year, new_category, new_archives, new_project = new_folder
+    try:
+        cursor = conn.execute('''UPDATE library SET year = ?, category = ?, archives = ?, project = ?, file_path = ? || substr(file_path, ?)
+                                 WHERE file_path != '' AND substr(file_path, 1, ?) = ?
+                                 AND year = ? AND category = ? AND COALESCE(archives, '') = ? AND project = ?''',
+                              (new_year, new_category, new_archives if new_archives else None, new_project, new_prefix, len(old_prefix) + 1,
+                               len(old_prefix), old_prefix, year, category, archives, project))
+    except sqlite3.Error:
+        conn.rollback()
+        os.rename(new_path, old_path)
+        os.remove(journal_path)
+        raise
+    return cursor.rowcount
+
+
+def finish_folder_rename(journal_path):
+    """Supprime le journal d'un renommage, une fois la transaction de l'appelant validée."""
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
+
+
+def recover_folder_rename(conn, journal_path):
+    """
+    Termine un renommage interrompu ou annulé d'après son journal : si la base ne connaît pas le
+    nouveau dossier (transaction non validée), le dossier reprend son ancien nom sur le disque.
+
+    Returns:
+        bool: True si un renommage a été annulé.
+    """
+    if not os.path.exists(journal_path):
+        return False
+    with open(journal_path, "r", encoding="utf-8") as f:
+        journal = json.load(f)
+    year, category, archives, project = journal["new_folder"]
+    committed = conn.execute("SELECT 1 FROM library WHERE year = ? AND category = ? AND COALESCE(archives, '') = ? AND project = ? LIMIT 1",
+                             (year, category, archives, project)).fetchone() is not None
+    rolled_back = False
+    if not committed and os.path.isdir(journal["new_path"]) and not os.path.exists(journal["old_path"]):
+        os.rename(journal["new_path"], journal["old_path"])
+        rolled_back = True
+    os.remove(journal_path)
+    return rolled_back
@@ -0,0 +1,284 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+
+from scripts_bibliotheque.content_store import file_digest
+
+SYNC_INTERVAL = 60  # Secondes entre deux synchronisations automatiques
+MAX_REMOVED_RATIO = 0.5  # Au-delà, la disparition est suspecte (partage réseau déconnecté) : rien n'est supprimé
+MIN_SNAPSHOT_FOR_RATIO = 20
+
+# Différences entre l'instantané et le disque : chemins ajoutés, supprimés, renommés (ancien, nouveau) et modifiés
+SyncDelta = namedtuple("SyncDelta", "added removed renamed modified")
+
+
+def ensure_sync_snapshot(conn):
+    """
+    Crée dans library.db l'instantané du dossier bibliotheque (chemin, taille, date de modification
+    en nanosecondes, inode de chaque fichier) et l'index sur library.file_path utilisé pour appliquer
+    les différences.
+    """
+    conn.execute('''CREATE TABLE IF NOT EXISTS fs_snapshot (
+        path TEXT PRIMARY KEY,
+        size INTEGER,
+        mtime_ns INTEGER,
+        inode INTEGER
+    ) WITHOUT ROWID''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_file_path ON library (file_path)")
+    conn.commit()
+
+
+def scan_tree(files_dir):
+    """Parcourt le dossier avec os.scandir et retourne {chemin relatif: (taille, mtime_ns, inode)}."""
+    entries = {}
+    stack = [(files_dir, "")]
+    while stack:
+        path, prefix = stack.pop()
+        with os.scandir(path) as iterator:
+            for entry in iterator:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, prefix + entry.name + "/"))
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    entries[prefix + entry.name] = (st.st_size, st.st_mtime_ns, entry.inode())
+    return entries
+
+
+def diff_snapshot(snapshot, current):
+    """
+    Compare l'instantané au parcours du disque. Un fichier disparu et un fichier apparu qui partagent
+    le même inode (et la même taille) sont un renommage ; un inode partagé par plusieurs fichiers
+    (liens physiques du stockage dédupliqué) n'est pas utilisé pour apparier.
+    """
+    removed = [path for path in snapshot if path not in current]
+    added = [path for path in current if path not in snapshot]
+    modified = [path for path, state in current.items() if path in snapshot and snapshot[path][:2] != state[:2]]
+
+    def by_inode(paths, entries):
+        inodes = {}
+        for path in paths:
+            size, _, inode = entries[path]
+            if inode:
+                inodes.setdefault((inode, size), []).append(path)
+        return {key: paths[0] for key, paths in inodes.items() if len(paths) == 1}
+
+    removed_by_inode = by_inode(removed, snapshot)
+    added_by_inode = by_inode(added, current)
+    renamed = [(old_path, added_by_inode[key]) for key, old_path in removed_by_inode.items() if key in added_by_inode]
+    renamed_old = {old_path for old_path, _ in renamed}
+    renamed_new = {new_path for _, new_path in renamed}
+    return SyncDelta([path for path in added if path not in renamed_new],
+                     [path for path in removed if path not in renamed_old],
+                     renamed, modified)
+
+
+def path_fields(path):
+    """Déduit (year, category, archives, project, title) d'un chemin relatif, ou None s'il n'a pas la forme attendue."""
+    parts = path.split("/")
+    if len(parts) == 4:
+        return parts[0], parts[1], None, parts[2], parts[3]
+    if len(parts) == 5:
+        return tuple(parts)
+    return None
+
+
+class LibrarySync:
+    """
+    Synchronise en arrière-plan la table library avec le dossier bibliotheque.
+    Chaque passage compare un parcours rapide du disque à l'instantané conservé dans fs_snapshot
+    et n'applique que les différences :
+    - fichier renommé ou déplacé : chemin et métadonnées de la pièce mis à jour,
+    - fichier supprimé : pièce supprimée avec ses liens vers les tâches, et objet du stockage
+      dédupliqué libéré s'il n'est plus utilisé,
+    - fichier ajouté hors de l'application : pièce créée s'il est toujours là au passage suivant
+      (un ajout en cours par l'interface a ainsi le temps d'être enregistré),
+    - fichier modifié : l'empreinte enregistrée à l'ajout (content_hash) est conservée et devient, si
+      besoin, la référence de la vérification d'intégrité, qui signale la modification.
+    Les empreintes des ajouts sont calculées avant la première écriture : la transaction ne contient
+    que les requêtes et ne bloque pas les écritures de l'interface pendant la lecture des fichiers.
+    Le premier passage ne fait qu'enregistrer l'instantané. Après un passage qui a modifié la
+    bibliothèque, le nombre de changements est publié dans self.results.
+    """
+    def __init__(self, db_path, files_dir, interval=SYNC_INTERVAL, content_store=None):
+        self.db_path = db_path
+        self.files_dir = files_dir
+        self.content_store = content_store
+        self.interval = interval
+        self.snapshot = None
+        self.pending_added = set()
+        self.results = []
+        self.lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def reset(self):
+        """Oublie l'instantané en mémoire (après le remplacement de library.db par un import)."""
+        self.snapshot = None
+        self.pending_added = set()
+
+    def request_sync(self):
+        """Demande un passage immédiat."""
+        self._wakeup.set()
+
+    def stop(self):
+        """Arrête le thread après le passage en cours (fermeture de l'application)."""
+        self._stop_event.set()
+        self._wakeup.set()
+
+    def pop_results(self):
+        with self.lock:
+            results, self.results = self.results, []
+        return results
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.sync()
+            except (sqlite3.Error, OSError) as e:
+                print(f"Synchronisation de la bibliothèque interrompue : {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def sync(self):
+        """
+        Effectue un passage de synchronisation.
+
+        Returns:
+            int: le nombre de pièces créées, modifiées ou supprimées dans library.
+        """
+        if not os.path.isdir(self.files_dir):
+            return 0
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            if self.snapshot is None:
+                self.snapshot = {path: (size, mtime_ns, inode) for path, size, mtime_ns, inode in
+                                 conn.execute("SELECT path, size, mtime_ns, inode FROM fs_snapshot").fetchall()}
+            current = scan_tree(self.files_dir)
+            if not self.snapshot:
+                self._write_snapshot(conn, current, current, [])
+                conn.commit()
+                self.snapshot = current
+                return 0
+
+            delta = diff_snapshot(self.snapshot, current)
+            if not (delta.added or delta.removed or delta.renamed or delta.modified):
+                return 0
+            if len(self.snapshot) >= MIN_SNAPSHOT_FOR_RATIO and len(delta.removed) > MAX_REMOVED_RATIO * len(self.snapshot):
+                # Seules comptent les pièces encore enregistrées (une suppression faite par l'application n'est pas suspecte)
+                missing = conn.execute("SELECT COUNT(*) FROM library WHERE file_path IN (SELECT value FROM json_each(?))",
+                                       (json.dumps(delta.removed),)).fetchone()[0]
+                if missing > MAX_REMOVED_RATIO * len(self.snapshot):
+                    print(f"Synchronisation de la bibliothèque suspendue : {missing} fichiers introuvables.")
+                    return 0
+            changes, released = self.apply_delta(conn, delta, current)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        # Les objets des pièces supprimées ne sont libérés qu'une fois la suppression enregistrée
+        if self.content_store is not None:
+            for content_hash in released:
+                self.content_store.release(content_hash)
+        if changes:
+            with self.lock:
+                self.results.append(changes)
+        return changes
+
+    def apply_delta(self, conn, delta, current):
+        """
+        Applique les différences à library et à l'instantané, dans la transaction de conn.
+
+        Returns:
+            tuple: (nombre de pièces modifiées, empreintes des pièces supprimées à libérer après validation).
+        """
+        # Lectures et calcul des empreintes avant la première écriture : la transaction ne prend le
+        # verrou d'écriture de library.db qu'une fois les fichiers lus
+        known = set()
+        digests = {}
+        if delta.added:
+            known = {os.path.normcase(row[0]) for row in
+                     conn.execute("SELECT file_path FROM library WHERE file_path IN (SELECT value FROM json_each(?))",
+                                  (json.dumps(delta.added),)).fetchall()}
+            if os.path.normcase("A") != "A":
+                # Système insensible à la casse : un chemin enregistré avec une autre casse est le même fichier
+                known |= {os.path.normcase(row[0]) for row in conn.execute("SELECT file_path FROM library WHERE file_path != ''").fetchall()}
+            for path in delta.added:
+                if path in self.pending_added and os.path.normcase(path) not in known and path_fields(path):
+                    try:
+                        digests[path] = file_digest(os.path.join(self.files_dir, path))
+                    except OSError:
+                        continue
+        removed_rows = []
+        if delta.removed:
+            removed_rows = conn.execute("SELECT id, content_hash FROM library WHERE file_path IN (SELECT value FROM json_each(?))",
+                                        (json.dumps(delta.removed),)).fetchall()
+
+        changes = 0
+        for old_path, new_path in delta.renamed:
+            fields = path_fields(new_path)
+            if fields:
+                changes += conn.execute("UPDATE library SET year=?, category=?, archives=?, project=?, title=?, file_path=? WHERE file_path=?",
+                                        fields + (new_path, old_path)).rowcount
+            else:
+                changes += conn.execute("UPDATE library SET file_path=? WHERE file_path=?", (new_path, old_path)).rowcount
+
+        if removed_rows:
+            # Même nettoyage que la suppression d'une pièce depuis l'interface : liens vers les tâches compris
+            removed_ids = json.dumps([file_id for file_id, _ in removed_rows])
+            conn.execute("DELETE FROM task_file_link WHERE file_id IN (SELECT value FROM json_each(?))", (removed_ids,))
+            changes += conn.execute("DELETE FROM library WHERE id IN (SELECT value FROM json_each(?))", (removed_ids,)).rowcount
+
+        # Un contenu modifié hors de l'application n'est pas accepté d'office : l'empreinte de l'ajout reste
+        # la référence, pour que la vérification d'intégrité signale la modification
+        if delta.modified:
+            conn.execute("""INSERT OR IGNORE INTO library_integrity (file_id, reference_hash)
+                            SELECT id, content_hash FROM library
+                            WHERE file_path IN (SELECT value FROM json_each(?)) AND content_hash IS NOT NULL""",
+                         (json.dumps(delta.modified),))
+
+        recorded = []
+        if delta.added:
+            pending_added = set()
+            for path in delta.added:
+                fields = path_fields(path)
+                if os.path.normcase(path) in known or fields is None:
+                    recorded.append(path)
+                elif path in digests:
+                    year, category, archives, project, title = fields
+                    conn.execute('''INSERT INTO library (title, year, category, archives, project, file_path, notes, content_hash)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', (title, year, category, archives, project, path, "", digests[path]))
+                    changes += 1
+                    recorded.append(path)
+                elif path not in self.pending_added:
+                    pending_added.add(path)
+            self.pending_added = pending_added
+
+        # Les fichiers ajoutés en attente restent hors de l'instantané pour être revus au passage suivant
+        snapshot = dict(self.snapshot)
+        for path in delta.removed:
+            del snapshot[path]
+        for old_path, new_path in delta.renamed:
+            del snapshot[old_path]
+            snapshot[new_path] = current[new_path]
+        for path in delta.modified + recorded:
+            snapshot[path] = current[path]
+        self._write_snapshot(conn, current, [new_path for _, new_path in delta.renamed] + delta.modified + recorded,
+                             delta.removed + [old_path for old_path, _ in delta.renamed])
+        self.snapshot = snapshot
+        return changes, [content_hash for _, content_hash in removed_rows if content_hash]
+
+    @staticmethod
+    def _write_snapshot(conn, current, upserted, deleted):
+        conn.executemany("DELETE FROM fs_snapshot WHERE path=?", [(path,) for path in deleted])
+        conn.executemany("INSERT OR REPLACE INTO fs_snapshot (path, size, mtime_ns, inode) VALUES (?, ?, ?, ?)",
+                         [(path,) + current[path] for path in upserted])
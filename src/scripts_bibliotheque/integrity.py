@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+from scripts_bibliotheque.content_store import file_digest
+
+CHUNK_SIZE = 64  # Fichiers empreintés par tâche du pool de processus
+MAX_PENDING_CHUNKS = 4  # Tâches en attente par processus : le parcours reste en flux, sans tout soumettre d'un coup
+
+# Anomalie relevée : pièce, chemin relatif, nature ("Contenu modifié" ou "Fichier manquant") et empreintes
+IntegrityIssue = namedtuple("IntegrityIssue", "file_id file_path problem expected_hash current_hash")
+
+
+def ensure_integrity_table(conn):
+    """
+    Crée la table library_integrity : pour chaque pièce, la taille et la date de modification
+    (en nanosecondes) lors de la dernière lecture, l'empreinte de référence et la dernière
+    empreinte observée. Un trigger supprime l'entrée lorsque la pièce est supprimée.
+    """
+    conn.execute('''CREATE TABLE IF NOT EXISTS library_integrity (
+        file_id INTEGER PRIMARY KEY,
+        size INTEGER,
+        mtime_ns INTEGER,
+        reference_hash TEXT,
+        current_hash TEXT,
+        checked_at TEXT,
+        FOREIGN KEY (file_id) REFERENCES library(id)
+    )''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS library_integrity_ad AFTER DELETE ON library BEGIN
+        DELETE FROM library_integrity WHERE file_id = old.id;
+    END''')
+    conn.commit()
+
+
+def _hash_chunk(jobs):
+    """Calcule l'empreinte d'un lot de fichiers. Exécutée dans un processus de travail."""
+    results = []
+    for file_id, full_path, size, mtime_ns in jobs:
+        try:
+            digest = file_digest(full_path)
+        except OSError:
+            digest = None
+        results.append((file_id, size, mtime_ns, digest))
+    return results
+
+
+def integrity_issues(conn):
+    """Retourne les pièces dont l'empreinte observée diffère de l'empreinte de référence."""
+    rows = conn.execute('''SELECT i.file_id, l.file_path, i.reference_hash, i.current_hash
+                           FROM library_integrity i JOIN library l ON l.id = i.file_id
+                           WHERE i.current_hash != i.reference_hash
+                           ORDER BY l.file_path''').fetchall()
+    return [IntegrityIssue(file_id, file_path, "Contenu modifié", reference_hash, current_hash)
+            for file_id, file_path, reference_hash, current_hash in rows]
+
+
+def accept_changes(conn, file_ids):
+    """Prend le contenu actuel des pièces comme nouvelle référence."""
+    conn.executemany("UPDATE library_integrity SET reference_hash = current_hash WHERE file_id = ?", [(file_id,) for file_id in file_ids])
+    conn.executemany('''UPDATE library SET content_hash = (SELECT current_hash FROM library_integrity WHERE file_id = library.id)
+                        WHERE id = ?''', [(file_id,) for file_id in file_ids])
+    conn.commit()
+
+
+class IntegrityChecker(threading.Thread):
+    """
+    Vérifie l'intégrité des pièces en arrière-plan, avec sa propre connexion à la base.
+    Chaque fichier est d'abord comparé par stat à la taille et à la date de modification
+    enregistrées : seuls les fichiers nouveaux ou changés sont relus, par lots répartis sur un
+    pool de processus (full=True relit tous les fichiers, pour détecter une corruption qui ne
+    modifie pas la date). L'empreinte de référence est celle calculée à l'ajout de la pièce
+    (content_hash) ou, à défaut, celle du premier passage.
+    Les anomalies sont ensuite lues par integrity_issues ; les fichiers manquants sont dans self.missing.
+    """
+    def __init__(self, db_path, files_dir, full=False, max_workers=None):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.files_dir = files_dir
+        self.full = full
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.total = 0
+        self.checked = 0
+        self.hashed = 0
+        self.missing = []
+        self.error = None
+        self.done = False
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def run(self):
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            rows = conn.execute('''SELECT l.id, l.file_path, l.content_hash, i.size, i.mtime_ns, i.reference_hash
+                                   FROM library l LEFT JOIN library_integrity i ON i.file_id = l.id
+                                   WHERE l.file_path != \'\'''').fetchall()
+            self.total = len(rows)
+            references = {}
+            pending = set()
+            chunk = []
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                for file_id, file_path, content_hash, size, mtime_ns, reference_hash in rows:
+                    if self.cancelled:
+                        break
+                    full_path = os.path.normpath(os.path.join(self.files_dir, file_path))
+                    try:
+                        st = os.stat(full_path)
+                    except OSError:
+                        self.missing.append((file_id, file_path))
+                        self.checked += 1
+                        continue
+                    if not self.full and reference_hash is not None and (st.st_size, st.st_mtime_ns) == (size, mtime_ns):
+                        self.checked += 1
+                        continue
+                    references[file_id] = reference_hash or content_hash
+                    chunk.append((file_id, full_path, st.st_size, st.st_mtime_ns))
+                    if len(chunk) >= CHUNK_SIZE:
+                        pending.add(pool.submit(_hash_chunk, chunk))
+                        chunk = []
+                        # Nombre borné de lots en cours : les résultats sont écrits au fil de l'eau
+                        while len(pending) >= self.max_workers * MAX_PENDING_CHUNKS:
+                            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            self._write_results(conn, finished, references)
+                if chunk and not self.cancelled:
+                    pending.add(pool.submit(_hash_chunk, chunk))
+                while pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._write_results(conn, finished, references)
+        except (sqlite3.Error, OSError) as e:
+            self.error = e
+        finally:
+            if conn is not None:
+                conn.close()
+            self.done = True
+
+    def _write_results(self, conn, finished, references):
+        checked_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        params = []
+        for future in finished:
+            for file_id, size, mtime_ns, digest in future.result():
+                self.checked += 1
+                if digest is None:
+                    continue
+                self.hashed += 1
+                params.append((file_id, size, mtime_ns, references.get(file_id) or digest, digest, checked_at))
+        conn.executemany('''INSERT OR REPLACE INTO library_integrity (file_id, size, mtime_ns, reference_hash, current_hash, checked_at)
+                            VALUES (?, ?, ?, ?, ?, ?)''', params)
+        conn.commit()
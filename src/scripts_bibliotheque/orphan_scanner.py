@@ -0,0 +1,114 @@
+import os
+import queue
+import shutil
+import threading
+
+
+def subdirectories(path):
+    """Retourne les sous-dossiers (nom, chemin) d'un dossier, sans suivre les liens symboliques."""
+    with os.scandir(path) as entries:
+        return [(entry.name, entry.path) for entry in entries if entry.is_dir(follow_symlinks=False)]
+
+
+def relative_files(path, files_dir):
+    """Parcourt récursivement un dossier et produit le chemin relatif (séparateur '/') de chaque fichier."""
+    stack = [path]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    yield os.path.relpath(entry.path, files_dir).replace('\\', '/')
+
+
+class OrphanFolderScanner:
+    """
+    Recherche et supprime en arrière-plan les dossiers de la bibliothèque qui ne correspondent
+    à aucun dossier connu et ne contiennent aucune pièce référencée.
+    Les dossiers actifs et les chemins référencés sont chargés une fois par l'appelant ; le parcours
+    du disque n'exécute aucune requête. Les messages sont publiés dans self.messages :
+    ("log", texte), ("scan_done", dossiers orphelins), ("delete_done", nombre supprimé) ou ("error", texte).
+    """
+    def __init__(self, files_dir, active_folders, referenced_paths):
+        self.files_dir = files_dir
+        self.active_folders = active_folders
+        self.referenced_paths = referenced_paths
+        # Dossiers d'archives contenant au moins un dossier actif : jamais orphelins eux-mêmes
+        self.active_archives = {(year, category, archives) for year, category, archives, _ in active_folders if archives}
+        self.messages = queue.Queue()
+
+    def start_scan(self):
+        threading.Thread(target=self._run, args=(self.scan,), daemon=True).start()
+
+    def start_delete(self, orphan_folders):
+        threading.Thread(target=self._run, args=(self.delete, orphan_folders), daemon=True).start()
+
+    def _run(self, task, *args):
+        try:
+            task(*args)
+        except OSError as e:
+            self.messages.put(("error", str(e)))
+
+    def is_orphan(self, year, category, archives, project, path):
+        if (year, category, archives, project) in self.active_folders:
+            return False
+        if not archives and (year, category, project) in self.active_archives:
+            return False
+        return not any(relative_path in self.referenced_paths for relative_path in relative_files(path, self.files_dir))
+
+    def scan(self):
+        orphan_folders = []
+
+        def found(folder):
+            orphan_folders.append(folder)
+            self.messages.put(("log", f"Dossier orphelin : {folder}"))
+
+        for year_dir, year_path in subdirectories(self.files_dir):
+            for category_dir, category_path in subdirectories(year_path):
+                for dir_name, dir_path in subdirectories(category_path):
+                    # Dossier projet sans archives : année/catégorie/projet
+                    if self.is_orphan(year_dir, category_dir, "", dir_name, dir_path):
+                        found(os.path.join(year_dir, category_dir, dir_name))
+                    # Dossier projet dans des archives : année/catégorie/archives/projet
+                    for sub_dir, sub_dir_path in subdirectories(dir_path):
+                        if self.is_orphan(year_dir, category_dir, dir_name, sub_dir, sub_dir_path):
+                            found(os.path.join(year_dir, category_dir, dir_name, sub_dir))
+        self.messages.put(("scan_done", orphan_folders))
+
+    def delete(self, orphan_folders):
+        deleted_count = 0
+        for folder in orphan_folders:
+            folder_path = os.path.normpath(os.path.join(self.files_dir, folder))
+            if not os.path.exists(folder_path):
+                self.messages.put(("log", f"Dossier {folder_path} n'existe plus."))
+                continue
+            try:
+                for file_path in relative_files(folder_path, self.files_dir):
+                    full_path = os.path.join(self.files_dir, file_path)
+                    if not os.access(full_path, os.W_OK):
+                        self.messages.put(("log", f"Erreur : Permissions insuffisantes pour {full_path}"))
+                shutil.rmtree(folder_path)
+                self.messages.put(("log", f"Dossier supprimé : {folder_path}"))
+                deleted_count += 1
+            except Exception as e:
+                self.messages.put(("log", f"Erreur lors de la suppression de {folder_path} : {str(e)}"))
+
+        # Dossiers année et catégorie devenus vides
+        for _, year_path in subdirectories(self.files_dir):
+            for _, category_path in subdirectories(year_path):
+                if not os.listdir(category_path):
+                    try:
+                        shutil.rmtree(category_path)
+                        self.messages.put(("log", f"Dossier vide supprimé : {category_path}"))
+                        deleted_count += 1
+                    except Exception as e:
+                        self.messages.put(("log", f"Erreur lors de la suppression de {category_path} : {str(e)}"))
+            if not os.listdir(year_path):
+                try:
+                    shutil.rmtree(year_path)
+                    self.messages.put(("log", f"Dossier vide supprimé : {year_path}"))
+                    deleted_count += 1
+                except Exception as e:
+                    self.messages.put(("log", f"Erreur lors de la suppression de {year_path} : {str(e)}"))
+        self.messages.put(("delete_done", deleted_count))
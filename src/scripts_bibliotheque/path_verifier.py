@@ -0,0 +1,114 @@
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+STAT_WORKERS = 16  # Vérifications d'existence simultanées (utile surtout sur un partage réseau)
+CHUNK_SIZE = 500  # Fichiers vérifiés entre deux mises à jour de la progression
+
+# Correction d'une pièce : colonnes à modifier et leurs nouvelles valeurs, déplacement éventuel
+# du fichier (source, destination), nombre de métadonnées corrigées et changement de chemin.
+PathFix = namedtuple("PathFix", "file_id columns values move corrected_metadata path_changed")
+
+
+def plan_fix(files_dir, row):
+    """
+    Compare le chemin enregistré d'une pièce avec ses métadonnées et retourne la correction à appliquer.
+    Les métadonnées sont déduites du chemin, puis le chemin est reconstruit à partir des métadonnées.
+
+    Returns:
+        PathFix | None | str: la correction, None si la pièce est correcte, "missing" si le fichier est introuvable.
+    """
+    file_id, year, category, archives, project, title, file_path = row
+    db_year = str(year).strip() or str(datetime.now().year)
+    db_category = str(category).strip() or "Unknown"
+    db_archives = str(archives).strip() if archives else ""
+    db_project = str(project).strip() or "Unknown"
+    db_title = str(title).strip()
+    db_file_path = str(file_path).strip().replace('\\', '/')
+
+    current_full_path = os.path.normpath(os.path.join(files_dir, db_file_path))
+    if not os.path.exists(current_full_path):
+        return "missing"
+
+    path_parts = db_file_path.split('/')
+    if len(path_parts) < (5 if db_archives else 4):
+        return None
+    path_values = {
+        "year": path_parts[0],
+        "category": path_parts[1],
+        "archives": path_parts[2] if db_archives else "",
+        "project": path_parts[-2],
+        "title": path_parts[-1],
+    }
+    db_values = {"year": db_year, "category": db_category, "archives": db_archives, "project": db_project, "title": db_title}
+
+    columns = []
+    values = []
+    for column, path_value in path_values.items():
+        if db_values[column] != path_value:
+            columns.append(column)
+            values.append(path_value if path_value or column != "archives" else None)
+            db_values[column] = path_value
+    corrected_metadata = len(columns)
+
+    path_components = [db_values["year"], db_values["category"]] + ([db_values["archives"]] if db_values["archives"] else []) + [db_values["project"], db_values["title"]]
+    expected_path = os.path.join(*path_components).replace('\\', '/')
+    move = None
+    path_changed = db_file_path != expected_path
+    if path_changed:
+        columns.append("file_path")
+        values.append(expected_path)
+        expected_full_path = os.path.normpath(os.path.join(files_dir, expected_path))
+        if not os.path.exists(expected_full_path):
+            move = (current_full_path, expected_full_path)
+
+    if not columns:
+        return None
+    return PathFix(file_id, tuple(columns), tuple(values), move, corrected_metadata, path_changed)
+
+
+class PathVerifier(threading.Thread):
+    """
+    Vérifie les chemins des pièces en arrière-plan : l'existence des fichiers est testée
+    simultanément par un pool de threads, et les corrections sont seulement collectées.
+    Elles sont appliquées ensuite par l'interface, dans une transaction unique.
+    """
+    def __init__(self, files_dir, rows, max_workers=STAT_WORKERS):
+        super().__init__(daemon=True)
+        self.files_dir = files_dir
+        self.rows = rows
+        self.max_workers = max_workers
+        self.total = len(rows)
+        self.checked = 0
+        self.fixes = []
+        self.missing = []
+        self.error = None
+        self.done = False
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def run(self):
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                for start in range(0, self.total, CHUNK_SIZE):
+                    if self.cancelled:
+                        break
+                    chunk = self.rows[start:start + CHUNK_SIZE]
+                    for row, result in zip(chunk, pool.map(lambda row: plan_fix(self.files_dir, row), chunk)):
+                        if result == "missing":
+                            self.missing.append(row[0])
+                        elif result is not None:
+                            self.fixes.append(result)
+                    self.checked += len(chunk)
+        except OSError as e:
+            self.error = e
+        finally:
+            self.done = True
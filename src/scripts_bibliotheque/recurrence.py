@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+
+from dateutil.relativedelta import relativedelta
+
+# Pas de chaque fréquence : les mois, trimestres et années suivent le calendrier (pas de mois de 30 jours)
+RECURRENCE_STEPS = {
+    "Quotidienne": relativedelta(days=1),
+    "Hebdomadaire": relativedelta(weeks=1),
+    "Mensuel": relativedelta(months=1),
+    "Trimestrielle": relativedelta(months=3),
+    "Semestrielle": relativedelta(months=6),
+    "Annuelle": relativedelta(years=1),
+}
+# Durée maximale d'un pas, en jours : permet de sauter directement au début d'une fenêtre
+STEP_MAX_DAYS = {"Quotidienne": 1, "Hebdomadaire": 7, "Mensuel": 31, "Trimestrielle": 92, "Semestrielle": 184, "Annuelle": 366}
+MAX_SHIFT_DAYS = 2  # Report maximal d'une occurrence tombant un jour exclu (samedi et dimanche)
+
+
+def is_recurring(recurrence):
+    return recurrence in RECURRENCE_STEPS
+
+
+def to_date(day):
+    return date.fromisoformat(day) if isinstance(day, str) else day
+
+
+class RecurrenceRule:
+    """
+    Règle de récurrence d'une tâche : date de départ, fréquence et jours exclus.
+    La n-ième occurrence est calculée depuis la date de départ (départ + n pas) : une tâche mensuelle
+    du 31 janvier tombe le 28 ou 29 février puis le 31 mars, sans dérive. Une occurrence tombant un
+    jour exclu est reportée au jour autorisé suivant ; deux occurrences reportées sur le même jour
+    n'en font qu'une. Les occurrences ne sont calculées qu'à la demande, pour une fenêtre donnée.
+    """
+    def __init__(self, start, frequency, exclude_saturday=False, exclude_sunday=False):
+        self.start = to_date(start)
+        self.frequency = frequency
+        self.step = RECURRENCE_STEPS[frequency]
+        self.excluded_weekdays = ({5} if exclude_saturday else set()) | ({6} if exclude_sunday else set())
+
+    def nth(self, n):
+        """Date de la n-ième occurrence (la date de départ, choisie par l'utilisateur, n'est pas reportée)."""
+        day = self.start + self.step * n
+        if n > 0:
+            while day.weekday() in self.excluded_weekdays:
+                day += timedelta(days=1)
+        return day
+
+    def iter_from(self, first_day):
+        """Itère sans fin sur les occurrences à partir de first_day inclus."""
+        first_day = to_date(first_day)
+        n = max(0, ((first_day - self.start).days - MAX_SHIFT_DAYS) // STEP_MAX_DAYS[self.frequency])
+        previous = None
+        while True:
+            day = self.nth(n)
+            if day >= first_day and day != previous:
+                yield day
+            previous = day
+            n += 1
+
+    def occurrences(self, first_day, last_day):
+        """Occurrences comprises entre first_day et last_day inclus."""
+        last_day = to_date(last_day)
+        days = []
+        for day in self.iter_from(first_day):
+            if day > last_day:
+                break
+            days.append(day)
+        return days
+
+    def next_after(self, day, skipped=()):
+        """
+        Première occurrence postérieure à day qui ne figure pas dans skipped (dates YYYY-MM-DD des
+        occurrences déjà traitées).
+        """
+        for occurrence in self.iter_from(to_date(day) + timedelta(days=1)):
+            if occurrence.isoformat() not in skipped:
+                return occurrence
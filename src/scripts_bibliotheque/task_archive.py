@@ -0,0 +1,143 @@
+import json
+import sqlite3
+from datetime import date, datetime, timedelta
+
+DEFAULT_ARCHIVE_AFTER_DAYS = 365  # Âge (depuis l'achèvement) au-delà duquel une tâche terminée est archivée
+
+TASK_COLUMNS = "id, title, description, due_date, priority, status, recurrence, recurrence_start, completed_at"
+SUBTASK_COLUMNS = "id, task_id, title, status"
+OCCURRENCE_COLUMNS = "task_id, occurrence_date, status"
+LINK_COLUMNS = "task_id, file_id"
+# Une tâche restaurée est datée du jour de sa restauration : l'archivage automatique ne la reprend
+# qu'après un nouveau délai complet
+RESTORED_TASK_VALUES = ("id, title, description, due_date, priority, status, recurrence, recurrence_start, "
+                        "CASE WHEN status = 'Terminé' THEN date('now', 'localtime') END")
+
+
+def ensure_task_archive(conn, conn_library):
+    """
+    Prépare l'archivage des tâches terminées :
+    - colonne tasks.completed_at, tenue à jour par des triggers lors des changements de statut
+      (les tâches terminées avant son ajout sont datées par leur échéance),
+    - tables d'archives de même structure que les tables actives : tasks_archive, subtasks_archive
+      et task_occurrences_archive dans la base des tâches, task_file_link_archive dans celle de la
+      bibliothèque. Les vues habituelles ne lisent que les tables actives.
+    """
+    columns = [info[1] for info in conn.execute("PRAGMA table_info(tasks)").fetchall()]
+    if "completed_at" not in columns:
+        conn.execute("ALTER TABLE tasks ADD COLUMN completed_at TEXT")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS tasks_completed_ai AFTER INSERT ON tasks
+                    WHEN new.status = 'Terminé' AND new.completed_at IS NULL BEGIN
+        UPDATE tasks SET completed_at = date('now', 'localtime') WHERE id = new.id;
+    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS tasks_completed_au AFTER UPDATE OF status ON tasks
+                    WHEN new.status IS NOT old.status BEGIN
+        UPDATE tasks SET completed_at = CASE WHEN new.status = 'Terminé' THEN date('now', 'localtime') END WHERE id = new.id;
+    END""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS tasks_archive (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        description TEXT,
+        due_date TEXT,
+        priority TEXT,
+        status TEXT,
+        recurrence TEXT,
+        recurrence_start TEXT,
+        completed_at TEXT,
+        archived_at TEXT
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS subtasks_archive (
+        id INTEGER PRIMARY KEY,
+        task_id INTEGER,
+        title TEXT NOT NULL,
+        status TEXT
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_subtasks_archive_task ON subtasks_archive (task_id)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS task_occurrences_archive (
+        task_id INTEGER,
+        occurrence_date TEXT,
+        status TEXT,
+        PRIMARY KEY (task_id, occurrence_date)
+    ) WITHOUT ROWID""")
+    conn.commit()
+    conn_library.execute("""CREATE TABLE IF NOT EXISTS task_file_link_archive (
+        task_id INTEGER,
+        file_id INTEGER,
+        PRIMARY KEY (task_id, file_id)
+    )""")
+    conn_library.commit()
+
+
+def archive_cutoff(days):
+    """Date (YYYY-MM-DD) avant laquelle une tâche terminée est archivée."""
+    return (date.today() - timedelta(days=days)).isoformat()
+
+
+def archivable_task_ids(conn, cutoff):
+    rows = conn.execute("""SELECT id FROM tasks WHERE status = 'Terminé'
+                           AND COALESCE(NULLIF(completed_at, ''), NULLIF(due_date, '')) < ?""", (cutoff,)).fetchall()
+    return [row[0] for row in rows]
+
+
+def _move_rows(conn, source, target, columns, key, ids):
+    conn.execute(f"INSERT OR REPLACE INTO {target} ({columns}) SELECT {columns} FROM {source} WHERE {key} IN (SELECT value FROM json_each(?))", (ids,))
+    conn.execute(f"DELETE FROM {source} WHERE {key} IN (SELECT value FROM json_each(?))", (ids,))
+
+
+def archive_tasks(conn, conn_library, task_ids):
+    """
+    Déplace des tâches, leurs sous-tâches, leurs occurrences et leurs liens vers les pièces dans les
+    tables d'archives : une requête par table, une transaction par base. La base des tâches n'est
+    validée qu'après celle de la bibliothèque, et annulée si celle-ci échoue.
+
+    Returns:
+        int: le nombre de tâches archivées.
+    """
+    if not task_ids:
+        return 0
+    ids = json.dumps([int(task_id) for task_id in task_ids])
+    archived_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        conn.execute(f"""INSERT OR REPLACE INTO tasks_archive ({TASK_COLUMNS}, archived_at)
+                         SELECT {TASK_COLUMNS}, ? FROM tasks WHERE id IN (SELECT value FROM json_each(?))""", (archived_at, ids))
+        _move_rows(conn, "subtasks", "subtasks_archive", SUBTASK_COLUMNS, "task_id", ids)
+        _move_rows(conn, "task_occurrences", "task_occurrences_archive", OCCURRENCE_COLUMNS, "task_id", ids)
+        conn.execute("DELETE FROM tasks WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+        try:
+            _move_rows(conn_library, "task_file_link", "task_file_link_archive", LINK_COLUMNS, "task_id", ids)
+            conn_library.commit()
+        except sqlite3.Error:
+            conn_library.rollback()
+            raise
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return len(task_ids)
+
+
+def restore_tasks(conn, conn_library, task_ids):
+    """
+    Ramène des tâches archivées (avec leurs sous-tâches, occurrences et liens) dans les tables actives.
+    Leur date d'achèvement devient la date du jour.
+    """
+    if not task_ids:
+        return 0
+    ids = json.dumps([int(task_id) for task_id in task_ids])
+    try:
+        conn.execute(f"""INSERT OR REPLACE INTO tasks ({TASK_COLUMNS})
+                         SELECT {RESTORED_TASK_VALUES} FROM tasks_archive WHERE id IN (SELECT value FROM json_each(?))""", (ids,))
+        _move_rows(conn, "subtasks_archive", "subtasks", SUBTASK_COLUMNS, "task_id", ids)
+        _move_rows(conn, "task_occurrences_archive", "task_occurrences", OCCURRENCE_COLUMNS, "task_id", ids)
+        conn.execute("DELETE FROM tasks_archive WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+        try:
+            _move_rows(conn_library, "task_file_link_archive", "task_file_link", LINK_COLUMNS, "task_id", ids)
+            conn_library.commit()
+        except sqlite3.Error:
+            conn_library.rollback()
+            raise
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return len(task_ids)
@@ -0,0 +1,71 @@
+import csv
+import gzip
+import sqlite3
+from pathlib import Path
+
+from search_index import register_functions
+
+EXPORT_HEADER = ["ID", "Titre", "Échéance", "Priorité", "Statut", "Récurrence", "Description", "Sous-tâches", "Pièces liées"]
+LIST_SEPARATOR = " | "  # Séparateur des sous-tâches et des pièces dans une cellule
+
+# Une ligne par tâche : sous-tâches et titres des pièces liées sont agrégés par des sous-requêtes jointes
+# (une seule passe sur chaque table, sans requête par tâche). Les sous-requêtes triées fixent l'ordre
+# de group_concat.
+EXPORT_QUERY = """SELECT t.id, t.title, t.due_date, t.priority, t.status, t.recurrence, COALESCE(t.description, ''),
+                         COALESCE(s.subtasks, ''), COALESCE(f.files, '')
+                  FROM tasks t
+                  LEFT JOIN (SELECT task_id, group_concat(title || ' (' || COALESCE(status, '') || ')', ?) AS subtasks
+                             FROM (SELECT task_id, title, status FROM subtasks ORDER BY task_id, id)
+                             GROUP BY task_id) s ON s.task_id = t.id
+                  LEFT JOIN (SELECT task_id, group_concat(title, ?) AS files
+                             FROM (SELECT k.task_id, l.title FROM lib.task_file_link k JOIN lib.library l ON l.id = k.file_id
+                                   ORDER BY k.task_id, l.title)
+                             GROUP BY task_id) f ON f.task_id = t.id
+                  {where}
+                  ORDER BY COALESCE(NULLIF(t.due_date, ''), '9999-12-31'), t.id"""
+
+
+def open_export_connection(tasks_path, library_path):
+    """Ouvre tasks.db en lecture seule, avec library.db attachée sous l'alias lib."""
+    conn = sqlite3.connect(Path(tasks_path).as_uri() + "?mode=ro", uri=True)
+    register_functions(conn)
+    conn.execute("ATTACH DATABASE ? AS lib", (Path(library_path).as_uri() + "?mode=ro",))
+    return conn
+
+
+def export_tasks_csv(tasks_path, library_path, file_path, scope_query=None, scope_params=(), compress=False):
+    """
+    Exporte les tâches, leurs sous-tâches et les titres des pièces liées dans un fichier CSV.
+    Les lignes de la requête jointe sont écrites au fil de leur lecture : la mémoire utilisée ne
+    dépend pas du nombre de tâches.
+
+    Args:
+        tasks_path (str): Chemin de tasks.db.
+        library_path (str): Chemin de library.db.
+        file_path (str): Fichier CSV à écrire.
+        scope_query (str, optional): Requête sur tasks.db dont la colonne id donne les tâches à
+            exporter (par exemple celle du filtre courant). Par défaut, toute la base.
+        scope_params (sequence, optional): Paramètres de scope_query.
+        compress (bool, optional): Compresse le fichier au format gzip.
+
+    Returns:
+        int: le nombre de tâches exportées.
+    """
+    where = ""
+    params = [LIST_SEPARATOR, LIST_SEPARATOR]
+    if scope_query is not None:
+        where = f"WHERE t.id IN (SELECT id FROM ({scope_query}))"
+        params.extend(scope_params)
+    conn = open_export_connection(tasks_path, library_path)
+    try:
+        opener = gzip.open if compress else open
+        with opener(file_path, "wt", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(EXPORT_HEADER)
+            count = 0
+            for row in conn.execute(EXPORT_QUERY.format(where=where), params):
+                writer.writerow(row)
+                count += 1
+        return count
+    finally:
+        conn.close()
@@ -0,0 +1,200 @@
+import hashlib
+import importlib.util
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff", ".webp"}
+THUMBNAIL_SIZE = 256  # Côté maximal de l'aperçu, en pixels
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+EVICTION_TARGET = 0.9  # Après éviction, le cache occupe au plus 90 % de sa taille maximale
+
+
+def _has_module(name):
+    return importlib.util.find_spec(name) is not None
+
+
+def render_thumbnail(full_path, thumbnail_path, max_size=THUMBNAIL_SIZE):
+    """
+    Génère l'aperçu PNG d'une image ou de la première page d'un PDF.
+    Exécutée dans un processus de travail : ne doit dépendre que de ses arguments.
+    Les images nécessitent Pillow ; les PDF PyMuPDF ou, à défaut, pdftoppm (Poppler).
+
+    Returns:
+        str | None: le chemin de l'aperçu, None si la génération est impossible.
+    """
+    ext = os.path.splitext(full_path)[1].lower()
+    temp_path = f"{thumbnail_path}.{os.getpid()}.tmp.png"
+    try:
+        if ext in IMAGE_EXTENSIONS and _has_module("PIL"):
+            from PIL import Image
+            with Image.open(full_path) as image:
+                image.thumbnail((max_size, max_size))
+                if image.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+                    image = image.convert("RGB")
+                image.save(temp_path, "PNG")
+        elif ext == ".pdf" and _has_module("fitz"):
+            import fitz
+            with fitz.open(full_path) as document:
+                page = document[0]
+                zoom = max_size / max(page.rect.width, page.rect.height)
+                page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).save(temp_path)
+        elif ext == ".pdf" and shutil.which("pdftoppm"):
+            subprocess.run(["pdftoppm", "-png", "-f", "1", "-l", "1", "-singlefile", "-scale-to", str(max_size),
+                            full_path, temp_path[:-len(".png")]], capture_output=True, timeout=60, check=True)
+        else:
+            return None
+        os.replace(temp_path, thumbnail_path)
+        return thumbnail_path
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+    except Exception:
+        # Pillow et PyMuPDF lèvent leurs propres exceptions sur les fichiers corrompus
+        return None
+    finally:
+        if os.path.exists(temp_path):
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+
+def can_preview(file_path):
+    """Indique si un aperçu peut être généré pour ce type de fichier avec les outils installés."""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return _has_module("PIL")
+    if ext == ".pdf":
+        return _has_module("fitz") or shutil.which("pdftoppm") is not None
+    return False
+
+
+class ThumbnailCache:
+    """
+    Cache disque des aperçus des pièces. La clé d'un aperçu est dérivée du chemin, de la taille et
+    de la date de modification du fichier : un fichier modifié obtient un nouvel aperçu et l'ancien
+    finit évincé. La date de modification des aperçus sert de date de dernier accès pour l'éviction
+    LRU, déclenchée lorsque le cache dépasse max_bytes.
+    Les aperçus manquants sont générés par un pool de processus ; les aperçus prêts sont publiés
+    dans self.ready sous la forme (chemin du fichier, chemin de l'aperçu ou None). Un pool cassé (processus
+    de travail arrêté brutalement) est recréé ; shutdown l'arrête à la fermeture de l'application.
+    """
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES, max_workers=2):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_workers = max_workers
+        self.ready = queue.Queue()
+        self.pending = set()
+        self.failed = set()
+        self.lock = threading.Lock()
+        self._pool = None
+        os.makedirs(cache_dir, exist_ok=True)
+        with os.scandir(cache_dir) as entries:
+            self.current_bytes = sum(entry.stat().st_size for entry in entries if entry.is_file())
+
+    def thumbnail_path(self, full_path):
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            return None
+        key = hashlib.sha1(f"{os.path.normcase(full_path)}\0{st.st_size}\0{st.st_mtime_ns}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key + ".png")
+
+    def request(self, full_path):
+        """
+        Retourne le chemin de l'aperçu s'il est en cache ; sinon lance sa génération en arrière-plan
+        et retourne None (le résultat arrivera dans self.ready).
+
+        Raises:
+            BrokenProcessPool: si le pool, recréé une fois, ne peut toujours pas accepter la demande.
+        """
+        thumbnail_path = self.thumbnail_path(full_path)
+        if thumbnail_path is None or thumbnail_path in self.failed:
+            return None
+        if os.path.exists(thumbnail_path):
+            try:
+                os.utime(thumbnail_path)
+            except OSError:
+                pass
+            return thumbnail_path
+        with self.lock:
+            if thumbnail_path in self.pending:
+                return None
+            self.pending.add(thumbnail_path)
+        try:
+            try:
+                future = self._submit(full_path, thumbnail_path)
+            except BrokenProcessPool:
+                # Un processus de travail s'est arrêté brutalement : la demande est soumise à un nouveau pool
+                future = self._submit(full_path, thumbnail_path)
+        except BrokenProcessPool:
+            with self.lock:
+                self.pending.discard(thumbnail_path)
+            raise
+        future.add_done_callback(lambda done: self._on_rendered(full_path, thumbnail_path, done))
+        return None
+
+    def _submit(self, full_path, thumbnail_path):
+        with self.lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            pool = self._pool
+        try:
+            return pool.submit(render_thumbnail, full_path, thumbnail_path)
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise
+
+    def _discard_pool(self, pool):
+        with self.lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _on_rendered(self, full_path, thumbnail_path, future):
+        broken = False
+        try:
+            result = future.result()
+        except BrokenProcessPool:
+            # Échec dû au pool et non au fichier : l'aperçu pourra être redemandé
+            result = None
+            broken = True
+        except Exception:
+            result = None
+        with self.lock:
+            self.pending.discard(thumbnail_path)
+            if result is None and not broken:
+                self.failed.add(thumbnail_path)
+            else:
+                self.current_bytes += os.path.getsize(result)
+        if result is not None and self.current_bytes > self.max_bytes:
+            self.evict()
+        self.ready.put((full_path, result))
+
+    def evict(self):
+        """Supprime les aperçus les moins récemment consultés jusqu'à repasser sous la taille cible."""
+        with os.scandir(self.cache_dir) as entries:
+            files = sorted(((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries if entry.is_file()))
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * EVICTION_TARGET
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self.lock:
+            self.current_bytes = total
+
+    def shutdown(self):
+        """Arrête le pool de processus ; les générations en attente sont annulées."""
+        with self.lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
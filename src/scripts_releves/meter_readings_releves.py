@@ -6,6 +6,7 @@ import sqlite3
 import calendar
 import csv
 from datetime import datetime, timedelta
+from query_cache import query_cache
 
 class MeterReadings:
     def __init__(self, parent, conn, conn_library):
@@ -215,8 +216,12 @@ class MeterReadings:
     def filter_readings(self, event=None):
         search_term = self.readings_search_entry.get().lower()
         period = self.date_filter_var.get()
-        self.cursor.execute("SELECT id, meter_id, parameter_id, date, value, note, library_file_id FROM readings WHERE meter_id=? ORDER BY date", (self.current_meter_id,))
-        readings = self.cursor.fetchall()
+        # Relevés, paramètres et compteur en une requête, servie par le cache tant que la base n'a pas changé
+        readings = query_cache.execute(self.conn, """SELECT r.id, r.date, r.value, r.note, m.name, p.id, p.name, p.unit, p.target, p.max_value
+                                                    FROM readings r
+                                                    JOIN meters m ON m.id = r.meter_id
+                                                    LEFT JOIN parameters p ON p.id = r.parameter_id
+                                                    WHERE r.meter_id=? ORDER BY r.date""", (self.current_meter_id,))
         for item in self.readings_tree.get_children():
             self.readings_tree.delete(item)
         today = datetime.now()
@@ -237,7 +242,7 @@ class MeterReadings:
         else:
             start_date = None
             end_date = None
-        for reading_id, meter_id, param_id, date, value, note, library_file_id in readings:
+        for reading_id, date, value, note, meter_name, param_id, parameter_name, parameter_unit, target_val, max_value in readings:
             reading_date = datetime.strptime(date, "%Y-%m-%d")
             if start_date and end_date:
                 if not (start_date <= reading_date <= end_date):
@@ -248,42 +253,34 @@ class MeterReadings:
             max_val = "-"
             tags = ("ok",)
             if param_id:
-                self.cursor.execute("SELECT name, unit, target, max_value FROM parameters WHERE id=?", (param_id,))
-                param_result = self.cursor.fetchone()
-                if param_result:
-                    param_name, unit, target_val, max_value = param_result
-                    min_val = str(target_val) if target_val is not None else "-"
-                    max_val = str(max_value) if max_value is not None else "-"
-                    unit = unit or "-"
-                    value_float = float(value)
-                    has_min = target_val is not None
-                    has_max = max_value is not None
-                    if has_min and has_max:
-                        min_float = float(target_val)
-                        max_float = float(max_value)
-                        if value_float < min_float:
-                            tags = ("below",)
-                        elif value_float > max_float:
-                            tags = ("exceed",)
-                        else:
-                            tags = ("within",)
-                    elif has_min:
-                        min_float = float(target_val)
-                        if value_float < min_float:
-                            tags = ("below",)
-                        else:
-                            tags = ("within",)
-                    elif has_max:
-                        max_float = float(max_value)
-                        if value_float > max_float:
-                            tags = ("exceed",)
-                        else:
-                            tags = ("within",)
-            self.cursor.execute("SELECT name FROM meters WHERE id=?", (meter_id,))
-            meter_result = self.cursor.fetchone()
-            if not meter_result:
-                continue
-            meter_name = meter_result[0]
+                param_name, unit = parameter_name, parameter_unit
+                min_val = str(target_val) if target_val is not None else "-"
+                max_val = str(max_value) if max_value is not None else "-"
+                unit = unit or "-"
+                value_float = float(value)
+                has_min = target_val is not None
+                has_max = max_value is not None
+                if has_min and has_max:
+                    min_float = float(target_val)
+                    max_float = float(max_value)
+                    if value_float < min_float:
+                        tags = ("below",)
+                    elif value_float > max_float:
+                        tags = ("exceed",)
+                    else:
+                        tags = ("within",)
+                elif has_min:
+                    min_float = float(target_val)
+                    if value_float < min_float:
+                        tags = ("below",)
+                    else:
+                        tags = ("within",)
+                elif has_max:
+                    max_float = float(max_value)
+                    if value_float > max_float:
+                        tags = ("exceed",)
+                    else:
+                        tags = ("within",)
             note = note or ""
             row_values = [str(reading_id), date, meter_name, param_name, str(value), min_val, max_val, unit, note]
             if search_term and not any(search_term in str(val).lower() for val in row_values):
@@ -0,0 +1,241 @@
+import math
+import sqlite3
+import unicodedata
+
+# Index plein texte (FTS5) utilisés par la recherche globale.
+# Chaque index est une table virtuelle "external content" : le texte n'est pas
+# dupliqué, seule la structure d'index est stockée, et des triggers maintiennent
+# l'index synchronisé avec la table source.
+TASKS_INDEX = ("tasks", "tasks_fts", ("title", "description"))
+LIBRARY_INDEX = ("library", "library_fts", ("title", "project", "notes"))
+
+# Vocabulaire pour la recherche approchée (tolérante aux fautes de frappe) : les mots
+# distincts de l'index FTS5 (sans accents, casse repliée), lus par une table fts5vocab et
+# indexés par trigrammes. Le vocabulaire est complété par l'application (refresh_terms_index)
+# avant chaque recherche approchée : aucun trigger ne dépend d'une fonction propre à
+# l'application, et toute connexion peut modifier les tables sources.
+TASKS_TERMS = ("tasks_fts", "tasks_terms")
+LIBRARY_TERMS = ("library_fts", "library_terms")
+FUZZY_THRESHOLD = 0.3  # Similarité minimale entre un mot saisi et un mot du vocabulaire
+FUZZY_TERMS = 8  # Nombre maximal de mots du vocabulaire retenus par mot saisi
+FUZZY_CANDIDATES = 500  # Nombre maximal de mots du vocabulaire évalués par mot saisi
+
+
+def ensure_fts_index(conn, table, fts_table, columns):
+    """
+    Crée l'index FTS5 d'une table et ses triggers de synchronisation s'ils n'existent pas.
+    Lorsqu'un index est créé sur une base existante, il est construit à partir des lignes déjà présentes.
+
+    Args:
+        conn (sqlite3.Connection): La connexion à la base contenant la table source.
+        table (str): Le nom de la table source (doit avoir une clé primaire 'id').
+        fts_table (str): Le nom de la table virtuelle FTS5.
+        columns (tuple): Les colonnes indexées.
+
+    Returns:
+        bool: True si l'index est disponible, False si FTS5 n'est pas supporté par SQLite.
+    """
+    cursor = conn.cursor()
+    cols = ", ".join(columns)
+    new_cols = ", ".join(f"new.{col}" for col in columns)
+    old_cols = ", ".join(f"old.{col}" for col in columns)
+    try:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (fts_table,))
+        created = cursor.fetchone() is None
+        if created:
+            cursor.execute(f"""CREATE VIRTUAL TABLE {fts_table} USING fts5(
+                {cols}, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+            )""")
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END""")
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+        END""")
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END""")
+        if created:
+            cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+        conn.commit()
+        return True
+    except sqlite3.OperationalError:
+        conn.rollback()
+        return False
+
+
+def ensure_tasks_index(conn):
+    """Crée (et construit si nécessaire) l'index plein texte de la table tasks."""
+    return ensure_fts_index(conn, *TASKS_INDEX)
+
+
+def ensure_library_index(conn):
+    """Crée (et construit si nécessaire) l'index plein texte de la table library."""
+    return ensure_fts_index(conn, *LIBRARY_INDEX)
+
+
+def build_match_query(search_terms):
+    """
+    Construit une expression MATCH FTS5 à partir des mots saisis.
+    Chaque mot devient un préfixe entre guillemets ("mot"*), les mots sont combinés par un ET implicite.
+    """
+    return " ".join('"{}"*'.format(term.replace('"', '""')) for term in search_terms)
+
+
+def database_path(conn):
+    """Retourne le chemin du fichier de la base principale d'une connexion."""
+    for _, name, path in conn.execute("PRAGMA database_list").fetchall():
+        if name == "main":
+            return path
+    return ""
+
+
+def normalize_text(text):
+    """Normalise un texte pour la recherche : accents supprimés et casse repliée."""
+    if text is None:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def trigrams(word):
+    """Retourne l'ensemble des trigrammes d'un mot complété par des espaces (deux avant, un après)."""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def trigram_similarity(word, other):
+    """Retourne la similarité (indice de Jaccard des trigrammes, entre 0 et 1) de deux mots normalisés."""
+    grams, other_grams = trigrams(word), trigrams(other)
+    return len(grams & other_grams) / len(grams | other_grams)
+
+
+def register_functions(conn):
+    """
+    Enregistre la fonction SQL normalize_text utilisée par les recherches sans index
+    (comparaisons LIKE insensibles aux accents).
+    """
+    conn.create_function("normalize_text", 1, normalize_text, deterministic=True)
+
+
+def ensure_terms_index(conn, fts_table, terms_table):
+    """
+    Crée le vocabulaire d'un index FTS5 pour la recherche approchée :
+    - {fts_table}_vocab : la table fts5vocab qui liste les mots de l'index, toujours à jour,
+    - {terms_table} : les mots déjà reportés dans l'index des trigrammes,
+    - {terms_table}_trigram : un index FTS5 (tokenizer 'trigram') de ces mots complétés par des espaces.
+    Les mots qui ne sont plus utilisés restent dans le vocabulaire, sans conséquence puisqu'ils ne
+    correspondent ensuite à aucune ligne. Les triggers des versions précédentes, qui appelaient des
+    fonctions de l'application, sont supprimés.
+
+    Returns:
+        bool: True si le vocabulaire est disponible, False si fts5vocab ou le tokenizer trigram
+        n'est pas supporté par SQLite.
+    """
+    cursor = conn.cursor()
+    try:
+        # Triggers des versions précédentes, posés sur la table source de l'index
+        source_table = fts_table.removesuffix("_fts")
+        for suffix in ("ai", "au"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {source_table}_{terms_table}_{suffix}")
+        cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table}_vocab USING fts5vocab({fts_table}, 'row')")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {terms_table} (id INTEGER PRIMARY KEY, term TEXT UNIQUE)")
+        cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {terms_table}_trigram USING fts5(padded, tokenize='trigram')")
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS {terms_table}_ai AFTER INSERT ON {terms_table} BEGIN
+            INSERT INTO {terms_table}_trigram(rowid, padded) VALUES (new.id, '  ' || new.term || ' ');
+        END""")
+        conn.commit()
+    except sqlite3.OperationalError:
+        conn.rollback()
+        return False
+    refresh_terms_index(conn, fts_table, terms_table)
+    return True
+
+
+def refresh_terms_index(conn, fts_table, terms_table):
+    """
+    Reporte dans le vocabulaire les mots apparus dans l'index FTS5 depuis le dernier appel.
+    À appeler, sur une connexion en écriture, avant de construire une recherche approchée.
+    """
+    try:
+        conn.execute(f"INSERT OR IGNORE INTO {terms_table}(term) SELECT term FROM {fts_table}_vocab")
+        conn.commit()
+    except sqlite3.OperationalError:
+        # Base occupée par une autre écriture : le vocabulaire sera complété à la recherche suivante
+        conn.rollback()
+
+
+def ensure_tasks_terms_index(conn):
+    """Crée (et construit si nécessaire) le vocabulaire de la table tasks."""
+    return ensure_terms_index(conn, *TASKS_TERMS)
+
+
+def ensure_library_terms_index(conn):
+    """Crée (et construit si nécessaire) le vocabulaire de la table library."""
+    return ensure_terms_index(conn, *LIBRARY_TERMS)
+
+
+def refresh_tasks_terms_index(conn):
+    """Complète le vocabulaire de la table tasks avant une recherche approchée."""
+    refresh_terms_index(conn, *TASKS_TERMS)
+
+
+def refresh_library_terms_index(conn):
+    """Complète le vocabulaire de la table library avant une recherche approchée."""
+    refresh_terms_index(conn, *LIBRARY_TERMS)
+
+
+def similar_terms(conn, terms_table, word, schema="main"):
+    """
+    Retourne les mots du vocabulaire proches d'un mot saisi, sous forme de liste (mot, similarité)
+    triée par similarité décroissante et limitée aux FUZZY_TERMS meilleurs.
+    Les candidats sont les mots de longueur voisine partageant assez de trigrammes avec le mot saisi
+    pour atteindre FUZZY_THRESHOLD ; seuls les FUZZY_CANDIDATES qui en partagent le plus sont évalués.
+    """
+    word = normalize_text(word)
+    grams = sorted(trigrams(word))
+    margin = max(2, len(word) // 3)
+    shared = " UNION ALL ".join(f"SELECT rowid FROM {schema}.{terms_table}_trigram WHERE {terms_table}_trigram MATCH ?" for _ in grams)
+    rows = conn.execute(f"""SELECT t.term FROM (
+                                SELECT rowid, COUNT(*) AS shared FROM ({shared}) GROUP BY rowid
+                                HAVING shared >= ? ORDER BY shared DESC LIMIT {FUZZY_CANDIDATES}) c
+                            JOIN {schema}.{terms_table} t ON t.id = c.rowid
+                            WHERE length(t.term) BETWEEN ? AND ?""",
+                        ['"{}"'.format(gram.replace('"', '""')) for gram in grams]
+                        + [math.ceil(FUZZY_THRESHOLD * len(grams)), len(word) - margin, len(word) + margin]).fetchall()
+    scored = [(term, trigram_similarity(word, term)) for (term,) in rows]
+    scored = [item for item in scored if item[1] >= FUZZY_THRESHOLD]
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return scored[:FUZZY_TERMS]
+
+
+def fuzzy_match_sql(conn, fts_table, terms_table, search_terms, schema="main"):
+    """
+    Construit la sous-requête (rowid, similarity) de la recherche approchée sur un index FTS5 de mots.
+    Chaque mot saisi est remplacé par les mots proches du vocabulaire ; une ligne doit contenir, pour
+    chaque mot saisi, au moins un de ces mots, et sa similarité est la moyenne des meilleures similarités.
+    Les mots de moins de trois caractères sont recherchés comme préfixes.
+
+    Returns:
+        tuple | None: (sql, paramètres), ou None si un mot saisi n'a aucun mot proche.
+    """
+    branches = []
+    params = []
+    words = [normalize_text(term) for term in search_terms]
+    for index, word in enumerate(words):
+        if len(word) < 3:
+            expansions = [('"{}"*'.format(word.replace('"', '""')), 1.0)]
+        else:
+            expansions = [('"{}"'.format(term.replace('"', '""')), similarity)
+                          for term, similarity in similar_terms(conn, terms_table, word, schema)]
+        if not expansions:
+            return None
+        for match_query, similarity in expansions:
+            branches.append(f"SELECT rowid, ? AS similarity, {index} AS word FROM {schema}.{fts_table} WHERE {fts_table} MATCH ?")
+            params.extend([similarity, match_query])
+    sql = f"""SELECT rowid, SUM(similarity) / {len(words)} AS similarity
+              FROM (SELECT rowid, MAX(similarity) AS similarity, word
+                    FROM ({" UNION ALL ".join(branches)}) GROUP BY word, rowid)
+              GROUP BY rowid HAVING COUNT(*) = {len(words)}"""
+    return sql, params
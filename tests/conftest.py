@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Les modules de l'application sont importés depuis src, comme au lancement d'archiviste.pyw
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
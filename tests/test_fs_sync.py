@@ -0,0 +1,95 @@
+import os
+import sqlite3
+
+from scripts_bibliotheque.content_store import ContentStore, file_digest
+from scripts_bibliotheque.fs_sync import LibrarySync, ensure_sync_snapshot
+from scripts_bibliotheque.integrity import ensure_integrity_table, integrity_issues, IntegrityChecker
+from search_index import ensure_library_index, ensure_library_terms_index, refresh_library_terms_index, register_functions
+
+
+def make_library(tmp_path):
+    db_path = str(tmp_path / "library.db")
+    files_dir = tmp_path / "bibliotheque"
+    conn = sqlite3.connect(db_path)
+    register_functions(conn)
+    conn.execute('''CREATE TABLE library (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, year TEXT, category TEXT, archives TEXT,
+        project TEXT, site TEXT, nomenclature TEXT, emetteur TEXT, objet TEXT, version TEXT,
+        file_path TEXT, notes TEXT, content_hash TEXT)''')
+    conn.execute("CREATE TABLE task_file_link (task_id INTEGER, file_id INTEGER, PRIMARY KEY (task_id, file_id))")
+    ensure_library_index(conn)
+    assert ensure_library_terms_index(conn)
+    ensure_sync_snapshot(conn)
+    ensure_integrity_table(conn)
+    return conn, db_path, files_dir
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def test_sync_rename_and_external_addition_with_terms_index(tmp_path):
+    conn, db_path, files_dir = make_library(tmp_path)
+    write(files_dir / "2024" / "Plans" / "Projet" / "ancien.pdf", "a")
+    conn.execute("INSERT INTO library (title, year, category, project, file_path) VALUES ('ancien.pdf', '2024', 'Plans', 'Projet', '2024/Plans/Projet/ancien.pdf')")
+    conn.commit()
+
+    sync = LibrarySync(db_path, str(files_dir))
+    assert sync.sync() == 0  # Premier passage : instantané seulement
+
+    os.rename(files_dir / "2024" / "Plans" / "Projet" / "ancien.pdf", files_dir / "2024" / "Plans" / "Projet" / "nouveau.pdf")
+    write(files_dir / "2024" / "Plans" / "Projet" / "externe.pdf", "b")
+    assert sync.sync() == 1  # Renommage appliqué, ajout externe en attente
+    assert sync.sync() == 1  # Ajout externe enregistré au passage suivant
+
+    rows = conn.execute("SELECT title, file_path FROM library ORDER BY id").fetchall()
+    assert rows == [("nouveau.pdf", "2024/Plans/Projet/nouveau.pdf"), ("externe.pdf", "2024/Plans/Projet/externe.pdf")]
+    # Le vocabulaire de la recherche approchée suit les titres une fois complété par l'application
+    refresh_library_terms_index(conn)
+    terms = {term for (term,) in conn.execute("SELECT term FROM library_terms")}
+    assert "nouveau" in terms and "externe" in terms
+
+
+def test_sync_keeps_ingest_hash_of_modified_file(tmp_path):
+    conn, db_path, files_dir = make_library(tmp_path)
+    path = files_dir / "2024" / "Plans" / "Projet" / "plan.pdf"
+    write(path, "original")
+    conn.execute("INSERT INTO library (title, year, category, project, file_path, content_hash) VALUES ('plan.pdf', '2024', 'Plans', 'Projet', '2024/Plans/Projet/plan.pdf', 'empreinte-ajout')")
+    conn.commit()
+
+    sync = LibrarySync(db_path, str(files_dir))
+    sync.sync()
+    write(path, "modifié hors de l'application")
+    sync.sync()
+
+    assert conn.execute("SELECT content_hash FROM library").fetchone()[0] == "empreinte-ajout"
+    checker = IntegrityChecker(db_path, str(files_dir), max_workers=1)
+    checker.run()
+    assert checker.error is None
+    issues = integrity_issues(conn)
+    assert [(issue.file_path, issue.expected_hash) for issue in issues] == [("2024/Plans/Projet/plan.pdf", "empreinte-ajout")]
+
+
+def test_sync_removal_drops_task_links_and_releases_object(tmp_path):
+    conn, db_path, files_dir = make_library(tmp_path)
+    store = ContentStore(str(tmp_path / "bibliotheque_objets"))
+    source = tmp_path / "source.pdf"
+    write(source, "contenu")
+    digest = file_digest(source)
+    path = files_dir / "2024" / "Plans" / "Projet" / "plan.pdf"
+    os.makedirs(os.path.dirname(path))
+    store.ingest(str(source), str(path), digest)
+    conn.execute("INSERT INTO library (title, year, category, project, file_path, content_hash) VALUES ('plan.pdf', '2024', 'Plans', 'Projet', '2024/Plans/Projet/plan.pdf', ?)", (digest,))
+    conn.execute("INSERT INTO task_file_link (task_id, file_id) VALUES (1, 1)")
+    conn.commit()
+
+    sync = LibrarySync(db_path, str(files_dir), content_store=store)
+    sync.sync()
+    os.remove(path)
+    assert sync.sync() == 1
+
+    assert conn.execute("SELECT COUNT(*) FROM library").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM task_file_link").fetchone()[0] == 0
+    assert not os.path.exists(store.object_path(digest))